@@ -0,0 +1,82 @@
+"""
+Compare the encoding of execution results by FastAPI and by codebox.encoding.
+
+FastAPI validates the value of an endpoint against its response model, converts it to plain
+data and serialises it with the json module. codebox.encoding serialises the models with orjson
+and compresses the body. The CPU time of each encoding, the size of the body and the bandwidth
+saved compared with uncompressed JSON are reported for outputs of a few megabytes.
+
+Usage: python -m benchmarks.encoding [total output in MB ...]
+"""
+
+import json
+import statistics
+import sys
+from collections.abc import Callable
+from functools import partial
+from time import perf_counter
+
+from pydantic import TypeAdapter
+
+from codebox.encoding import compress, dumps, zstandard
+from codebox.models import Response
+
+COMMANDS = 4
+RUNS = 10
+
+response_list = TypeAdapter(list[Response])
+
+
+def make_responses(total_size: int) -> list[Response]:
+    """
+    Responses of commands that printed numbers, about `total_size` bytes in all.
+    """
+    line_count = total_size // COMMANDS // 7
+    stdout = ''.join(f'{i:06d}\n' for i in range(line_count))
+    return [
+        Response(stdout=stdout, stdout_size=len(stdout), elapsed_time=0.1) for _ in range(COMMANDS)
+    ]
+
+
+def fastapi_encoding(responses: list[Response]) -> bytes:
+    # what fastapi.routing.serialize_response and JSONResponse.render do
+    value = response_list.validate_python(responses, from_attributes=True)
+    content = response_list.dump_python(value, mode='json')
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')
+    ).encode()
+
+
+def median_time(func: Callable[[], bytes]) -> tuple[float, int]:
+    times = []
+    for _ in range(RUNS):
+        start_time = perf_counter()
+        body = func()
+        times.append(perf_counter() - start_time)
+    return statistics.median(times), len(body)
+
+
+def main(sizes: list[float]) -> None:
+    encodings: dict[str, Callable[[list[Response]], bytes]] = {
+        'fastapi': fastapi_encoding,
+        'orjson': dumps,
+        'orjson+gzip': lambda responses: compress(dumps(responses), 'gzip'),
+    }
+    if zstandard is not None:
+        encodings['orjson+zstd'] = lambda responses: compress(dumps(responses), 'zstd')
+
+    print(f'{"output":>8} {"encoding":<12} {"time":>9} {"body":>11} {"saved":>6}')
+    for size in sizes:
+        responses = make_responses(int(size * 1_000_000))
+        output = sum(len(resp.stdout or '') for resp in responses)
+        json_size = len(dumps(responses))
+        for name, encode in encodings.items():
+            seconds, body_size = median_time(partial(encode, responses))
+            print(
+                f'{output / 1e6:6.1f}MB {name:<12} {seconds * 1000:7.1f}ms '
+                f'{body_size:11,} {1 - body_size / json_size:6.0%}'
+            )
+
+
+if __name__ == '__main__':
+    main([float(size) for size in sys.argv[1:]] or [1, 4, 16])
@@ -0,0 +1,318 @@
+"""
+Load test of the execution endpoints.
+
+Projects of several languages are sent to /execute or /execute_insecure at a given concurrency.
+Throughput and the p50/p95/p99 latencies of each language and phase are reported,
+and they can be saved as a JSON baseline to be compared with later runs.
+
+Usage examples::
+
+    python -m benchmarks.load --url http://localhost:8000 --requests 500 --concurrency 16
+    python -m benchmarks.load --mix python=3,bash=1 --save benchmarks/baseline.json
+    python -m benchmarks.load --in-process --endpoint /execute_insecure --compare baseline.json
+
+Phases:
+
+* ``total``: latency of the HTTP request, as seen by the client
+* ``queue``: time the commands waited for an execution slot
+* ``setup``: estimated time spent setting the jails up
+* ``execution``: time the commands ran, setup excluded
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+
+import orjson
+from httpx import AsyncClient
+
+from codebox.models import Command, ProjectCore, Response
+
+PHASES = ('total', 'queue', 'setup', 'execution')
+PERCENTILES = (50, 95, 99)
+
+PYTHON_CODE = """\
+import json
+
+data = [{'id': i, 'square': i * i} for i in range(1000)]
+print(sum(item['square'] for item in json.loads(json.dumps(data))))
+"""
+
+RUST_CODE = """\
+fn main() {
+    let total: u64 = (1..1000u64).map(|i| i * i).sum();
+    println!("{}", total);
+}
+"""
+
+SQL_CODE = """\
+create table numbers (n integer primary key);
+with recursive seq(n) as (select 1 union all select n + 1 from seq where n < 1000)
+insert into numbers select n from seq;
+select sum(n * n) from numbers;
+"""
+
+BASH_CODE = """\
+total=0
+for i in $(seq 1 1000); do total=$((total + i * i)); done
+echo $total
+"""
+
+
+@dataclass
+class Toolchain:
+    python: str = '/venv/bin/python'
+    rustc: str = '/usr/local/cargo/bin/rustc'
+    sqlite3: str = '/usr/bin/sqlite3'
+    bash: str = '/bin/bash'
+
+
+def build_project(language: str, toolchain: Toolchain) -> ProjectCore:
+    match language:
+        case 'python':
+            sources = {'main.py': PYTHON_CODE}
+            commands = [Command(command=f'{toolchain.python} main.py', timeout=5)]
+        case 'rust':
+            sources = {'main.rs': RUST_CODE}
+            commands = [
+                Command(command=f'{toolchain.rustc} main.rs', timeout=10),
+                Command(command='./main', timeout=5),
+            ]
+        case 'sqlite3':
+            sources = {'main.sql': SQL_CODE}
+            command = f'{toolchain.sqlite3} temp.db -bail -init main.sql ".exit"'
+            commands = [Command(command=command, timeout=5)]
+        case 'bash':
+            sources = {'main.sh': BASH_CODE}
+            commands = [Command(command=f'{toolchain.bash} main.sh', timeout=5)]
+        case _:
+            raise ValueError(f'unknown language: {language}')
+    return ProjectCore(sources=sources, commands=commands)
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """
+    Parse a mix such as ``python=4,rust=1`` into the weight of each language.
+    """
+    weights = {}
+    for item in mix.split(','):
+        language, _, weight = item.partition('=')
+        weights[language.strip()] = int(weight or 1)
+    return weights
+
+
+def schedule(weights: dict[str, int], requests: int, seed: int = 0) -> list[str]:
+    """
+    Languages of the requests, in a reproducible order.
+    """
+    languages = [
+        language
+        for language, count in zip(weights, _apportion(weights, requests), strict=True)
+        for _ in range(count)
+    ]
+    random.Random(seed).shuffle(languages)  # noqa: S311
+    return languages
+
+
+def _apportion(weights: dict[str, int], requests: int) -> list[int]:
+    total = sum(weights.values())
+    counts = [requests * weight // total for weight in weights.values()]
+    for i in range(requests - sum(counts)):
+        counts[i % len(counts)] += 1
+    return counts
+
+
+@dataclass
+class Sample:
+    language: str
+    phases: dict[str, float]
+    ok: bool
+
+
+@dataclass
+class Report:
+    endpoint: str
+    concurrency: int
+    requests: int
+    duration: float = 0
+    samples: list[Sample] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return len(self.samples) / self.duration if self.duration else 0
+
+    def summary(self) -> dict:
+        by_language: dict[str, list[Sample]] = defaultdict(list)
+        for sample in self.samples:
+            by_language[sample.language].append(sample)
+        languages = {}
+        for language, samples in sorted(by_language.items()):
+            languages[language] = {
+                'requests': len(samples),
+                'errors': sum(not sample.ok for sample in samples),
+                'phases': {
+                    phase: percentiles([sample.phases[phase] for sample in samples])
+                    for phase in PHASES
+                },
+            }
+        return {
+            'endpoint': self.endpoint,
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'duration': round(self.duration, 3),
+            'throughput': round(self.throughput, 2),
+            'languages': languages,
+        }
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """
+    p50, p95 and p99 in milliseconds.
+    """
+    if len(values) == 1:
+        values = values * 2
+    cut_points = statistics.quantiles(values, n=100, method='inclusive')
+    return {f'p{p}': round(cut_points[p - 1] * 1000, 2) for p in PERCENTILES}
+
+
+def measure(language: str, responses: list[Response], total: float, ok: bool) -> Sample:
+    setup = sum(resp.setup_time or 0 for resp in responses)
+    return Sample(
+        language=language,
+        phases={
+            'total': total,
+            'queue': sum(resp.queue_time for resp in responses),
+            'setup': setup,
+            'execution': sum(resp.elapsed_time for resp in responses) - setup,
+        },
+        ok=ok,
+    )
+
+
+async def run_load(
+    client: AsyncClient,
+    endpoint: str,
+    languages: list[str],
+    concurrency: int,
+    toolchain: Toolchain | None = None,
+) -> Report:
+    toolchain = toolchain or Toolchain()
+    report = Report(endpoint=endpoint, concurrency=concurrency, requests=len(languages))
+    pending = iter(languages)
+
+    async def worker() -> None:
+        for language in pending:
+            payload = build_project(language, toolchain).model_dump()
+            start_time = perf_counter()
+            resp = await client.post(endpoint, json=payload)
+            total = perf_counter() - start_time
+            ok = resp.status_code == 200  # noqa: PLR2004
+            responses = [Response(**r) for r in resp.json()] if ok else []
+            ok = ok and all(r.exit_code == 0 for r in responses)
+            report.samples.append(measure(language, responses, total, ok))
+
+    start_time = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    report.duration = perf_counter() - start_time
+    return report
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """
+    Lines describing how the current percentiles changed relative to the baseline.
+    """
+    lines = [f'throughput: {baseline["throughput"]} -> {current["throughput"]} req/s']
+    for language, stats in current['languages'].items():
+        base_stats = baseline['languages'].get(language)
+        if not base_stats:
+            continue
+        for phase, values in stats['phases'].items():
+            for name, value in values.items():
+                base_value = base_stats['phases'][phase][name]
+                change = (value / base_value - 1) * 100 if base_value else 0
+                lines.append(
+                    f'{language:8} {phase:10} {name}: {base_value:9.2f} -> {value:9.2f}ms '
+                    f'({change:+.1f}%)'
+                )
+    return lines
+
+
+def format_summary(summary: dict) -> str:
+    lines = [
+        f'{summary["endpoint"]}: {summary["requests"]} requests, '
+        f'concurrency {summary["concurrency"]}, {summary["throughput"]} req/s',
+        f'{"language":8} {"phase":10} {"p50":>9} {"p95":>9} {"p99":>9}  errors',
+    ]
+    for language, stats in summary['languages'].items():
+        for phase, values in stats['phases'].items():
+            p50, p95, p99 = values.values()
+            lines.append(
+                f'{language:8} {phase:10} {p50:9.2f} {p95:9.2f} {p99:9.2f}  {stats["errors"]}'
+            )
+    return '\n'.join(lines)
+
+
+@asynccontextmanager
+async def open_client(url: str | None, timeout: float) -> AsyncIterator[AsyncClient]:
+    """
+    Client of a running server, or of an application started in this process if url is None.
+    """
+    if url:
+        async with AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    from asgi_lifespan import LifespanManager  # noqa: PLC0415
+
+    from codebox.main import app  # noqa: PLC0415
+
+    async with (
+        LifespanManager(app),
+        AsyncClient(app=app, base_url='http://codebox', timeout=timeout) as client,
+    ):
+        yield client
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--in-process', action='store_true', help='ignore --url and start the app')
+    parser.add_argument('--endpoint', default='/execute', choices=['/execute', '/execute_insecure'])
+    parser.add_argument('--mix', default='python=4,rust=1,sqlite3=2,bash=2')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=60, help='of each request, in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', type=Path, help='save the summary as a JSON baseline')
+    parser.add_argument('--compare', type=Path, help='JSON baseline to compare with')
+    for name, default in vars(Toolchain()).items():
+        parser.add_argument(f'--{name}', default=default, help=f'path of {name}')
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str]) -> None:
+    args = parse_args(argv)
+    toolchain = Toolchain(**{name: getattr(args, name) for name in vars(Toolchain())})
+    languages = schedule(parse_mix(args.mix), args.requests, args.seed)
+    async with open_client(None if args.in_process else args.url, args.timeout) as client:
+        report = await run_load(client, args.endpoint, languages, args.concurrency, toolchain)
+    summary = report.summary()
+    print(format_summary(summary))
+    if args.compare:
+        print('\n'.join(compare(summary, orjson.loads(args.compare.read_bytes()))))
+    if args.save:
+        args.save.write_bytes(
+            orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS) + b'\n'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1:]))
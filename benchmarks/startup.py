@@ -0,0 +1,75 @@
+"""
+Report where the start of the server goes: importing its modules and probing the environment.
+
+The import profile comes from `python -X importtime`, in a fresh interpreter each time.
+The probes run twice in the same interpreter, the second time with the versions it already found.
+
+Usage: python -m benchmarks.startup [number of modules shown]
+"""
+
+import subprocess
+import sys
+from collections import defaultdict
+
+PROBE_SCRIPT = """
+import asyncio
+from codebox.startup import probe
+for name in ('cold', 'cached'):
+    durations = asyncio.run(probe())
+    print(name, {check: round(seconds * 1000, 1) for check, seconds in durations.items()})
+"""
+
+
+def import_profile() -> list[tuple[str, int, int]]:
+    """
+    Import the application and return the module name, self and cumulative microseconds
+    of each imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import codebox.main'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line.removeprefix('import time:').split('|')
+        modules.append((name.strip(), int(self_time), int(cumulative)))
+    return modules
+
+
+def report_imports(modules: list[tuple[str, int, int]], top: int) -> None:
+    total = sum(self_time for _, self_time, _ in modules)
+    print(f'import codebox.main: {total / 1000:.0f}ms, {len(modules)} modules\n')
+
+    packages: dict[str, int] = defaultdict(int)
+    for name, self_time, _ in modules:
+        packages[name.split('.')[0]] += self_time
+    print('packages by self time')
+    for package, self_time in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f'  {self_time / 1000:7.1f}ms  {package}')
+
+    print('\nmodules by cumulative time')
+    for name, _, cumulative in sorted(modules, key=lambda module: -module[2])[:top]:
+        print(f'  {cumulative / 1000:7.1f}ms  {name}')
+
+
+def report_probes() -> None:
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE_SCRIPT], capture_output=True, text=True, check=True
+    )
+    for line in result.stdout.splitlines():
+        name, durations = line.split(' ', 1)
+        print(f'{name:9} probes (ms): {durations}')
+
+
+def main(top: int) -> None:
+    report_imports(import_profile(), top)
+    print()
+    report_probes()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 15)
@@ -0,0 +1,50 @@
+"""
+Compare the latency of insecure Python executions with and without the zygote.
+
+Usage: python -m benchmarks.zygote [runs]
+"""
+
+import asyncio
+import shlex
+import statistics
+import sys
+
+from codebox.codebox import execute_insecure
+from codebox.models import Command
+from codebox.sandbox import create_sandbox, remove_sandbox
+from codebox.zygote import zygote
+
+SCRIPT = 'import json, re\nprint(json.dumps({"total": sum(range(1000))}))\n'
+
+
+async def measure(runs: int) -> list[float]:
+    sandbox_path = create_sandbox()
+    try:
+        (sandbox_path / 'main.py').write_text(SCRIPT)
+        command = Command(command=f'{shlex.quote(sys.executable)} main.py', timeout=10)
+        elapsed_times = []
+        for _ in range(runs):
+            resp = await execute_insecure(command, sandbox_path)
+            assert resp.exit_code == 0, resp.stderr  # noqa: S101
+            elapsed_times.append(resp.elapsed_time)
+        return elapsed_times
+    finally:
+        remove_sandbox(sandbox_path)
+
+
+def report(name: str, elapsed_times: list[float]) -> None:
+    percentiles = statistics.quantiles(elapsed_times, n=100)
+    print(f'{name:8} p50 {percentiles[49] * 1000:7.2f}ms  p99 {percentiles[98] * 1000:7.2f}ms')
+
+
+async def main(runs: int) -> None:
+    report('cold', await measure(runs))
+    await zygote.start()
+    try:
+        report('zygote', await measure(runs))
+    finally:
+        await zygote.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
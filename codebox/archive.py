@@ -0,0 +1,220 @@
+"""
+Extraction of tar and zip uploads into a sandbox.
+
+The archive may be compressed with gzip or zstd. Tar archives are extracted as their bytes arrive,
+while zip archives are spooled first because their index is at the end.
+
+The commands of the project come in the archive as well, as a JSON list in its MANIFEST file,
+which keeps them and their stdin out of URLs and access logs.
+"""
+
+import asyncio
+import gzip
+import io
+import os
+import shutil
+import stat
+import tarfile
+import zipfile
+import zlib
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import IO
+
+import zstandard
+from pydantic import TypeAdapter, ValidationError
+
+from . import config
+from .models import Command, Commands
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZIP_MAGIC = b'PK\x03\x04'
+EMPTY_ZIP_MAGIC = b'PK\x05\x06'
+
+MANIFEST = '.commands.json'
+
+command_list = TypeAdapter(Commands)
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+# errors raised by the decompressors and readers on malformed archives
+MALFORMED_ERRORS: tuple[type[Exception], ...] = (
+    tarfile.TarError,
+    zipfile.BadZipFile,
+    gzip.BadGzipFile,
+    zlib.error,
+    EOFError,
+    zstandard.ZstdError,
+)
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Readable file over an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:  # type: ignore[override]
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]  # no copy, even for large chunks
+        return size
+
+
+class _Writer:
+    """
+    Write the members of an archive into a sandbox, limiting their total size.
+    """
+
+    def __init__(self, dest_dir: Path, max_size: int) -> None:
+        self.dest_dir = dest_dir
+        self.max_size = max_size
+        self.remaining = max_size
+        self._dirs: set[Path] = {dest_dir}
+
+    def _mkdir(self, path: Path) -> None:
+        if path not in self._dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._dirs.update((path, *path.parents))
+
+    def _path(self, name: str) -> Path:
+        """
+        Same check as utils.save_source(), without resolving symbolic links on the disk
+        since archives can't create them.
+        """
+        path = Path(os.path.normpath(self.dest_dir / name.lstrip(os.sep)))
+        if not path.is_relative_to(self.dest_dir):
+            raise ArchiveError(f'Invalid file path: {path}')
+        return path
+
+    def directory(self, name: str) -> None:
+        self._mkdir(self._path(name))
+
+    def file(self, name: str, size: int, source: IO[bytes], executable: bool) -> None:
+        if size > self.remaining:
+            raise ArchiveError(f'Archive exceeds {self.max_size} bytes when extracted')
+        path = self._path(name)
+        self._mkdir(path.parent)
+        with path.open('wb') as dest:
+            shutil.copyfileobj(source, dest, 2**16)
+            written = dest.tell()
+        self.remaining -= written
+        if written != size or self.remaining < 0:
+            raise ArchiveError(f'Invalid size of archive member: {name}')
+        if executable:
+            path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _decompress(source: io.BufferedReader) -> io.BufferedReader:
+    magic = source.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        return io.BufferedReader(gzip.GzipFile(fileobj=source))  # type: ignore[arg-type]
+    if magic == ZSTD_MAGIC:
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(source))
+    return source
+
+
+def _extract_tar(source: IO[bytes], writer: _Writer) -> None:
+    with tarfile.open(fileobj=source, mode='r|') as archive:
+        for member in archive:
+            if member.isdir():
+                writer.directory(member.name)
+            elif member.isfile():
+                contents = archive.extractfile(member)
+                assert contents  # noqa: S101
+                writer.file(member.name, member.size, contents, bool(member.mode & 0o111))
+            else:
+                raise ArchiveError(f'Unsupported archive member type: {member.name}')
+
+
+def _extract_zip(source: IO[bytes], writer: _Writer) -> None:
+    with SpooledTemporaryFile(max_size=2**22) as spool:
+        copied = 0
+        while chunk := source.read(2**16):
+            copied += len(chunk)
+            if copied > writer.max_size:
+                raise ArchiveError(f'Archive exceeds {writer.max_size} bytes')
+            spool.write(chunk)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for member in archive.infolist():
+                mode = member.external_attr >> 16
+                if member.is_dir():
+                    writer.directory(member.filename)
+                elif stat.S_ISLNK(mode):
+                    raise ArchiveError(f'Unsupported archive member type: {member.filename}')
+                else:
+                    with archive.open(member) as contents:
+                        writer.file(member.filename, member.file_size, contents, bool(mode & 0o111))
+
+
+def extract(source: io.RawIOBase | IO[bytes], dest_dir: Path, max_size: int | None = None) -> None:
+    """
+    Extract a tar or zip archive, possibly compressed, into dest_dir.
+
+    Members must be regular files or directories within dest_dir.
+    """
+    reader = _decompress(io.BufferedReader(source))  # type: ignore[arg-type]
+    writer = _Writer(dest_dir, config.ARCHIVE_MAX_SIZE if max_size is None else max_size)
+    try:
+        magic = reader.peek(4)[:4]
+        if not magic:  # empty upload
+            return
+        if magic in (ZIP_MAGIC, EMPTY_ZIP_MAGIC):
+            _extract_zip(reader, writer)
+        else:
+            _extract_tar(reader, writer)
+    except MALFORMED_ERRORS as error:
+        raise ArchiveError(f'Invalid archive: {error}') from error
+
+
+async def extract_stream(chunks: AsyncIterator[bytes], dest_dir: Path) -> None:
+    """
+    Extract an archive as its chunks arrive. Extraction runs in a thread that pulls the chunks.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def next_chunk() -> bytes:
+        return await anext(chunks)
+
+    def pull() -> Iterator[bytes]:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+            except StopAsyncIteration:
+                return
+
+    await asyncio.to_thread(extract, ChunkReader(pull()), dest_dir)
+
+
+def read_manifest(dest_dir: Path) -> list[Command]:
+    """
+    Read and remove the commands of an extracted archive. Raise ArchiveError if they are
+    missing or invalid.
+    """
+    path = dest_dir / MANIFEST
+    try:
+        contents = path.read_bytes()
+    except FileNotFoundError:
+        raise ArchiveError(f'Missing {MANIFEST} with the commands in the archive') from None
+    path.unlink()
+    try:
+        return command_list.validate_json(contents)
+    except ValidationError as error:
+        raise ArchiveError(f'Invalid {MANIFEST}: {error}') from error
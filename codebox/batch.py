@@ -0,0 +1,40 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+from . import config
+from .codebox import execute
+from .models import ExecFunc, ProjectCore, Response
+from .result_cache import result_cache
+
+
+async def iter_batch(
+    projects: list[ProjectCore], exec_func: ExecFunc = execute, fan_out: int | None = None
+) -> AsyncGenerator[tuple[int, list[Response]], None]:
+    """
+    Run independent projects concurrently, each one in its own sandbox,
+    yielding the index and the responses of each project as soon as it finishes.
+    """
+    slots = asyncio.Semaphore(fan_out or config.BATCH_FAN_OUT)
+
+    async def run(index: int, project: ProjectCore) -> tuple[int, list[Response]]:
+        async with slots:
+            return index, await result_cache.run_project(project, exec_func)
+
+    tasks = [asyncio.create_task(run(index, project)) for index, project in enumerate(projects)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # a client that goes away must not leave projects running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_batch(
+    projects: list[ProjectCore], exec_func: ExecFunc = execute, fan_out: int | None = None
+) -> list[list[Response]]:
+    results: list[list[Response]] = [[] for _ in projects]
+    async for index, responses in iter_batch(projects, exec_func, fan_out):
+        results[index] = responses
+    return results
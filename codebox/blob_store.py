@@ -0,0 +1,184 @@
+"""
+Content-addressed store of input files.
+
+Large files shared by many projects, such as datasets or database dumps, are uploaded once
+and referenced by their SHA-256 digest. They are bind mounted read-only into the sandbox,
+so nothing is copied, or cloned or copied when the server is not allowed to mount file systems.
+Hard links are not used since a command could make the file writable and alter the stored blob.
+The blobs of running projects are pinned so that they are not evicted while in use.
+The least recently used blobs are evicted when BLOB_STORE_MAX_SIZE is exceeded.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from pathlib import Path
+from tempfile import NamedTemporaryFile, gettempdir
+from typing import IO
+
+from loguru import logger
+
+from . import config
+from .models import Blobs
+from .sandbox import bind_mount_read_only, unmount
+from .utils import clone_file, reset_owned_dir
+
+
+class MissingBlobs(Exception):  # noqa: N818
+    def __init__(self, digests: list[str]) -> None:
+        super().__init__(f'missing blobs: {", ".join(digests)}')
+        self.digests = digests
+
+
+class BlobTooLarge(ValueError):  # noqa: N818
+    pass
+
+
+def _write_chunk(file: IO[bytes], digest: 'hashlib._Hash', chunk: bytes) -> None:
+    digest.update(chunk)
+    file.write(chunk)
+
+
+def blob_path(dest_dir: Path, filepath: str) -> Path:
+    path = (dest_dir / filepath.lstrip(os.sep)).resolve()
+    # checks for malicious or malformed paths
+    if not path.is_relative_to(dest_dir):
+        raise ValueError(f'Invalid file path: {path}')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class BlobStore:
+    def __init__(self, store_dir: str | Path, max_size: int, max_blob_size: int) -> None:
+        self.store_dir = Path(store_dir or Path(gettempdir(), 'codebox_blobs'))
+        self._default_dir = not store_dir
+        self.max_size = max_size
+        self.max_blob_size = min(max_blob_size, max_size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # cleared when the server is not allowed to mount file systems
+        self.mount_supported = True
+        self.mounts = 0
+        self._blobs: OrderedDict[str, int] = OrderedDict()  # digest: size
+        self._pins: Counter[str] = Counter()  # digest: projects using it
+
+    def start(self) -> None:
+        """
+        Start with an empty store since the index is not persisted.
+        """
+        reset_owned_dir(self.store_dir, owned=self._default_dir)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'blobs': len(self._blobs),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'mounts': self.mounts,
+        }
+
+    def missing(self, digests: Iterable[str]) -> list[str]:
+        return list(dict.fromkeys(digest for digest in digests if digest not in self._blobs))
+
+    async def put(self, digest: str, chunks: AsyncIterator[bytes]) -> tuple[int, bool]:
+        """
+        Store the blob made of `chunks` and return its size and whether it is new.
+        Raise ValueError if the contents don't match the digest, and BlobTooLarge.
+        """
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return self._blobs[digest], False
+        sha256 = hashlib.sha256()
+        size = 0
+        with NamedTemporaryFile(dir=self.store_dir, prefix='.upload_', delete=False) as file:
+            try:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_blob_size:
+                        raise BlobTooLarge(f'blob exceeds {self.max_blob_size} bytes')
+                    await asyncio.to_thread(_write_chunk, file, sha256, chunk)
+                if sha256.hexdigest() != digest:
+                    raise ValueError(f'contents do not match the digest {digest}')
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        os.chmod(file.name, 0o444)
+        os.replace(file.name, self.store_dir / digest)
+        if digest not in self._blobs:  # the same blob might have been uploaded meanwhile
+            self._blobs[digest] = size
+            self.size += size
+        await self._evict(keep=digest)
+        return size, True
+
+    @asynccontextmanager
+    async def provide(self, blobs: Blobs, dest_dir: Path) -> AsyncIterator[None]:
+        """
+        Put the referenced blobs into the sandbox, read-only, and unmount them when the context
+        exits. Raise MissingBlobs if any is not stored. The blobs are not evicted meanwhile.
+        """
+        if missing := self.missing(blobs.values()):
+            self.misses += 1
+            raise MissingBlobs(missing)
+        self.hits += 1
+        digests = list(blobs.values())
+        for digest in digests:
+            self._blobs.move_to_end(digest)
+            self._pins[digest] += 1
+        try:
+            mount_points = await asyncio.to_thread(self._provide_all, blobs, dest_dir)
+            try:
+                yield
+            finally:
+                for mount_point in reversed(mount_points):
+                    unmount(mount_point)
+        finally:
+            self._pins -= Counter(digests)
+
+    def _provide_all(self, blobs: Blobs, dest_dir: Path) -> list[Path]:
+        mount_points: list[Path] = []
+        try:
+            for filepath, digest in blobs.items():
+                src, dest = self.store_dir / digest, blob_path(dest_dir, filepath)
+                if self._mount(src, dest):
+                    mount_points.append(dest)
+                else:
+                    clone_file(src, dest)
+                    os.chmod(dest, 0o444)
+        except BaseException:
+            for mount_point in reversed(mount_points):
+                unmount(mount_point)
+            raise
+        return mount_points
+
+    def _mount(self, src: Path, dest: Path) -> bool:
+        if not self.mount_supported:
+            return False
+        dest.touch()
+        try:
+            bind_mount_read_only(src, dest)
+        except OSError as error:
+            self.mount_supported = False
+            logger.warning(f'blob mounts disabled, blobs are copied: {error}')
+            return False
+        self.mounts += 1
+        return True
+
+    async def _evict(self, keep: str) -> None:
+        while self.size > self.max_size:
+            # the least recently used blob that no project is using
+            digest = next((d for d in self._blobs if d != keep and not self._pins[d]), None)
+            if digest is None:
+                break
+            self.size -= self._blobs.pop(digest)
+            self.evictions += 1
+            logger.debug(f'blob evicted: {digest}')
+            await asyncio.to_thread((self.store_dir / digest).unlink, missing_ok=True)
+
+
+blob_store = BlobStore(config.BLOB_STORE_DIR, config.BLOB_STORE_MAX_SIZE, config.BLOB_MAX_SIZE)
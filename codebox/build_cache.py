@@ -0,0 +1,200 @@
+"""
+Content-addressed cache of compiler outputs.
+
+A compilation is identified by the compiler version, its command line and the contents
+of the sandbox right before it runs. The files produced by a successful compilation are stored,
+so that an identical compilation only has to copy them back into the sandbox.
+"""
+
+import asyncio
+import hashlib
+import os
+import shlex
+import shutil
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+from loguru import logger
+
+from . import config
+from .datasets import dataset_registry
+from .models import Command, ExecFunc, Response
+from .utils import available_languages, reset_owned_dir
+
+# compiler executable: language name used in available_languages()
+CACHED_COMPILERS = {'rustc': 'rust'}
+
+Snapshot = dict[str, tuple[int, int]]
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class CacheEntry:
+    response: Response
+    files: list[str]
+    size: int
+
+
+def snapshot(sandbox_path: Path) -> Snapshot:
+    """
+    Map each file of the sandbox to its size and modification time.
+    The datasets are left out: they can be large and are keyed by their fingerprint instead.
+    """
+    result = {}
+    for root, dirnames, filenames in os.walk(sandbox_path):
+        if root == str(sandbox_path) and 'datasets' in dirnames:
+            dirnames.remove('datasets')
+        for filename in filenames:
+            path = Path(root, filename)
+            if path.is_file() and not path.is_symlink():
+                stat = path.stat()
+                result[str(path.relative_to(sandbox_path))] = (stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def build_key(arguments: list[str], stdin: str | None, version: str, sandbox_path: Path) -> str:
+    digest = hashlib.sha256()
+    for part in (version, *arguments, stdin or ''):
+        digest.update(part.encode() + b'\0')
+    datasets_dir = sandbox_path / 'datasets'
+    if datasets_dir.is_dir():
+        for name in sorted(os.listdir(datasets_dir)):
+            fingerprint = dataset_registry.fingerprint(name) or ''
+            digest.update(f'datasets/{name}\0{fingerprint}'.encode() + b'\0')
+    for filepath in sorted(snapshot(sandbox_path)):
+        digest.update(filepath.encode() + b'\0')
+        with open(sandbox_path / filepath, 'rb') as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def copy_files(filepaths: list[str], src_dir: Path, dest_dir: Path) -> None:
+    """
+    Copy files keeping their mode and owner, so they are still usable inside the jail.
+    """
+    for filepath in filepaths:
+        src, dest = src_dir / filepath, dest_dir / filepath
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dest)
+        stat = src.stat()
+        with suppress(PermissionError):
+            os.chown(dest, stat.st_uid, stat.st_gid)
+
+
+class BuildCache:
+    def __init__(self, cache_dir: str | Path, max_size: int) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Event] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    def start(self) -> None:
+        """
+        Start with an empty cache since the index is not persisted.
+        """
+        if not self.cache_dir:
+            return
+        reset_owned_dir(self.cache_dir)
+
+    def _entry_dir(self, key: str) -> Path:
+        assert self.cache_dir  # noqa: S101
+        return self.cache_dir / key
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    async def execute(self, command: Command, sandbox_path: Path, exec_func: ExecFunc) -> Response:
+        """
+        Execute a command through the cache if it is a cacheable compilation.
+        """
+        arguments = shlex.split(command.command)
+        language = arguments and CACHED_COMPILERS.get(Path(arguments[0]).name)
+        # the check of the output is not part of the key
+        if not self.enabled or not language or command.expected:
+            return await exec_func(command, sandbox_path)
+
+        version = (await asyncio.to_thread(available_languages))[language]
+        key = await asyncio.to_thread(build_key, arguments, command.stdin, version, sandbox_path)
+        # single flight: identical compilations wait for the one already running
+        while True:
+            if key in self._entries:
+                try:
+                    return await self._restore(key, sandbox_path)
+                except OSError as error:  # the entry might have been evicted meanwhile
+                    logger.warning(f'build cache restore failed: {error}')
+                    self._discard(key)
+                    break
+            if (flight := self._in_flight.get(key)) is None:
+                break
+            await flight.wait()
+
+        self.misses += 1
+        self._in_flight[key] = flight = asyncio.Event()
+        try:
+            before = await asyncio.to_thread(snapshot, sandbox_path)
+            response = await exec_func(command, sandbox_path)
+            if response.exit_code == 0:
+                await self._store(key, response, sandbox_path, before)
+        finally:
+            del self._in_flight[key]
+            flight.set()
+        return response
+
+    def _discard(self, key: str) -> CacheEntry | None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
+        return entry
+
+    async def _restore(self, key: str, sandbox_path: Path) -> Response:
+        start_time = perf_counter()
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        await asyncio.to_thread(copy_files, entry.files, self._entry_dir(key), sandbox_path)
+        self.hits += 1
+        return entry.response.model_copy(
+            update={'elapsed_time': perf_counter() - start_time, 'queue_time': 0, 'cached': True}
+        )
+
+    async def _store(
+        self, key: str, response: Response, sandbox_path: Path, before: Snapshot
+    ) -> None:
+        after = await asyncio.to_thread(snapshot, sandbox_path)
+        files = [name for name, signature in after.items() if before.get(name) != signature]
+        size = sum(after[name][0] for name in files)
+        if size > self.max_size or key in self._entries:
+            return
+        entry_dir = self._entry_dir(key)
+        try:
+            await asyncio.to_thread(copy_files, files, sandbox_path, entry_dir)
+        except OSError as error:
+            logger.warning(f'build cache store failed: {error}')
+            await asyncio.to_thread(shutil.rmtree, entry_dir, ignore_errors=True)
+            return
+        self._entries[key] = CacheEntry(response=response, files=files, size=size)
+        self.size += size
+        while self.size > self.max_size:
+            old_key = next(iter(self._entries))
+            self._discard(old_key)
+            await asyncio.to_thread(shutil.rmtree, self._entry_dir(old_key), ignore_errors=True)
+
+
+build_cache = BuildCache(config.BUILD_CACHE_DIR, config.BUILD_CACHE_MAX_SIZE)
@@ -0,0 +1,150 @@
+"""
+Checking of the output of a command against its expected output, while the output is read.
+
+The verdict, the SHA-256 digest of the output and an excerpt of the first difference
+replace the output in the response, so that large outputs are neither kept nor sent.
+The comparison is:
+
+* ``exact``: byte for byte
+* ``whitespace``: token by token, tokens being separated by any amount of whitespace
+* ``float``: like ``whitespace``, but tokens that are both numbers can differ
+  by `tolerance`, absolute or relative
+* ``sha256``: the digest of the output is the expected output
+"""
+
+import hashlib
+import math
+from os.path import commonprefix
+
+from .models import Check, Expected
+
+EXCERPT_SIZE = 40  # bytes of each side of a difference shown in its excerpt
+END = 'end of output'
+
+
+def _excerpt(data: bytes) -> str:
+    return repr(data.decode(errors='replace'))
+
+
+class OutputChecker:
+    def __init__(self, expected: Expected) -> None:
+        self.expected = expected
+        self.sha256 = hashlib.sha256()
+        self.difference = ''
+        # exact comparison
+        self.expected_bytes = expected.output.encode()
+        self.offset = 0
+        self.lines = 1
+        self.before = b''  # output right before the difference
+        self.after = b''  # output from the difference on
+        self.mismatch: int | None = None
+        # token comparisons
+        self.expected_tokens = self.expected_bytes.split()
+        self.max_token_size = max(map(len, self.expected_tokens), default=0) + EXCERPT_SIZE
+        self.token_index = 0
+        self.partial = b''
+
+    def feed(self, chunk: bytes) -> None:
+        self.sha256.update(chunk)
+        if self.difference:
+            return
+        if self.expected.mode == 'exact':
+            self._feed_bytes(chunk)
+        elif self.expected.mode in ('whitespace', 'float'):
+            self._feed_tokens(chunk)
+
+    def result(self) -> Check:
+        digest = self.sha256.hexdigest()
+        if self.expected.mode == 'sha256':
+            accepted = digest == self.expected.output.lower()
+            if not accepted:
+                self.difference = f'expected digest {self.expected.output}'
+        elif self.expected.mode == 'exact':
+            if self.mismatch is None and self.offset < len(self.expected_bytes):
+                self.mismatch = self.offset  # the output is shorter
+            if self.mismatch is not None and not self.difference:
+                self._describe_mismatch()
+            accepted = self.mismatch is None
+        else:
+            if not self.difference:
+                self._compare_tokens([self.partial] if self.partial else [])
+            if not self.difference and self.token_index < len(self.expected_tokens):
+                expected = self.expected_tokens[self.token_index]
+                position = f'token {self.token_index + 1}'
+                self.difference = f'{position}: expected {_excerpt(expected)}, got {END}'
+            accepted = not self.difference
+        return Check(
+            verdict='accepted' if accepted else 'wrong_answer',
+            sha256=digest,
+            difference=self.difference,
+        )
+
+    def _feed_bytes(self, chunk: bytes) -> None:
+        if self.mismatch is not None:
+            # only the beginning of the output after the difference is kept
+            self.after += chunk[: EXCERPT_SIZE - len(self.after)]
+            if len(self.after) >= EXCERPT_SIZE:
+                self._describe_mismatch()
+            return
+        expected = self.expected_bytes[self.offset : self.offset + len(chunk)]
+        if chunk == expected:
+            self._advance(chunk)
+            return
+        same = len(commonprefix([chunk, expected]))
+        self._advance(chunk[:same])
+        self.mismatch = self.offset
+        self._feed_bytes(chunk[same:])
+
+    def _advance(self, data: bytes) -> None:
+        self.offset += len(data)
+        self.lines += data.count(b'\n')
+        self.before = (self.before + data)[-EXCERPT_SIZE:]
+
+    def _describe_mismatch(self) -> None:
+        assert self.mismatch is not None  # noqa: S101
+        expected = self.expected_bytes[self.mismatch : self.mismatch + EXCERPT_SIZE]
+        self.difference = (
+            f'line {self.lines}, byte {self.mismatch + 1}: after {_excerpt(self.before)}, '
+            f'expected {_excerpt(expected) if expected else END}, '
+            f'got {_excerpt(self.after) if self.after else END}'
+        )
+
+    def _feed_tokens(self, chunk: bytes) -> None:
+        data = self.partial + chunk
+        tokens = data.split()
+        # the last token might go on in the next chunk
+        self.partial = tokens.pop() if tokens and not data[-1:].isspace() else b''
+        self._compare_tokens(tokens)
+        if not self.difference and len(self.partial) > self.max_token_size:
+            # longer than any expected token, it can't be kept until it ends
+            position = f'token {self.token_index + 1}'
+            self.difference = (
+                f'{position}: got too long a token {_excerpt(self.partial[:EXCERPT_SIZE])}'
+            )
+
+    def _compare_tokens(self, tokens: list[bytes]) -> None:
+        for token in tokens:
+            position = f'token {self.token_index + 1}'
+            if self.token_index >= len(self.expected_tokens):
+                self.difference = (
+                    f'{position}: expected {END}, got {_excerpt(token[:EXCERPT_SIZE])}'
+                )
+                return
+            expected = self.expected_tokens[self.token_index]
+            if not self._same_token(expected, token):
+                got = _excerpt(token[:EXCERPT_SIZE])
+                self.difference = f'{position}: expected {_excerpt(expected)}, got {got}'
+                return
+            self.token_index += 1
+
+    def _same_token(self, expected: bytes, token: bytes) -> bool:
+        if expected == token:
+            return True
+        if self.expected.mode != 'float':
+            return False
+        try:
+            expected_value, value = float(expected), float(token)
+        except ValueError:
+            return False
+        tolerance = self.expected.tolerance
+        return math.isclose(expected_value, value, rel_tol=tolerance, abs_tol=tolerance)
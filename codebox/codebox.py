@@ -4,63 +4,284 @@ Core Snekbox functionality, providing safe execution of Python code.
 See config/snekbox.cfg for the default NsJail configuration.
 """
 
+import asyncio
 import os
 import shlex
-from collections.abc import Callable, Sequence
+import signal
+from asyncio.subprocess import PIPE, Process
+from codecs import getincrementaldecoder
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Sequence
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager, suppress
+from contextvars import ContextVar
+from functools import partial
 from pathlib import Path
-from subprocess import TimeoutExpired, run
-from tempfile import NamedTemporaryFile, TemporaryDirectory
 from time import perf_counter
 
 from loguru import logger
 
-from . import config
-from .models import Command, Response, Sourcefiles
-from .nsjail.nsjail import NSJAIL_ARGS, parse_log
+from . import config, metrics
+from .archive import ArchiveError, extract_stream, read_manifest
+from .blob_store import blob_store
+from .build_cache import build_cache
+from .checker import OutputChecker
+from .datasets import dataset_registry
+from .models import (
+    Blobs,
+    Command,
+    Datasets,
+    ExecFunc,
+    Expected,
+    OutputHandler,
+    Response,
+    Sourcefiles,
+    Termination,
+)
+from .nsjail import cgroup
+from .nsjail.nsjail import cgroup_version, get_nsjail_args, parse_log, parse_termination
+from .sandbox import sandbox_pool
 from .utils import save_source
+from .zygote import ZygoteProcess, zygote
 
+# global limit of simultaneous executions, regardless of how many requests are being served
+execution_slots = asyncio.Semaphore(config.MAX_CONCURRENT_EXECUTIONS)
 
-def _execute(
+# estimated overhead of setting up a jail. See measure_jail_setup_time()
+jail_setup_time: float | None = None
+
+# index in its project of the command running in the current task, for the output handlers
+current_command: ContextVar[int] = ContextVar('current_command', default=0)
+
+
+@asynccontextmanager
+async def execution_slot() -> AsyncIterator[float]:
+    """
+    Wait for a free execution slot and yield how long it took to get one.
+    """
+    start_time = perf_counter()
+    async with execution_slots:
+        queue_time = perf_counter() - start_time
+        metrics.phase_duration.observe(queue_time, phase='queue_wait')
+        metrics.in_flight.inc()
+        try:
+            yield queue_time
+        finally:
+            metrics.in_flight.dec()
+
+
+class _Capture:
+    """
+    Keep up to `limit` bytes of a stream and count the remaining ones.
+    """
+
+    def __init__(self, limit: int, store: bool = True) -> None:
+        self.limit = limit
+        self.store = store
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.kept = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.size > self.kept
+
+    def add(self, chunk: bytes) -> bytes:
+        """
+        Account for a new chunk and return the part of it that is within the limit.
+        """
+        self.size += len(chunk)
+        chunk = chunk[: max(self.limit - self.kept, 0)]
+        self.kept += len(chunk)
+        if self.store and chunk:
+            self.chunks.append(chunk)
+        return chunk
+
+    def text(self) -> str:
+        return b''.join(self.chunks).decode(errors='replace')
+
+
+async def _read_stream(
+    stream: asyncio.StreamReader,
+    name: str,
+    capture: _Capture,
+    output: OutputHandler | None,
+    checker: OutputChecker | None = None,
+) -> None:
+    """
+    Read the stream until its end, passing the chunks within the limit on to the output handler.
+    Chunks beyond the limit are discarded, but the checker gets all of them.
+    """
+    decoder = getincrementaldecoder('utf-8')(errors='replace')
+    while chunk := await stream.read(2**16):
+        if checker:
+            checker.feed(chunk)
+        chunk = capture.add(chunk)
+        if output and chunk and (text := decoder.decode(chunk)):
+            await output(name, text)
+    if output and (text := decoder.decode(b'', final=True)):
+        await output(name, text)
+
+
+async def _write_stdin(process: Process | ZygoteProcess, stdin: str | None) -> None:
+    assert process.stdin  # noqa: S101
+    # the process might finish before reading its whole input
+    with suppress(BrokenPipeError, ConnectionResetError):
+        if stdin:
+            process.stdin.write(stdin.encode())
+            await process.stdin.drain()
+        process.stdin.close()
+
+
+async def _execute(  # noqa: PLR0913
     arguments: Sequence[str],
     stdin: str | None,
     timeout: float | None = config.TIMEOUT,
     cwd: str | Path | None = None,
+    *,
+    output: OutputHandler | None = None,
+    output_limit: int = config.COMMAND_OUTPUT_LIMIT,
+    spawn: Callable[..., Awaitable[Process | ZygoteProcess]] | None = None,
+    expected: Expected | None = None,
 ) -> Response:
     """
     Execution core
+
+    At most `output_limit` bytes of stdout and of stderr are kept or passed on to `output`.
+    `spawn(arguments, cwd)` replaces the creation of a subprocess.
+    If there is an `expected` output, stdout is checked against it instead of being kept.
     """
     logger.debug(' '.join(arguments))
     exit_code = -1
-    stdout = stderr = ''
-    start_time = perf_counter()
+    checker = OutputChecker(expected) if expected else None
+    stdout = _Capture(output_limit, store=output is None and checker is None)
+    stderr = _Capture(output_limit, store=output is None)
+    error_msg = ''
+    termination = None
+    async with execution_slot() as queue_time:
+        start_time = perf_counter()
+        try:
+            with metrics.phase_duration.time(phase='spawn'):
+                if spawn:
+                    process = await spawn(arguments, cwd)
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        *arguments, stdin=PIPE, stdout=PIPE, stderr=PIPE, cwd=cwd
+                    )
+            assert process.stdout and process.stderr  # noqa: S101
+            io_tasks = [
+                asyncio.create_task(
+                    _read_stream(
+                        process.stdout, 'stdout', stdout, None if checker else output, checker
+                    )
+                ),
+                asyncio.create_task(_read_stream(process.stderr, 'stderr', stderr, output)),
+                asyncio.create_task(_write_stdin(process, stdin)),
+            ]
+            try:
+                await asyncio.wait_for(asyncio.gather(*io_tasks, process.wait()), timeout)
+                exit_code = process.returncode  # type: ignore
+                if exit_code < 0:
+                    termination = Termination(reason='signal', signal=-exit_code)
+                else:
+                    termination = Termination(reason='exited')
+            except TimeoutError:
+                process.kill()
+                await process.wait()
+                error_msg = f'Timeout Error. Exceeded {timeout}s'
+                termination = Termination(reason='timeout')
+                metrics.timeouts.inc()
+            except BaseException:
+                # a cancelled execution must not leave its process running
+                with suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+                raise
+            finally:
+                # descendants might keep the pipes open after the process is gone
+                for task in io_tasks:
+                    task.cancel()
+        except Exception as error:
+            error_msg = str(error)
+        elapsed_time = perf_counter() - start_time
+    metrics.phase_duration.observe(elapsed_time, phase='runtime')
+    if exit_code:
+        metrics.nonzero_exits.inc()
+    return Response(
+        stdout=stdout.text(),
+        stderr=stderr.text() or error_msg,
+        exit_code=exit_code,
+        elapsed_time=elapsed_time,
+        queue_time=queue_time,
+        stdout_size=stdout.size,
+        stderr_size=stderr.size,
+        stdout_truncated=stdout.truncated,
+        stderr_truncated=stderr.truncated,
+        termination=termination,
+        check=checker.result() if checker else None,
+    )
+
+
+async def _read_log(fd: int) -> list[str]:
+    """
+    Read the lines written to the pipe until all of its write ends are closed.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, 'rb', 0)
+    )
     try:
-        process = run(
-            arguments,  # type: ignore
-            input=stdin,
-            timeout=timeout,
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-        )
-        stdout = process.stdout
-        stderr = process.stderr
-        exit_code = process.returncode
-    except TimeoutExpired as error:
-        stdout = error.stdout and error.stdout.decode() or ''
-        stderr = (
-            error.stderr and error.stderr.decode() or f'Timeout Error. Exceeded {error.timeout}s'
-        )
-    except Exception as error:
-        stderr = str(error)
-    elapsed_time = perf_counter() - start_time
-    return Response(stdout=stdout, stderr=stderr, exit_code=exit_code, elapsed_time=elapsed_time)
+        return (await reader.read()).decode(errors='replace').splitlines()
+    finally:
+        transport.close()
+
+
+def _jail_termination(
+    response: Response, log_lines: list[str], limit_events: dict[str, int]
+) -> Termination | None:
+    """
+    Tell why a jailed process ended from NsJail's log and the limits the jail hit.
+    """
+    termination = response.termination
+    if termination is None or termination.reason == 'timeout':
+        return termination
+    termination = parse_termination(log_lines) or termination
+    if termination.reason == 'timeout':
+        return termination
+    if limit_events.get('oom_kills'):
+        return Termination(reason='oom', signal=int(signal.SIGKILL))
+    if limit_events.get('pid_limit_hits') and response.exit_code:
+        return Termination(reason='pid_limit', signal=termination.signal)
+    return termination
 
 
-def execute(command: Command, sandbox_path: Path) -> Response:
+async def execute(
+    command: Command,
+    sandbox_path: Path,
+    output: OutputHandler | None = None,
+    output_limit: int = config.COMMAND_OUTPUT_LIMIT,
+) -> Response:
     """
     Execute a command in an isolated environment and return its response.
+
+    NsJail writes its log to a pipe, which is read while the command runs.
     """
-    with NamedTemporaryFile() as nsj_log:
+    version = cgroup_version()
+    accounting = cgroup.create_accounting(version)
+    accounting_args = accounting[1] if accounting else []
+    log_read, log_write = os.pipe()
+    log_file = os.fdopen(log_write, 'wb', 0)
+    log_lines = asyncio.create_task(_read_log(log_read))
+
+    async def spawn(arguments: Sequence[str], cwd: str | Path | None) -> Process:
+        try:
+            return await asyncio.create_subprocess_exec(
+                *arguments, stdin=PIPE, stdout=PIPE, stderr=PIPE, cwd=cwd, pass_fds=(log_write,)
+            )
+        finally:
+            # only NsJail keeps the write end, so the log ends when NsJail does
+            log_file.close()
+
+    try:
         # fmt: off
         arguments = (
             config.NSJAIL_PATH,
@@ -68,51 +289,325 @@ def execute(command: Command, sandbox_path: Path) -> Response:
             '--env', 'HOME=/sandbox',
             '--cwd', '/sandbox',
             '--bindmount', f'{sandbox_path}:/sandbox',
-            '--log', nsj_log.name,
-            *NSJAIL_ARGS,
+            '--log_fd', str(log_write),
+            *get_nsjail_args(),
+            *accounting_args,
             '--', *shlex.split(command.command)
         )
         # fmt: on
-        response = _execute(arguments, command.stdin, command.timeout)
+        response = await _execute(
+            arguments,
+            command.stdin,
+            command.timeout,
+            output=output,
+            output_limit=output_limit,
+            spawn=spawn,
+            expected=command.expected,
+        )
+        log_file.close()
+        try:
+            lines = await asyncio.wait_for(log_lines, config.NSJAIL_LOG_TIMEOUT)
+        except TimeoutError:
+            lines = []
         if response.exit_code and not response.stderr:
-            log_lines = nsj_log.read().decode('utf-8').splitlines()
-            parse_log(log_lines)
-    return response
+            parse_log(lines)
+        usage: dict = {}
+        limit_events: dict[str, int] = {}
+        if accounting:
+            usage = cgroup.read_usage(version, accounting[0])
+            limit_events = cgroup.read_limit_events(version, accounting[0])
+        usage['termination'] = _jail_termination(response, lines, limit_events)
+    finally:
+        log_file.close()
+        log_lines.cancel()
+        if accounting:
+            cgroup.remove_accounting(version, accounting[0])
+    if jail_setup_time is not None:
+        usage['setup_time'] = min(jail_setup_time, response.elapsed_time)
+    return response.model_copy(update=usage)
 
 
-def execute_insecure(command: Command, sandbox_path: Path) -> Response:
+async def measure_jail_setup_time(samples: int = 3) -> None:
+    """
+    Estimate how long NsJail takes to set a jail up by timing jails that do nothing.
+    """
+    global jail_setup_time  # noqa: PLW0603
+    elapsed_times = []
+    async with sandbox_pool.sandbox() as sandbox_path:
+        for _ in range(samples):
+            response = await execute(Command(command='/bin/true', timeout=5), sandbox_path)
+            if response.exit_code == 0:
+                elapsed_times.append(response.elapsed_time)
+    if elapsed_times:
+        jail_setup_time = min(elapsed_times)
+        logger.info(f'jail setup time: {jail_setup_time * 1000:.0f}ms')
+
+
+async def execute_insecure(
+    command: Command,
+    sandbox_path: Path,
+    output: OutputHandler | None = None,
+    output_limit: int = config.COMMAND_OUTPUT_LIMIT,
+) -> Response:
     """
     Execute a command directly in the container, in an isolated environment.
     It is suitable for running each command in a different container
     or to run the container in a different platform that doesn't run NsJail,
     such as linux/arm64 on MacOS
+
+    Python scripts are forked from the zygote when it is running.
     """
-    return _execute(
-        (*shlex.split(command.command),),
+    arguments = shlex.split(command.command)
+    return await _execute(
+        arguments,
         stdin=command.stdin,
         timeout=command.timeout,
         cwd=sandbox_path,
+        output=output,
+        output_limit=output_limit,
+        spawn=zygote.spawn if zygote.accepts(arguments) else None,
+        expected=command.expected,
     )
 
 
-def run_project(
-    sources: Sourcefiles, commands: list[Command], exec_func: Callable = execute
-) -> list[Response]:
-    responses = []
-    with TemporaryDirectory(prefix='sandbox_') as sandbox:
-        sandbox_path = Path(sandbox)
-        os.chmod(sandbox_path, 0o0777)  # to be used in nsjail later  # noqa: S103
-        logger.info('run project', source_files=sources)
-        for filepath, contents in sources.items():
+@asynccontextmanager
+async def project_sandbox(
+    sources: Sourcefiles,
+    *,
+    archive: AsyncIterator[bytes] | None = None,
+    blobs: Blobs | None = None,
+    datasets: Datasets | None = None,
+) -> AsyncIterator[tuple[Path, list[Response]]]:
+    """
+    Yield a sandbox with the files of a project, and the responses reporting the files
+    that could not be put into it.
+
+    The chunks of a tar or zip `archive` are extracted into the sandbox along with the sources,
+    The `blobs` of the blob store are mounted, and the `datasets` are mounted or snapshotted
+    under datasets/, until the context exits.
+    """
+    async with sandbox_pool.sandbox() as sandbox_path, AsyncExitStack() as mounts:
+        errors = []
+        with metrics.phase_duration.time(phase='save_source'):
+            for filepath, contents in sources.items():
+                try:
+                    save_source(sandbox_path, filepath, contents)
+                except Exception as error:
+                    logger.info(error)
+                    errors.append(Response(stderr=str(error), exit_code=-1))
+            if archive is not None and not errors:
+                try:
+                    await extract_stream(archive, sandbox_path)
+                except Exception as error:
+                    logger.info(error)
+                    errors.append(Response(stderr=str(error), exit_code=-1))
+            if blobs and not errors:
+                try:
+                    await mounts.enter_async_context(blob_store.provide(blobs, sandbox_path))
+                except Exception as error:
+                    logger.info(error)
+                    errors.append(Response(stderr=str(error), exit_code=-1))
+            if datasets and not errors:
+                try:
+                    await mounts.enter_async_context(
+                        dataset_registry.provide(datasets, sandbox_path)
+                    )
+                except Exception as error:
+                    logger.info(error)
+                    errors.append(Response(stderr=str(error), exit_code=-1))
+        yield sandbox_path, errors
+
+
+async def iter_project(  # noqa: PLR0913
+    sources: Sourcefiles,
+    commands: list[Command] | None,
+    exec_func: ExecFunc = execute,
+    *,
+    archive: AsyncIterator[bytes] | None = None,
+    blobs: Blobs | None = None,
+    datasets: Datasets | None = None,
+) -> AsyncGenerator[Response, None]:
+    """
+    Run a project yielding the response of each command as soon as it is available.
+    See project_sandbox() for the other files of the project.
+    Without `commands`, they are read from the manifest of the `archive`.
+    """
+    logger.info('run project', source_files=sources)
+    files = project_sandbox(sources, archive=archive, blobs=blobs, datasets=datasets)
+    async with files as (sandbox_path, errors):
+        if errors:
+            for resp in errors:
+                yield resp
+            return
+        if commands is None:
             try:
-                save_source(sandbox_path, filepath, contents)
-            except Exception as error:
+                commands = await asyncio.to_thread(read_manifest, sandbox_path)
+            except ArchiveError as error:
                 logger.info(error)
-                responses.append(Response(stderr=str(error), exit_code=-1))
-        if responses:
-            return responses
-        for command in commands:
-            resp = exec_func(command, sandbox_path)
-            logger.info(resp)
-            responses.append(resp)
-    return responses
+                yield Response(stderr=str(error), exit_code=-1)
+                return
+        async with aclosing(iter_commands(commands, sandbox_path, exec_func)) as responses:
+            async for resp in responses:
+                yield resp
+
+
+async def iter_commands(
+    commands: list[Command], sandbox_path: Path, exec_func: ExecFunc = execute
+) -> AsyncGenerator[Response, None]:
+    """
+    Run commands in a sandbox, yielding the response of each one in the order of `commands`.
+
+    A command starts when the commands of its `depends_on` have ended, or the previous command
+    if it has no `depends_on`. Commands that don't depend on each other run at the same time,
+    in separate jails on the same sandbox, at most PROJECT_PARALLELISM at once.
+    """
+    # the output kept for the whole project is limited as well. The limit of each stream of a
+    # command is taken from it when the command starts, so that commands running together
+    # can't exceed it, and what the streams didn't use is given back when the command ends
+    remaining = config.PROJECT_OUTPUT_LIMIT
+
+    async def run(index: int, command: Command, exclusive: bool = True) -> Response:
+        nonlocal remaining
+        current_command.set(index)
+        metrics.executions.inc(language=metrics.command_language(command.command))
+        output_limit = min(config.COMMAND_OUTPUT_LIMIT, max(remaining, 0))
+        # stdout and stderr are limited separately
+        reserved = 2 * output_limit
+        remaining -= reserved
+        limited_exec = partial(exec_func, output_limit=output_limit)
+        try:
+            # the build cache takes the files that appear in the sandbox during a compilation
+            # as its outputs, which is only right if nothing else runs meanwhile
+            if exclusive:
+                resp = await build_cache.execute(command, sandbox_path, limited_exec)
+            else:
+                resp = await limited_exec(command, sandbox_path)
+        except BaseException:
+            remaining += reserved
+            raise
+        remaining += reserved - min(resp.stdout_size, output_limit)
+        remaining -= min(resp.stderr_size, output_limit)
+        remaining = max(remaining, 0)
+        logger.info('command response', response=resp)
+        return resp
+
+    if all(command.depends_on is None for command in commands):
+        for index, command in enumerate(commands):
+            yield await run(index, command)
+        return
+
+    ancestors = command_ancestors(commands)
+    parallelism = asyncio.Semaphore(config.PROJECT_PARALLELISM)
+    tasks: list[asyncio.Task[Response]] = []
+
+    async def run_after(index: int, command: Command, dependencies: list[int]) -> Response:
+        if dependencies:
+            # waiting doesn't cancel the dependencies if this command is cancelled
+            await asyncio.wait([tasks[dependency] for dependency in dependencies])
+        exclusive = all(
+            other in ancestors[index] or index in ancestors[other]
+            for other in range(len(commands))
+            if other != index
+        )
+        async with parallelism:
+            return await run(index, command, exclusive)
+
+    try:
+        for index, command in enumerate(commands):
+            dependencies = command_dependencies(index, command)
+            tasks.append(asyncio.create_task(run_after(index, command, dependencies)))
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def command_dependencies(index: int, command: Command) -> list[int]:
+    if command.depends_on is None:
+        return [index - 1] if index else []
+    return command.depends_on
+
+
+def command_ancestors(commands: list[Command]) -> list[set[int]]:
+    """
+    Return the indices of the commands that end before each command starts.
+    """
+    ancestors: list[set[int]] = []
+    for index, command in enumerate(commands):
+        dependencies = command_dependencies(index, command)
+        ancestors.append(set(dependencies).union(*(ancestors[d] for d in dependencies)))
+    return ancestors
+
+
+async def run_project(  # noqa: PLR0913
+    sources: Sourcefiles,
+    commands: list[Command] | None,
+    exec_func: ExecFunc = execute,
+    *,
+    archive: AsyncIterator[bytes] | None = None,
+    blobs: Blobs | None = None,
+    datasets: Datasets | None = None,
+) -> list[Response]:
+    project = iter_project(
+        sources, commands, exec_func, archive=archive, blobs=blobs, datasets=datasets
+    )
+    async with aclosing(project) as responses:
+        return [resp async for resp in responses]
+
+
+async def stream_project(
+    sources: Sourcefiles,
+    commands: list[Command],
+    exec_func: ExecFunc = execute,
+    *,
+    blobs: Blobs | None = None,
+    datasets: Datasets | None = None,
+) -> AsyncGenerator[tuple[str, dict], None]:
+    """
+    Run a project yielding its events as they happen:
+
+    * ``stdout`` and ``stderr`` events carry output chunks of the running commands
+    * an ``exit`` event carries the response of each finished command,
+      without the output already streamed
+    * the final ``done`` event carries all responses
+
+    Output is not accumulated. A slow client slows the producing command down instead.
+    """
+    events: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue(config.STREAM_QUEUE_SIZE)
+
+    async def output(name: str, data: str) -> None:
+        await events.put((name, {'command': current_command.get(), 'data': data}))
+
+    async def produce() -> None:
+        index = 0
+        responses = []
+        try:
+            project = iter_project(
+                sources,
+                commands,
+                partial(exec_func, output=output),
+                blobs=blobs,
+                datasets=datasets,
+            )
+            async with aclosing(project):
+                async for resp in project:
+                    await events.put(('exit', {'command': index, **resp.model_dump()}))
+                    responses.append(resp.model_dump())
+                    index += 1
+            await events.put(('done', {'responses': responses}))
+        except Exception:
+            await events.put(None)
+            raise
+        await events.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        await producer  # raises any exception of the producer
+    finally:
+        # the jails of the producer must be gone before its sandbox is released
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
@@ -13,15 +13,105 @@ if ENV not in ('production', 'development', 'testing'):
 DEBUG: bool = ENV != 'production'
 TESTING: bool = ENV == 'testing'
 
-os.environ['LOGURU_LEVEL'] = os.getenv('LOG_LEVEL') or (DEBUG and 'DEBUG') or 'INFO'
+LOG_LEVEL: str = os.getenv('LOG_LEVEL') or (DEBUG and 'DEBUG') or 'INFO'
+os.environ['LOGURU_LEVEL'] = LOG_LEVEL
 os.environ['LOGURU_DEBUG_COLOR'] = '<fg #777>'
+# records waiting to be written before new ones are dropped, and records written at once
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10_000'))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '256'))
+LOG_FIELD_MAX_LENGTH = int(os.getenv('LOG_FIELD_MAX_LENGTH', '1000'))  # characters
+# fraction of the records that keep source files, stdout and stderr. The others keep their sizes
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1'))
 REQUEST_ID_LENGTH = int(os.getenv('REQUEST_ID_LENGTH', '8'))
 PYGMENTS_STYLE = os.getenv('PYGMENTS_STYLE', 'github-dark')
 
 TIMEOUT: float = float(os.environ.get('TIMEOUT', 0.2))
+# maximum number of commands running at the same time. Further executions wait in line.
+MAX_CONCURRENT_EXECUTIONS: int = int(
+    os.getenv('MAX_CONCURRENT_EXECUTIONS', str(os.cpu_count() or 1))
+)
+# bytes of stdout and of stderr kept for each command and for the whole project
+COMMAND_OUTPUT_LIMIT: int = int(os.getenv('COMMAND_OUTPUT_LIMIT', '1_000_000'))
+PROJECT_OUTPUT_LIMIT: int = int(os.getenv('PROJECT_OUTPUT_LIMIT', '4_000_000'))
+# commands of a project running at the same time, when they don't depend on each other
+PROJECT_PARALLELISM: int = int(os.getenv('PROJECT_PARALLELISM', '4'))
+# responses of the execution endpoints larger than this are compressed, if the client accepts it
+COMPRESSION_MIN_SIZE: int = int(os.getenv('COMPRESSION_MIN_SIZE', '16_000'))  # bytes
+GZIP_LEVEL: int = int(os.getenv('GZIP_LEVEL', '1'))
+ZSTD_LEVEL: int = int(os.getenv('ZSTD_LEVEL', '3'))
+# test cases of a judge request
+JUDGE_MAX_CASES: int = int(os.getenv('JUDGE_MAX_CASES', '1000'))
+# projects of a batch request running at the same time
+BATCH_FAN_OUT: int = int(os.getenv('BATCH_FAN_OUT', str(os.cpu_count() or 1)))
+BATCH_MAX_SIZE: int = int(os.getenv('BATCH_MAX_SIZE', '1000'))  # projects per request
+# events buffered for a streaming client before the running command is held back
+STREAM_QUEUE_SIZE: int = int(os.getenv('STREAM_QUEUE_SIZE', '64'))
+# asynchronous jobs: queued jobs beyond the depth are refused, results expire after the TTL
+# or when more than JOB_MAX_FINISHED are kept, the oldest first
+JOB_QUEUE_MAX_DEPTH: int = int(os.getenv('JOB_QUEUE_MAX_DEPTH', '100'))
+JOB_WORKERS: int = int(os.getenv('JOB_WORKERS', str(os.cpu_count() or 1)))
+JOB_RESULT_TTL: float = float(os.getenv('JOB_RESULT_TTL', '600'))  # seconds
+JOB_MAX_FINISHED: int = int(os.getenv('JOB_MAX_FINISHED', '1000'))
+# size limit of the files extracted from an uploaded archive
+ARCHIVE_MAX_SIZE: int = int(os.getenv('ARCHIVE_MAX_SIZE', '64_000_000'))  # bytes
+
+# number of sandbox directories kept ready to use
+SANDBOX_POOL_SIZE: int = int(os.getenv('SANDBOX_POOL_SIZE', '8'))
+# directory where sandboxes are created. The system temporary directory by default
+SANDBOX_ROOT: str = os.getenv('SANDBOX_ROOT', '')
+# size of the tmpfs mounted on each sandbox. Sandboxes are plain directories if it is zero
+SANDBOX_QUOTA: int = int(os.getenv('SANDBOX_QUOTA', '64_000_000'))  # bytes
+SANDBOX_MAX_FILES: int = int(os.getenv('SANDBOX_MAX_FILES', '10_000'))  # inodes of the tmpfs
+# used sandboxes waiting to be removed before cleanup is done in the request path
+SANDBOX_CLEANUP_HIGH_WATER: int = int(os.getenv('SANDBOX_CLEANUP_HIGH_WATER', '64'))
+
+# persistent sessions: sandboxes kept between requests until they are idle for their TTL.
+# Their files live in memory, so the quotas of all open sessions add up to SESSIONS_MAX_MEMORY
+SESSIONS_MAX: int = int(os.getenv('SESSIONS_MAX', '32'))
+SESSIONS_MAX_MEMORY: int = int(os.getenv('SESSIONS_MAX_MEMORY', '1_000_000_000'))  # bytes
+SESSION_TTL: float = float(os.getenv('SESSION_TTL', '300'))  # seconds
+SESSION_MAX_TTL: float = float(os.getenv('SESSION_MAX_TTL', '3600'))  # seconds
+SESSION_QUOTA: int = int(os.getenv('SESSION_QUOTA', '64_000_000'))  # bytes
+SESSION_MAX_QUOTA: int = int(os.getenv('SESSION_MAX_QUOTA', '256_000_000'))  # bytes
+
+# content-addressed store of input files referenced by projects. The least recently used blobs
+# are evicted beyond its size. It is in the system temporary directory by default
+BLOB_STORE_DIR: str = os.getenv('BLOB_STORE_DIR', '')
+BLOB_STORE_MAX_SIZE: int = int(os.getenv('BLOB_STORE_MAX_SIZE', '1_000_000_000'))  # bytes
+BLOB_MAX_SIZE: int = int(os.getenv('BLOB_MAX_SIZE', '64_000_000'))  # bytes
+
+# directory of the named datasets, directories or files such as SQLite databases, that projects
+# can ask for. Disabled if empty
+DATASETS_DIR: str = os.getenv('DATASETS_DIR', '')
+
+# compilation cache. It is disabled if BUILD_CACHE_DIR is empty
+BUILD_CACHE_DIR: str = os.getenv('BUILD_CACHE_DIR', '')
+BUILD_CACHE_MAX_SIZE: int = int(os.getenv('BUILD_CACHE_MAX_SIZE', '256_000_000'))  # bytes
+
+# cache of project results. Only projects that are declared as cacheable use it
+RESULT_CACHE_MAX_SIZE: int = int(os.getenv('RESULT_CACHE_MAX_SIZE', '64_000_000'))  # bytes
+RESULT_CACHE_TTL: float = float(os.getenv('RESULT_CACHE_TTL', '600'))  # seconds
+
+# languages whose executables run once at startup, so that their files are in the page cache
+# before the first request
+WARMUP_LANGUAGES: list[str] = [
+    language for language in os.getenv('WARMUP_LANGUAGES', '').split(',') if language
+]
+
+# warm interpreter that forks insecure `python script.py` executions instead of starting them
+PYTHON_ZYGOTE: bool = os.getenv('PYTHON_ZYGOTE', 'false').lower() == 'true'
+ZYGOTE_PYTHON: str = os.getenv('ZYGOTE_PYTHON', '')  # the server interpreter by default
+# modules imported once by the zygote, so that its children don't have to
+ZYGOTE_PRELOAD: list[str] = [
+    module
+    for module in os.getenv('ZYGOTE_PRELOAD', 'collections,itertools,json,math,re').split(',')
+    if module
+]
 
 NSJAIL_PATH: str = os.getenv('NSJAIL_PATH', '/usr/sbin/nsjail')
 NSJAIL_CFG: str = os.getenv('NSJAIL_CFG', str(Path(__file__).parent / 'nsjail/nsjail.cfg'))
+# seconds to wait for the end of the NsJail log once NsJail is gone
+NSJAIL_LOG_TIMEOUT: float = float(os.getenv('NSJAIL_LOG_TIMEOUT', '1'))
 
 CGROUP_MEM_MAX: int = 64_000_000  # 64 MB
 CGROUP_MEM_MEMSW_MAX: int = 0  # disabled
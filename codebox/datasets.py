@@ -0,0 +1,155 @@
+"""
+Named datasets that projects use without sending or building them.
+
+Each entry of DATASETS_DIR, a directory or a file such as an SQLite database, is a dataset
+named after it. The datasets of a project appear under ``datasets/<name>`` in its sandbox:
+
+* ``read_only`` datasets are bind mounted read-only, so nothing is copied
+* ``copy_on_write`` datasets are private writable snapshots. They are reflink clones,
+  which share the unchanged blocks with the dataset, where the file system supports them
+  (Btrfs, XFS) and copies elsewhere, such as in tmpfs sandboxes.
+
+Overlayfs is not used since it copies a whole file up on its first write,
+which for an SQLite database is as costly as a copy.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from loguru import logger
+
+from . import config
+from .models import Datasets
+from .sandbox import bind_mount_read_only, unmount
+from .utils import clone_file
+
+
+class UnknownDataset(ValueError):  # noqa: N818
+    pass
+
+
+class DatasetRegistry:
+    def __init__(self, datasets_dir: str | Path) -> None:
+        self.datasets_dir = Path(datasets_dir) if datasets_dir else None
+        # cleared when the server is not allowed to mount file systems
+        self.mount_supported = True
+        self.mounts = 0
+        self.clones = 0
+        self.copies = 0
+
+    def stats(self) -> dict[str, int]:
+        return {'mounts': self.mounts, 'clones': self.clones, 'copies': self.copies}
+
+    def path(self, name: str) -> Path:
+        """
+        Return the path of a dataset. Raise UnknownDataset if there is none with this name.
+        """
+        if self.datasets_dir is None or not name or name.startswith('.') or os.sep in name:
+            raise UnknownDataset(f'unknown dataset: {name}')
+        path = self.datasets_dir / name
+        if not path.exists():
+            raise UnknownDataset(f'unknown dataset: {name}')
+        return path
+
+    def fingerprint(self, name: str) -> str | None:
+        """
+        Identify the current version of a dataset by the size and modification time
+        of its entries, so that results cached for another version are not reused.
+        None if there is no dataset with this name.
+        """
+        try:
+            path = self.path(name)
+        except UnknownDataset:
+            return None
+        digest = hashlib.sha256()
+        for entry in (path, *sorted(path.rglob('*'))):
+            stat = entry.lstat()
+            relative = entry.relative_to(path)
+            digest.update(f'{relative}\0{stat.st_size}\0{stat.st_mtime_ns}\0'.encode())
+        return digest.hexdigest()
+
+    def fingerprints(self, names: Iterable[str]) -> dict[str, str | None]:
+        return {name: self.fingerprint(name) for name in names}
+
+    @asynccontextmanager
+    async def provide(self, datasets: Datasets, sandbox_path: Path) -> AsyncIterator[None]:
+        """
+        Put the datasets into the sandbox and unmount them when the context exits,
+        before the sandbox is released.
+        """
+        sources = {name: self.path(name) for name in datasets}
+        mount_points = await asyncio.to_thread(self._provide_all, datasets, sources, sandbox_path)
+        try:
+            yield
+        finally:
+            for mount_point in reversed(mount_points):
+                unmount(mount_point)
+
+    def _provide_all(
+        self, datasets: Datasets, sources: dict[str, Path], sandbox_path: Path
+    ) -> list[Path]:
+        datasets_dir = sandbox_path / 'datasets'
+        datasets_dir.mkdir(exist_ok=True)
+        datasets_dir.chmod(0o777)  # SQLite creates its journal next to the database
+        mount_points: list[Path] = []
+        try:
+            for name, mode in datasets.items():
+                dest = (datasets_dir / name).resolve()
+                # checks for a symbolic link extracted from an archive
+                if not dest.is_relative_to(sandbox_path.resolve()):
+                    raise ValueError(f'Invalid dataset path: {dest}')
+                if mode == 'read_only' and self._mount(sources[name], dest):
+                    mount_points.append(dest)
+                else:
+                    self._snapshot(sources[name], dest, writable=mode == 'copy_on_write')
+        except BaseException:
+            for mount_point in reversed(mount_points):
+                unmount(mount_point)
+            raise
+        return mount_points
+
+    def _mount(self, src: Path, dest: Path) -> bool:
+        if not self.mount_supported:
+            return False
+        if src.is_dir():
+            dest.mkdir(exist_ok=True)
+        else:
+            dest.touch()
+        try:
+            bind_mount_read_only(src, dest)
+        except OSError as error:
+            self.mount_supported = False
+            logger.warning(f'dataset mounts disabled, datasets are copied: {error}')
+            return False
+        self.mounts += 1
+        return True
+
+    def _snapshot(self, src: Path, dest: Path, writable: bool) -> None:
+        """
+        Clone or copy a dataset. The copy of a read-only dataset is only readable
+        by the jail user, who doesn't own it.
+        """
+        file_mode, dir_mode = (0o666, 0o777) if writable else (0o444, 0o755)
+        if src.is_dir():
+            shutil.copytree(src, dest, copy_function=self._clone, dirs_exist_ok=True)
+            for root, _, filenames in os.walk(dest):
+                os.chmod(root, dir_mode)
+                for filename in filenames:
+                    os.chmod(os.path.join(root, filename), file_mode)
+        else:
+            self._clone(src, dest)
+            os.chmod(dest, file_mode)
+
+    def _clone(self, src: str | Path, dest: str | Path) -> None:
+        if clone_file(src, dest):
+            self.clones += 1
+        else:
+            self.copies += 1
+
+
+dataset_registry = DatasetRegistry(config.DATASETS_DIR)
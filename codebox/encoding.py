@@ -0,0 +1,91 @@
+"""
+Encoding of the responses of the execution endpoints.
+
+The results are serialised by orjson straight from the models, without the validation
+and conversion to plain data that FastAPI applies to the value of an endpoint.
+Bodies larger than COMPRESSION_MIN_SIZE are compressed with zstd or gzip,
+depending on the Accept-Encoding header of the request.
+"""
+
+import asyncio
+import gzip
+from typing import Any
+
+import orjson
+import zstandard
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from . import config, metrics
+
+# bodies compressed in a thread, so that they don't block the event loop
+THREAD_MIN_SIZE = 1_000_000
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+
+def _model_fields(obj: Any) -> dict[str, Any]:  # noqa: ANN401
+    if isinstance(obj, BaseModel):
+        # the models have no aliases nor custom serializers, so their fields are their dump
+        return obj.__dict__
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+def dumps(content: Any) -> bytes:  # noqa: ANN401
+    return orjson.dumps(content, default=_model_fields)
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """
+    Return the codings of an Accept-Encoding header whose quality is not zero.
+    """
+    encodings = set()
+    for item in accept_encoding.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding and quality > 0:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    encodings = accepted_encodings(accept_encoding)
+    if encodings & {'zstd', '*'}:
+        return 'zstd'
+    if encodings & {'gzip', '*'}:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=config.ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+
+async def json_response(request: Request, content: Any) -> FastJSONResponse:  # noqa: ANN401
+    """
+    Serialise the content and compress it if it is large enough and the client accepts it.
+    """
+    with metrics.phase_duration.time(phase='encoding'):
+        body = dumps(content)
+        headers = {'Vary': 'Accept-Encoding'}
+        if len(body) >= config.COMPRESSION_MIN_SIZE and (
+            encoding := choose_encoding(request.headers.get('accept-encoding', ''))
+        ):
+            if len(body) >= THREAD_MIN_SIZE:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+    return FastJSONResponse(body, headers=headers)
@@ -0,0 +1,157 @@
+"""
+Asynchronous execution of projects.
+
+Submitted jobs wait in a priority queue of bounded depth and run by a fixed number of workers.
+Their results are kept for JOB_RESULT_TTL seconds after they finish,
+and only the JOB_MAX_FINISHED most recent ones.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from time import monotonic
+from uuid import uuid4
+
+from loguru import logger
+
+from . import config
+from .codebox import execute
+from .models import ExecFunc, Job, JobStatus, ProjectCore, Response
+from .result_cache import result_cache
+
+
+class QueueFull(Exception):  # noqa: N818
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f'job queue is full. Retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+@dataclass
+class JobState:
+    id: str
+    project: ProjectCore | None  # dropped once the job runs
+    priority: int
+    exec_func: ExecFunc
+    sort_key: tuple[int, int]  # higher priority first, then in order of arrival
+    status: JobStatus = 'queued'
+    responses: list[Response] | None = None
+    error: str | None = None
+    expires_at: float = field(default=math.inf)
+
+
+class JobQueue:
+    def __init__(self, max_depth: int, workers: int, result_ttl: float, max_finished: int) -> None:
+        self.max_depth = max_depth
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self.rejected = 0
+        self.average_duration = 1.0  # seconds, moving average of the job durations
+        self._jobs: dict[str, JobState] = {}
+        self._finished: OrderedDict[str, JobState] = OrderedDict()
+        self._queue: list[tuple[tuple[int, int], JobState]] = []
+        self._available = asyncio.Semaphore(0)
+        self._counter = itertools.count()
+        self._running = 0
+        self._tasks: list[asyncio.Task] = []
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queued': len(self._queue),
+            'running': self._running,
+            'finished': len(self._finished),
+            'rejected': self.rejected,
+        }
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def retry_after(self) -> int:
+        """
+        Rough number of seconds until a place in the queue is freed.
+        """
+        return max(1, math.ceil(self.average_duration / self.workers))
+
+    def submit(self, project: ProjectCore, priority: int = 0, exec_func: ExecFunc = execute) -> Job:
+        self._purge()
+        if len(self._queue) >= self.max_depth:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+        state = JobState(
+            id=uuid4().hex,
+            project=project,
+            priority=priority,
+            exec_func=exec_func,
+            sort_key=(-priority, next(self._counter)),
+        )
+        self._jobs[state.id] = state
+        heapq.heappush(self._queue, (state.sort_key, state))
+        self._available.release()
+        return self._describe(state)
+
+    def get(self, job_id: str) -> Job | None:
+        self._purge()
+        state = self._jobs.get(job_id)
+        return self._describe(state) if state else None
+
+    def _describe(self, state: JobState) -> Job:
+        job = Job(
+            id=state.id,
+            status=state.status,
+            priority=state.priority,
+            responses=state.responses,
+            error=state.error,
+        )
+        if state.status == 'queued':
+            job.position = sum(key < state.sort_key for key, _ in self._queue)
+            # the jobs ahead share the workers, and so does this one
+            job.estimated_wait = (job.position + 1) * self.average_duration / self.workers
+        return job
+
+    def _purge(self) -> None:
+        now = monotonic()
+        while self._finished:
+            job_id, state = next(iter(self._finished.items()))
+            if state.expires_at > now and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[job_id]
+            del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            await self._available.acquire()
+            _, state = heapq.heappop(self._queue)
+            state.status = 'running'
+            self._running += 1
+            start_time = monotonic()
+            # the sources are not needed anymore once the job runs
+            project, state.project = state.project, None
+            assert project  # noqa: S101
+            try:
+                state.responses = await result_cache.run_project(project, state.exec_func)
+                state.status = 'done'
+            except Exception as error:
+                logger.exception(error)
+                state.status = 'failed'
+                state.error = str(error)
+            finally:
+                self._running -= 1
+            duration = monotonic() - start_time
+            self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            state.expires_at = monotonic() + self.result_ttl
+            self._finished[state.id] = state
+            self._purge()
+
+
+job_queue = JobQueue(
+    config.JOB_QUEUE_MAX_DEPTH, config.JOB_WORKERS, config.JOB_RESULT_TTL, config.JOB_MAX_FINISHED
+)
@@ -0,0 +1,99 @@
+"""
+Judging of submissions: one command run against many test cases.
+
+The project is prepared once and its commands, such as a compilation, run one after the other.
+Then the command runs once per case, each in its own jail on the same sandbox,
+at most PROJECT_PARALLELISM cases at once.
+"""
+
+import asyncio
+import os
+from contextlib import aclosing
+from pathlib import Path
+
+from . import config, metrics
+from .codebox import execute, iter_commands, project_sandbox
+from .models import Case, Command, ExecFunc, JudgeRequest, JudgeResult, Response
+
+
+def read_case_stdin(case: Case, sandbox_path: Path) -> str | None:
+    if case.stdin_file is None:
+        return case.stdin
+    path = (sandbox_path / case.stdin_file.lstrip(os.sep)).resolve()
+    # checks for malicious or malformed paths
+    if not path.is_relative_to(sandbox_path):
+        raise ValueError(f'Invalid file path: {path}')
+    return path.read_text()
+
+
+async def run_cases(
+    command: Command,
+    cases: list[Case],
+    sandbox_path: Path,
+    exec_func: ExecFunc = execute,
+    stop_on_failure: bool = False,
+) -> list[Response | None]:
+    """
+    Run the command once per case, at the same time, and return the response of each case.
+
+    With `stop_on_failure`, the cases that have not started when a case fails or its output
+    is not accepted are skipped and their response is None.
+    The cases that are running go on until they end.
+    """
+    # the stdout and stderr of all cases share the output limit of a project
+    output_limit = min(
+        config.COMMAND_OUTPUT_LIMIT, config.PROJECT_OUTPUT_LIMIT // (2 * max(len(cases), 1))
+    )
+    parallelism = asyncio.Semaphore(config.PROJECT_PARALLELISM)
+    failed = False
+
+    async def run(case: Case) -> Response | None:
+        nonlocal failed
+        async with parallelism:
+            if failed:
+                return None
+            try:
+                stdin = await asyncio.to_thread(read_case_stdin, case, sandbox_path)
+            except (OSError, ValueError) as error:
+                resp = Response(stderr=str(error), exit_code=-1)
+            else:
+                metrics.executions.inc(language=metrics.command_language(command.command))
+                expected = case.expected or command.expected
+                resp = await exec_func(
+                    command.model_copy(update={'stdin': stdin, 'expected': expected}),
+                    sandbox_path,
+                    output_limit=output_limit,
+                )
+            # before the next case takes the slot
+            wrong_answer = resp.check is not None and resp.check.verdict != 'accepted'
+            if (resp.exit_code or wrong_answer) and stop_on_failure:
+                failed = True
+        return resp
+
+    tasks = [asyncio.create_task(run(case)) for case in cases]
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def judge(request: JudgeRequest, exec_func: ExecFunc = execute) -> JudgeResult:
+    """
+    Prepare the project and run its cases, unless a command of the project fails.
+    """
+    skipped: list[Response | None] = [None] * len(request.cases)
+    files = project_sandbox(request.sources, blobs=request.blobs, datasets=request.datasets)
+    async with files as (sandbox_path, errors):
+        if errors:
+            return JudgeResult(responses=errors, cases=skipped)
+        project = iter_commands(request.commands, sandbox_path, exec_func)
+        async with aclosing(project) as responses:
+            commands = [resp async for resp in responses]
+        if any(resp.exit_code for resp in commands):
+            return JudgeResult(responses=commands, cases=skipped)
+        cases = await run_cases(
+            request.command, request.cases, sandbox_path, exec_func, request.stop_on_failure
+        )
+    return JudgeResult(responses=commands, cases=cases)
@@ -1,20 +1,69 @@
+"""
+JSON logging.
+
+Records are handed over to a background thread that serializes and writes them in batches,
+so that logging doesn't block the event loop. Long strings are truncated,
+and large fields are logged only for a sample of the records.
+"""
+
+import queue
+import random
 import sys
+import threading
+from typing import Any
 
 import orjson
 import stackprinter
 from loguru import logger
-from pygments import highlight
-from pygments.formatters import Terminal256Formatter
-from pygments.lexers import JsonLexer
+from pydantic import BaseModel
 
 from . import config
 
-lexer = JsonLexer()
-formatter = Terminal256Formatter(style=config.PYGMENTS_STYLE)
 orjson_options = orjson.OPT_NAIVE_UTC
 if config.DEBUG:
+    # pygments takes a while to import and is only used to color the development logs
+    from pygments import highlight
+    from pygments.formatters import Terminal256Formatter
+    from pygments.lexers import JsonLexer
+
+    lexer = JsonLexer()
+    formatter = Terminal256Formatter(style=config.PYGMENTS_STYLE)
     orjson_options |= orjson.OPT_INDENT_2
 
+# fields replaced by their size in the records left out of the sample
+LARGE_FIELDS = frozenset(('source_files', 'stdout', 'stderr'))
+
+
+def shrink(value: Any, sampled: bool, max_length: int) -> Any:  # noqa: ANN401
+    """
+    Truncate the long strings of a field value, or replace the large fields by their size
+    if the record is not sampled.
+    """
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, str) and len(value) > max_length:
+        return f'{value[:max_length]}... ({len(value)} characters)'
+    if isinstance(value, dict):
+        return {
+            key: (
+                shrink(item, sampled, max_length)
+                if sampled or key not in LARGE_FIELDS
+                else size_of(item)
+            )
+            for key, item in value.items()
+        }
+    if isinstance(value, list | tuple):
+        return [shrink(item, sampled, max_length) for item in value]
+    return value
+
+
+def size_of(value: Any) -> Any:  # noqa: ANN401
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return {key: size_of(item) for key, item in value.items()}
+    return value
+
 
 def serialize(record: dict) -> str:
     subset = {
@@ -23,7 +72,8 @@ def serialize(record: dict) -> str:
         'message': record['message'],
         'source': f'{record["file"].name}:{record["function"]}:{record["line"]}',
     }
-    subset.update(record['extra'])
+    sampled = random.random() < config.LOG_SAMPLE_RATE  # noqa: S311
+    subset.update(shrink(record['extra'], sampled, config.LOG_FIELD_MAX_LENGTH))
     if record['exception']:
         subset['exception'] = stackprinter.format(record['exception'])
     formatted_json = orjson.dumps(subset, default=str, option=orjson_options).decode()
@@ -32,7 +82,76 @@ def serialize(record: dict) -> str:
     return formatted_json
 
 
+class LogWriter:
+    """
+    Loguru sink that queues records to be serialized and written to stderr by a thread.
+    Records are dropped, and counted, while the queue is full.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: queue.Queue[dict | threading.Event] = queue.Queue(queue_size)
+        self._thread: threading.Thread | None = None
+
+    def __call__(self, message: Any) -> None:  # noqa: ANN401
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(message.record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5) -> None:
+        """
+        Wait for the records queued so far to be written.
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list[dict | threading.Event]) -> None:
+        lines: list[str] = []
+        for item in batch:
+            if isinstance(item, threading.Event):
+                self._emit(lines)
+                lines = []
+                item.set()
+                continue
+            try:
+                lines.append(serialize(item))
+            except Exception as error:  # a bad record must not stop the writer
+                lines.append(f'log serialization error: {error!r}')
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append(f'log writer: {dropped} records dropped')
+        self._emit(lines)
+
+    @staticmethod
+    def _emit(lines: list[str]) -> None:
+        if lines:
+            # sys.stderr is looked up on each write because it might be replaced
+            sys.stderr.write('\n'.join(lines) + '\n')
+            sys.stderr.flush()
+
+
+log_writer = LogWriter(config.LOG_QUEUE_SIZE, config.LOG_BATCH_SIZE)
+
+
 def init_loguru() -> None:
     logger.remove()
     # https://loguru.readthedocs.io/en/stable/resources/recipes.html#serializing-log-messages-using-a-custom-function
-    logger.add(lambda message: print(serialize(message.record), file=sys.stderr))  # type: ignore
+    logger.add(log_writer)
@@ -0,0 +1,167 @@
+"""
+Minimal Prometheus-style metrics, exposed in the text exposition format by /metrics.
+"""
+
+import shlex
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+from .timing import add_phase
+
+LabelValues = tuple[str, ...]
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)  # fmt: skip
+
+# executable name: language
+LANGUAGES = {
+    'python': 'python',
+    'python3': 'python',
+    'pytest': 'python',
+    'rustc': 'rust',
+    'sqlite3': 'sqlite3',
+    'bash': 'bash',
+    'sh': 'bash',
+}
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = [*zip(names, values, strict=True), *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric(ABC):
+    type_ = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        header = f'# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_}\n'
+        return header + ''.join(f'{sample}\n' for sample in self.samples())
+
+
+class Counter(Metric):
+    type_ = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {} if labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    type_ = 'gauge'
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_ = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # per label values: count of each bucket (non-cumulative), +Inf included, and sum
+        self.values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[key]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start_time, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts, strict=True):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, le=str(bound))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total[0])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class PhaseHistogram(Histogram):
+    """
+    Histogram of phase durations that also adds them up for the current request.
+    """
+
+    def observe(self, value: float, **labels: str) -> None:
+        super().observe(value, **labels)
+        add_phase(labels['phase'], value)
+
+
+registry: list[Metric] = []
+
+phase_duration = PhaseHistogram(
+    'codebox_phase_duration_seconds', 'Time spent in each phase of an execution.', ('phase',)
+)
+executions = Counter('codebox_executions_total', 'Commands executed, by language.', ('language',))
+timeouts = Counter('codebox_timeouts_total', 'Commands killed by timeout.')
+nonzero_exits = Counter('codebox_nonzero_exits_total', 'Commands finished with a non-zero code.')
+in_flight = Gauge('codebox_executions_in_flight', 'Commands being executed right now.')
+component_stats = Gauge(
+    'codebox_component_stats', 'Statistics of sandbox pool and caches.', ('component', 'stat')
+)
+
+
+def command_language(command: str) -> str:
+    try:
+        executable = Path(shlex.split(command)[0]).name
+    except (ValueError, IndexError):
+        return 'other'
+    return LANGUAGES.get(executable, 'other')
+
+
+def render() -> str:
+    return ''.join(metric.render() for metric in registry)
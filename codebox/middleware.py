@@ -1,57 +1,79 @@
-from collections.abc import Callable
 from secrets import token_urlsafe
-from time import time
+from time import perf_counter
 
-from fastapi import Request, Response
 from fastapi.responses import PlainTextResponse
-from hypercorn.logging import AccessLogAtoms
 from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from . import config
+from .timing import RequestTiming, request_timing
 
 
-async def log_request_middleware(request: Request, call_next: Callable) -> Response:
+class RequestMiddleware:
     """
-    Uniquely identify each request and logs its processing time.
+    Uniquely identify each request, log its processing time
+    and report the time of its phases in the Server-Timing header.
     """
-    start_time = time()
-    request_id: str = token_urlsafe(config.REQUEST_ID_LENGTH)
-    exception = None
-
-    # keep the same request_id in the context of all subsequent calls to logger
-    with logger.contextualize(request_id=request_id):
-        try:
-            response = await call_next(request)
-        except Exception as exc:
-            exception = exc
-            response = PlainTextResponse('Internal Server Error', status_code=500)
-        final_time = time()
-        elapsed = final_time - start_time
-        response_dict = {
-            'status': response.status_code,
-            'headers': response.headers.raw,
-        }
-        atoms = AccessLogAtoms(request, response_dict, final_time)  # type: ignore
-        try:
-            response_length = int(atoms['B'])
-        except ValueError:
-            response_length = 0
-        data = {
-            'client': atoms['h'],
-            'schema': atoms['S'],
-            'protocol': atoms['H'],
-            'method': atoms['m'],
-            'path_with_query': atoms['Uq'],
-            'status_code': response.status_code,
-            'response_length': response_length,
-            'elapsed': elapsed,
-            'referer': atoms['f'],
-            'user_agent': atoms['a'],
-        }
-        if not exception:
-            logger.info('log request', **data)
-        else:
-            logger.opt(exception=exception).error('Unhandled exception', **data)
-    response.headers['X-Request-ID'] = request_id
-    response.headers['X-Processed-Time'] = str(elapsed)
-    return response
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # the access log and the work of building it are skipped above the INFO level
+        self.log_requests = logger.level(config.LOG_LEVEL).no <= logger.level('INFO').no
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        request_id: str = token_urlsafe(config.REQUEST_ID_LENGTH)
+        response_start: Message = {}
+        exception = None
+
+        async def send_with_headers(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                response_start.update(message)
+                headers = MutableHeaders(scope=message)
+                headers.append('X-Request-ID', request_id)
+                headers.append('X-Processed-Time', str(perf_counter() - timing.start))
+                headers.append('Server-Timing', timing.server_timing())
+            await send(message)
+
+        token = request_timing.set(timing)
+        # keep the same request_id in the context of all subsequent calls to logger
+        with logger.contextualize(request_id=request_id):
+            try:
+                await self.app(scope, receive, send_with_headers)
+            except Exception as exc:
+                exception = exc
+                if not response_start:
+                    response = PlainTextResponse('Internal Server Error', status_code=500)
+                    await response(scope, receive, send_with_headers)
+            finally:
+                request_timing.reset(token)
+            elapsed = perf_counter() - timing.start
+            if exception:
+                data = access_log_data(scope, response_start, elapsed)
+                logger.opt(exception=exception).error('Unhandled exception', **data)
+            elif self.log_requests:
+                logger.info('log request', **access_log_data(scope, response_start, elapsed))
+
+
+def access_log_data(scope: Scope, response_start: Message, elapsed: float) -> dict:
+    request_headers = Headers(scope=scope)
+    response_headers = Headers(raw=response_start.get('headers', []))
+    client = scope.get('client')
+    query_string = scope['query_string'].decode()
+    return {
+        'client': f'{client[0]}:{client[1]}' if client else None,
+        'schema': scope['scheme'],
+        'protocol': scope.get('http_version', '-'),
+        'method': scope['method'],
+        'path_with_query': scope['path'] + ('?' + query_string if query_string else ''),
+        'status_code': response_start.get('status', 500),
+        'response_length': int(response_headers.get('content-length', 0)),
+        'elapsed': elapsed,
+        'referer': request_headers.get('referer', '-'),
+        'user_agent': request_headers.get('user-agent', '-'),
+    }
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+import re
+from collections.abc import Awaitable, Callable
+from typing import Annotated, Literal
+
+from pydantic import AfterValidator, BaseModel, Field, model_validator
 
 from . import config
 
@@ -6,17 +10,84 @@ from . import config
 
 
 Sourcefiles = dict[str, str]
+Sha256 = Annotated[str, Field(pattern=r'^[0-9a-f]{64}$')]
+Blobs = dict[str, Sha256]  # file path: digest of a blob in the blob store
+# how a dataset appears in the sandbox: a read-only mount or a private writable snapshot
+DatasetMode = Literal['read_only', 'copy_on_write']
+Datasets = dict[str, DatasetMode]  # dataset name: mode
+
+
+# how the output of a command is compared with its expected output. See checker.py
+CheckMode = Literal['exact', 'whitespace', 'float', 'sha256']
+
+
+class Expected(BaseModel):
+    output: str  # the expected stdout, or its SHA-256 digest with the sha256 mode
+    mode: CheckMode = 'exact'
+    tolerance: float = Field(default=1e-6, ge=0)  # absolute or relative, with the float mode
+
+    @model_validator(mode='after')
+    def check_digest(self) -> 'Expected':
+        if self.mode == 'sha256' and not re.fullmatch(r'[0-9a-fA-F]{64}', self.output):
+            raise ValueError('the expected output of the sha256 mode is a SHA-256 digest')
+        return self
 
 
 class Command(BaseModel):
     command: str
     stdin: str | None = None
     timeout: float | None = config.TIMEOUT
+    # stdout is checked against it while it is read, and replaced by the check in the response
+    expected: Expected | None = None
+    # indices of the earlier commands that must end before it starts. None waits for the previous
+    # command and [] for none, so that the command runs at the same time as the ones before it
+    depends_on: list[int] | None = None
+
+
+def check_dependencies(commands: list[Command]) -> list[Command]:
+    for index, command in enumerate(commands):
+        if any(not 0 <= dependency < index for dependency in command.depends_on or []):
+            raise ValueError(f'command {index} can only depend on earlier commands')
+    return commands
+
+
+Commands = Annotated[list[Command], AfterValidator(check_dependencies)]
 
 
 class ProjectCore(BaseModel):
     sources: Sourcefiles
-    commands: list[Command]
+    commands: Commands
+    blobs: Blobs = {}
+    datasets: Datasets = {}  # available under datasets/ in the sandbox
+    cacheable: bool = False  # the same project always produces the same results
+
+
+Batch = Annotated[list[ProjectCore], Field(max_length=config.BATCH_MAX_SIZE)]
+
+
+class JobRequest(ProjectCore):
+    priority: int = 0  # jobs with higher priority run first
+
+
+# why the process ended: it exited by itself, was killed by a signal,
+# exceeded its wall time or hit the memory or PID limits of the jail
+TerminationReason = Literal['exited', 'signal', 'timeout', 'oom', 'pid_limit']
+
+
+class Termination(BaseModel):
+    reason: TerminationReason
+    signal: int | None = None  # number of the signal that killed the process
+
+
+class Blob(BaseModel):
+    sha256: Sha256
+    size: int  # bytes
+
+
+class Check(BaseModel):
+    verdict: Literal['accepted', 'wrong_answer']
+    sha256: str  # digest of the whole stdout
+    difference: str = ''  # excerpt of the first difference with the expected output
 
 
 class Response(BaseModel):
@@ -24,11 +95,27 @@ class Response(BaseModel):
     stderr: str | None = ''
     exit_code: int = 0
     elapsed_time: float = 0
+    queue_time: float = 0  # time spent waiting for an execution slot
+    cached: bool = False
+    # total size of the output, in bytes. Output beyond the limits is discarded
+    stdout_size: int = 0
+    stderr_size: int = 0
+    stdout_truncated: bool = False
+    stderr_truncated: bool = False
+    termination: Termination | None = None  # None if the command could not run
+    check: Check | None = None  # the check of stdout, if the command has an expected output
+    # resources used by the jail, when available
+    setup_time: float | None = None  # estimated overhead of setting the jail up
+    cpu_user_time: float | None = None
+    cpu_system_time: float | None = None
+    peak_memory: int | None = None  # bytes
+    peak_pids: int | None = None
 
     def __str__(self) -> str:
         return (
             f'Response(stdout={self.stdout!r}, stderr={self.stderr!r}, '
-            f'exit_code={self.exit_code!r}, elapsed_time={self.elapsed_time * 1000:.0f}ms)'
+            f'exit_code={self.exit_code!r}, elapsed_time={self.elapsed_time * 1000:.0f}ms, '
+            f'queue_time={self.queue_time * 1000:.0f}ms)'
         )
 
     def __eq__(self, other: object) -> bool:
@@ -37,5 +124,67 @@ class Response(BaseModel):
             and self.stdout == other.stdout
             and self.stderr == other.stderr
             and self.exit_code == other.exit_code
-            # elapsed_time is not compared because it is not guaranteed to be the same
+            # elapsed_time and queue_time are not compared because they are not guaranteed
+            # to be the same
         )
+
+
+class Case(BaseModel):
+    stdin: str | None = None
+    # path of a file of the sandbox whose contents are the stdin, instead of `stdin`
+    stdin_file: str | None = None
+    expected: Expected | None = None  # replaces the expected output of the command
+
+    @model_validator(mode='after')
+    def check_stdin(self) -> 'Case':
+        if self.stdin is not None and self.stdin_file is not None:
+            raise ValueError('a case has either stdin or stdin_file')
+        return self
+
+
+class JudgeRequest(ProjectCore):
+    commands: Commands = []  # run once before the cases, such as a compilation
+    command: Command  # run once per case, with the stdin of the case
+    cases: list[Case] = Field(max_length=config.JUDGE_MAX_CASES)
+    stop_on_failure: bool = False  # cases that have not started when one fails are skipped
+
+
+class JudgeResult(BaseModel):
+    responses: list[Response]  # of the commands
+    cases: list[Response | None]  # None if the case did not run
+
+
+class SessionRequest(BaseModel):
+    sources: Sourcefiles = {}
+    ttl: float = Field(default=config.SESSION_TTL, gt=0, le=config.SESSION_MAX_TTL)  # idle seconds
+    quota: int = Field(default=config.SESSION_QUOTA, gt=0, le=config.SESSION_MAX_QUOTA)  # bytes
+
+
+class SessionUpdate(BaseModel):
+    sources: Sourcefiles = {}  # files created or replaced
+    deleted: list[str] = []  # paths of the files or directories removed
+
+
+class Session(BaseModel):
+    id: str
+    ttl: float
+    quota: int
+    expires_in: float  # seconds, unless the session is used again
+
+
+JobStatus = Literal['queued', 'running', 'done', 'failed']
+
+
+class Job(BaseModel):
+    id: str
+    status: JobStatus
+    priority: int = 0
+    position: int | None = None  # jobs ahead in the queue
+    estimated_wait: float | None = None  # seconds, until the job finishes
+    responses: list[Response] | None = None
+    error: str | None = None
+
+
+OutputHandler = Callable[[str, str], Awaitable[None]]  # stream name, text
+# (command: Command, sandbox_path: Path, output: OutputHandler | None = None) -> Response
+ExecFunc = Callable[..., Awaitable[Response]]
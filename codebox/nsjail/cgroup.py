@@ -1,3 +1,5 @@
+import uuid
+from contextlib import suppress
 from pathlib import Path
 
 from loguru import logger
@@ -50,6 +52,10 @@ def init() -> int:
         init_v1()
     else:
         init_v2()
+        try:
+            init_v2_parent()
+        except OSError as error:
+            logger.warning(f'Could not initialise the accounting cgroups: {error}')
 
     return version
 
@@ -93,3 +99,111 @@ def init_v2() -> None:
     controllers = (cgroup_mount / 'cgroup.controllers').read_text().split()
     for controller in controllers:
         (cgroup_mount / 'cgroup.subtree_control').write_text(f'+{controller}')
+
+
+def init_v2_parent() -> None:
+    """
+    Create the cgroupv2 parent of the accounting cgroups and enable its controllers,
+    so that each jail can have its own accounting cgroup below it.
+    """
+    parent = Path(CGROUPV2_MOUNT, CGROUP_PARENT)
+    parent.mkdir(exist_ok=True)
+    controllers = (parent / 'cgroup.controllers').read_text().split()
+    for controller in controllers:
+        (parent / 'cgroup.subtree_control').write_text(f'+{controller}')
+
+
+def accounting_paths(version: int, name: str) -> list[Path]:
+    if version == 1:
+        return [
+            Path(CGROUP_MEM_MOUNT, CGROUP_PARENT, name),
+            Path(CGROUP_PIDS_MOUNT, CGROUP_PARENT, name),
+        ]
+    return [Path(CGROUPV2_MOUNT, CGROUP_PARENT, name)]
+
+
+def create_accounting(version: int) -> tuple[str, list[str]] | None:
+    """
+    Create a cgroup to be the parent of a single jail and return its name
+    and the NsJail arguments to use it.
+
+    NsJail removes the jail cgroup when the jail finishes,
+    but its parent keeps the accumulated usage until it is removed.
+    """
+    name = f'codebox-{uuid.uuid4()}'
+    try:
+        for path in accounting_paths(version, name):
+            path.mkdir(parents=True)
+    except OSError as error:
+        logger.warning(f'Could not create the accounting cgroup: {error}')
+        remove_accounting(version, name)
+        return None
+    # fmt: off
+    if version == 1:
+        arguments = [
+            '--cgroup_mem_parent', f'{CGROUP_PARENT}/{name}',
+            '--cgroup_pids_parent', f'{CGROUP_PARENT}/{name}',
+        ]
+    else:
+        arguments = ['--cgroupv2_mount', str(accounting_paths(version, name)[0])]
+    # fmt: on
+    return name, arguments
+
+
+def remove_accounting(version: int, name: str) -> None:
+    for path in accounting_paths(version, name):
+        with suppress(OSError):
+            path.rmdir()
+
+
+def _read_int(path: Path) -> int | None:
+    try:
+        return int(path.read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def read_usage(version: int, name: str) -> dict[str, float | int | None]:
+    """
+    Read the resources used by the jails that ran under an accounting cgroup.
+    Values that the kernel doesn't provide are None.
+    """
+    usage: dict[str, float | int | None] = {}
+    if version == 1:
+        mem_path, _ = accounting_paths(version, name)
+        usage['peak_memory'] = _read_int(mem_path / 'memory.max_usage_in_bytes')
+        return usage
+
+    path = accounting_paths(version, name)[0]
+    usage['peak_memory'] = _read_int(path / 'memory.peak')
+    usage['peak_pids'] = _read_int(path / 'pids.peak')
+    with suppress(OSError):
+        cpu_stat = dict(line.split() for line in (path / 'cpu.stat').read_text().splitlines())
+        usage['cpu_user_time'] = int(cpu_stat['user_usec']) / 1_000_000
+        usage['cpu_system_time'] = int(cpu_stat['system_usec']) / 1_000_000
+    return usage
+
+
+def _read_counter(path: Path, key: str) -> int:
+    try:
+        counters = dict(line.split() for line in path.read_text().splitlines())
+        return int(counters.get(key, 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def read_limit_events(version: int, name: str) -> dict[str, int]:
+    """
+    Count how many times the jails that ran under an accounting cgroup
+    had a process killed for lack of memory, and had a fork refused by the PID limit.
+    """
+    if version == 1:
+        mem_path, pids_path = accounting_paths(version, name)
+        oom_kills = _read_counter(mem_path / 'memory.oom_control', 'oom_kill')
+    else:
+        mem_path = pids_path = accounting_paths(version, name)[0]
+        oom_kills = _read_counter(mem_path / 'memory.events', 'oom_kill')
+    return {
+        'oom_kills': oom_kills,
+        'pid_limit_hits': _read_counter(pids_path / 'pids.events', 'max'),
+    }
@@ -5,6 +5,7 @@ from functools import cache
 from loguru import logger
 
 from ..config import CGROUP_MEM_MAX, CGROUP_MEM_SWAP_MAX, CGROUP_PIDS_MAX, DEBUG
+from ..models import Termination
 from . import cgroup, swap
 
 # [level][timestamp][PID]? function_signature:line_no? message
@@ -12,8 +13,13 @@ LOG_PATTERN = re.compile(
     r'\[(?P<level>(I)|[DWEF])\]\[.+?\](?(2)|(?P<func>\[\d+\] .+?:\d+ )) ?(?P<msg>.+)'
 )
 LOG_BLACKLIST = ('Process will be ',)
+# messages about how the jailed process ended
+EXITED_PATTERN = re.compile(r'pid=\d+ .*exited with status: \d+')
+SIGNAL_PATTERN = re.compile(r'pid=\d+ .*terminated with signal: .*?\((?P<signal>\d+)\)')
+TIME_LIMIT_PATTERN = re.compile(r'pid=\d+ run time >= time limit')
 
 
+@cache
 def init() -> tuple[int, bool]:
     cgroup_version = cgroup.init()
     ignore_swap_limits = swap.should_ignore_limit(cgroup_version)
@@ -54,6 +60,26 @@ def parse_log(log_lines: Iterable[str]) -> None:
             logger.error(msg)
 
 
+def parse_termination(log_lines: Iterable[str]) -> Termination | None:
+    """
+    Find out from NsJail's log messages how the jailed process ended.
+    """
+    termination = None
+    for line in log_lines:
+        if TIME_LIMIT_PATTERN.search(line):
+            # the process is killed right after, which must not hide the reason
+            return Termination(reason='timeout')
+        if match := SIGNAL_PATTERN.search(line):
+            termination = Termination(reason='signal', signal=int(match['signal']))
+        elif EXITED_PATTERN.search(line):
+            termination = Termination(reason='exited')
+    return termination
+
+
+def cgroup_version() -> int:
+    return init()[0]
+
+
 @cache
 def get_nsjail_args() -> list[str]:
     cgroup_version, ignore_swap_limits = init()
@@ -74,6 +100,3 @@ def get_nsjail_args() -> list[str]:
         nsjail_args.extend(('--cgroup_mem_swap_max', str(CGROUP_MEM_SWAP_MAX)))
     # fmt: on
     return nsjail_args
-
-
-NSJAIL_ARGS = get_nsjail_args()
@@ -5,8 +5,15 @@ from fastapi import FastAPI
 from loguru import logger
 
 from . import config
-from .logging import init_loguru
-from .utils import inside_container
+from .blob_store import blob_store
+from .build_cache import build_cache
+from .codebox import measure_jail_setup_time
+from .jobs import job_queue
+from .logging import init_loguru, log_writer
+from .sandbox import sandbox_pool
+from .sessions import session_manager
+from .startup import probe, warm_up
+from .zygote import zygote
 
 
 @asynccontextmanager
@@ -19,17 +26,31 @@ async def lifespan(app: FastAPI) -> AsyncIterator:  # noqa: ARG001
 
 
 async def startup() -> None:
-    if not inside_container():
-        raise RuntimeError('This code must be executed inside a container.')
     init_loguru()
     show_config()
+    await probe()
+    await sandbox_pool.start()
+    build_cache.start()
+    blob_store.start()
+    if config.WARMUP_LANGUAGES:
+        await warm_up(config.WARMUP_LANGUAGES)
+    await measure_jail_setup_time()
+    if config.PYTHON_ZYGOTE:
+        await zygote.start()
+    await job_queue.start()
+    await session_manager.start()
     # insert here calls to connect to database and other services
     logger.info('started...')
 
 
 async def shutdown() -> None:
+    await job_queue.stop()
+    await session_manager.stop()
+    await zygote.stop()
+    await sandbox_pool.stop()
     # insert here calls to disconnect from database and other services
     logger.info('...shutdown')
+    log_writer.flush()
 
 
 def show_config() -> None:
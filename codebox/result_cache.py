@@ -0,0 +1,128 @@
+"""
+Memoization of project results.
+
+Projects declared as cacheable are identified by a canonical hash of their contents
+and of the toolchain versions. Their results are kept in memory for RESULT_CACHE_TTL seconds,
+and the least recently used ones are evicted when RESULT_CACHE_MAX_SIZE is exceeded.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+
+import orjson
+
+from . import config
+from .codebox import execute, run_project
+from .datasets import dataset_registry
+from .models import ExecFunc, ProjectCore, Response
+from .utils import available_languages
+
+
+@dataclass
+class CacheEntry:
+    responses: list[Response]
+    size: int
+    expires_at: float
+
+
+async def project_key(project: ProjectCore, exec_func: ExecFunc) -> str:
+    versions = await asyncio.to_thread(available_languages)
+    datasets = await asyncio.to_thread(dataset_registry.fingerprints, project.datasets)
+    contents = orjson.dumps(
+        {
+            # only the fields of ProjectCore, even if a subclass carries more
+            'project': project.model_dump(include=set(ProjectCore.model_fields) - {'cacheable'}),
+            'versions': versions,
+            # the datasets might be updated in place
+            'datasets': datasets,
+            'exec_func': exec_func.__name__,
+        },
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha256(contents).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
+
+    def get(self, key: str) -> list[Response] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.responses
+
+    def put(self, key: str, responses: list[Response]) -> None:
+        size = sum(
+            len(resp.stdout or '') + len(resp.stderr or '') + 100  # rough size of each response
+            for resp in responses
+        )
+        if size > self.max_size:
+            return
+        self._discard(key)
+        self._entries[key] = CacheEntry(responses, size, monotonic() + self.ttl)
+        self.size += size
+        while self.size > self.max_size:
+            self._discard(next(iter(self._entries)))
+
+    async def run_project(
+        self, project: ProjectCore, exec_func: ExecFunc = execute
+    ) -> list[Response]:
+        if not (self.enabled and project.cacheable):
+            return await run_project(
+                project.sources,
+                project.commands,
+                exec_func,
+                blobs=project.blobs,
+                datasets=project.datasets,
+            )
+
+        key = await project_key(project, exec_func)
+        if (responses := self.get(key)) is not None:
+            self.hits += 1
+            return [resp.model_copy(update={'cached': True}) for resp in responses]
+
+        self.misses += 1
+        responses = await run_project(
+            project.sources,
+            project.commands,
+            exec_func,
+            blobs=project.blobs,
+            datasets=project.datasets,
+        )
+        # timeouts and internal errors depend on the server load, not only on the project
+        if all(resp.exit_code != -1 for resp in responses):
+            self.put(key, responses)
+        return responses
+
+
+result_cache = ResultCache(config.RESULT_CACHE_MAX_SIZE, config.RESULT_CACHE_TTL)
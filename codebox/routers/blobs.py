@@ -0,0 +1,51 @@
+from collections.abc import Iterable
+
+from fastapi import APIRouter, HTTPException, Path, Request, Response, status
+
+from ..blob_store import BlobTooLarge, blob_store
+from ..models import Blob, ProjectCore, Sha256
+from ..timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def require_blobs(projects: Iterable[ProjectCore]) -> None:
+    """
+    Answer 409 with the digests of the referenced blobs that are not in the store,
+    so that the client uploads them and tries again.
+    """
+    digests = [digest for project in projects for digest in project.blobs.values()]
+    if missing := blob_store.missing(digests):
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, detail={'message': 'missing blobs', 'missing': missing}
+        )
+
+
+@router.put('/blobs/{sha256}', status_code=status.HTTP_201_CREATED)
+async def put_blob(
+    request: Request, response: Response, sha256: str = Path(pattern=r'^[0-9a-f]{64}$')
+) -> Blob:
+    """
+    Store the request body, whose SHA-256 digest must be `sha256`.
+    Projects reference it in their `blobs` field, which maps file paths to digests.
+    """
+    size = int(request.headers.get('content-length', 0))
+    if size > blob_store.max_blob_size:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='blob too large')
+    try:
+        size, created = await blob_store.put(sha256, request.stream())
+    except BlobTooLarge as error:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(error)) from error
+    except ValueError as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return Blob(sha256=sha256, size=size)
+
+
+@router.post('/blobs/missing')
+async def missing_blobs(digests: list[Sha256]) -> list[str]:
+    """
+    Return the digests that are not in the store and have to be uploaded.
+    """
+    return blob_store.missing(digests)
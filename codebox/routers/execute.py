@@ -1,21 +1,112 @@
-from fastapi import APIRouter
+from collections.abc import AsyncIterator
 
+import orjson
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from ..batch import iter_batch, run_batch
+from ..codebox import execute as exec_secure
 from ..codebox import execute_insecure as exec_insec
-from ..codebox import run_project
-from ..models import ProjectCore, Response
+from ..codebox import run_project, stream_project
+from ..encoding import FastJSONResponse, json_response
+from ..models import Batch, ExecFunc, ProjectCore, Response
+from ..result_cache import result_cache
+from ..timing import TimedRoute
 from ..utils import available_languages
+from .blobs import require_blobs
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def server_sent_events(events: AsyncIterator[tuple[str, dict]]) -> StreamingResponse:
+    async def encode() -> AsyncIterator[bytes]:
+        async for name, data in events:
+            yield b'event: %s\ndata: %s\n\n' % (name.encode(), orjson.dumps(data))
+
+    return StreamingResponse(encode(), media_type='text/event-stream')
+
+
+async def batch_events(projects: Batch, exec_func: ExecFunc) -> AsyncIterator[tuple[str, dict]]:
+    async for index, responses in iter_batch(projects, exec_func):
+        yield 'result', {'project': index, 'responses': [resp.model_dump() for resp in responses]}
+
+
+@router.post('/execute', response_model=list[Response])
+async def execute(request: Request, project: ProjectCore) -> FastJSONResponse:
+    require_blobs([project])
+    return await json_response(request, await result_cache.run_project(project))
+
+
+@router.post('/execute_insecure', response_model=list[Response])
+async def execute_insecure(request: Request, project: ProjectCore) -> FastJSONResponse:
+    require_blobs([project])
+    responses = await result_cache.run_project(project, exec_func=exec_insec)
+    return await json_response(request, responses)
+
+
+@router.post('/execute_archive', response_model=list[Response])
+async def execute_archive(request: Request) -> FastJSONResponse:
+    """
+    Run a project whose files come in the request body as a tar or zip archive,
+    optionally compressed with gzip or zstd. It is extracted into the sandbox as it arrives.
+    The commands are a JSON encoded list in the .commands.json file of the archive.
+    """
+    responses = await run_project({}, None, archive=request.stream())
+    return await json_response(request, responses)
+
+
+@router.post('/execute_insecure_archive', response_model=list[Response])
+async def execute_insecure_archive(request: Request) -> FastJSONResponse:
+    responses = await run_project({}, None, exec_func=exec_insec, archive=request.stream())
+    return await json_response(request, responses)
+
+
+@router.post('/execute_stream')
+async def execute_stream(project: ProjectCore) -> StreamingResponse:
+    require_blobs([project])
+    return server_sent_events(
+        stream_project(
+            project.sources, project.commands, blobs=project.blobs, datasets=project.datasets
+        )
+    )
+
 
-router = APIRouter()
+@router.post('/execute_insecure_stream')
+async def execute_insecure_stream(project: ProjectCore) -> StreamingResponse:
+    require_blobs([project])
+    return server_sent_events(
+        stream_project(
+            project.sources,
+            project.commands,
+            exec_func=exec_insec,
+            blobs=project.blobs,
+            datasets=project.datasets,
+        )
+    )
 
 
-@router.post('/execute')
-def execute(project: ProjectCore) -> list[Response]:
-    return run_project(project.sources, project.commands)
+@router.post('/execute_batch', response_model=list[list[Response]])
+async def execute_batch(
+    request: Request, projects: Batch, stream: bool = False
+) -> FastJSONResponse | StreamingResponse:
+    """
+    Run independent projects in parallel.
+    Results come back in order or, if `stream` is set, as Server-Sent Events as they finish.
+    """
+    require_blobs(projects)
+    if stream:
+        return server_sent_events(batch_events(projects, exec_secure))
+    return await json_response(request, await run_batch(projects))
 
 
-@router.post('/execute_insecure')
-def execute_insecure(project: ProjectCore) -> list[Response]:
-    return run_project(project.sources, project.commands, exec_func=exec_insec)
+@router.post('/execute_insecure_batch', response_model=list[list[Response]])
+async def execute_insecure_batch(
+    request: Request, projects: Batch, stream: bool = False
+) -> FastJSONResponse | StreamingResponse:
+    require_blobs(projects)
+    if stream:
+        return server_sent_events(batch_events(projects, exec_insec))
+    return await json_response(request, await run_batch(projects, exec_func=exec_insec))
 
 
 @router.get('/languages')
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, status
+
+from ..codebox import execute as exec_secure
+from ..codebox import execute_insecure as exec_insec
+from ..jobs import QueueFull, job_queue
+from ..models import ExecFunc, Job, JobRequest
+from ..timing import TimedRoute
+from .blobs import require_blobs
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def submit(request: JobRequest, exec_func: ExecFunc) -> Job:
+    require_blobs([request])
+    try:
+        return job_queue.submit(request, request.priority, exec_func)
+    except QueueFull as error:
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(error),
+            headers={'Retry-After': str(error.retry_after)},
+        ) from error
+
+
+@router.post('/jobs', status_code=status.HTTP_202_ACCEPTED)
+async def post_job(request: JobRequest) -> Job:
+    """
+    Queue a project to be executed. Its status and results are available at /jobs/{id}.
+    A full queue is answered with 429 and a Retry-After header.
+    """
+    return submit(request, exec_secure)
+
+
+@router.post('/jobs_insecure', status_code=status.HTTP_202_ACCEPTED)
+async def post_job_insecure(request: JobRequest) -> Job:
+    return submit(request, exec_insec)
+
+
+@router.get('/jobs/{job_id}')
+async def get_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='job not found')
+    return job
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Request
+
+from ..codebox import execute as exec_secure
+from ..codebox import execute_insecure as exec_insec
+from ..encoding import FastJSONResponse, json_response
+from ..judge import judge
+from ..models import JudgeRequest, JudgeResult
+from ..timing import TimedRoute
+from .blobs import require_blobs
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.post('/judge', response_model=JudgeResult)
+async def judge_secure(request: Request, judge_request: JudgeRequest) -> FastJSONResponse:
+    """
+    Run the commands of the project, then its command once per case with the stdin of the case.
+    The cases run at the same time, each in its own jail, and their responses are in order.
+    """
+    require_blobs([judge_request])
+    return await json_response(request, await judge(judge_request, exec_secure))
+
+
+@router.post('/judge_insecure', response_model=JudgeResult)
+async def judge_insecure(request: Request, judge_request: JudgeRequest) -> FastJSONResponse:
+    require_blobs([judge_request])
+    return await json_response(request, await judge(judge_request, exec_insec))
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics as _metrics
+from ..blob_store import blob_store
+from ..build_cache import build_cache
+from ..datasets import dataset_registry
+from ..jobs import job_queue
+from ..result_cache import result_cache
+from ..sandbox import sandbox_pool
+from ..sessions import session_manager
+from ..timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    components = {
+        'sandbox_pool': sandbox_pool.stats(),
+        'build_cache': build_cache.stats(),
+        'blob_store': blob_store.stats(),
+        'datasets': dataset_registry.stats(),
+        'result_cache': result_cache.stats(),
+        'job_queue': job_queue.stats(),
+        'sessions': session_manager.stats(),
+    }
+    for component, stats in components.items():
+        for stat, value in stats.items():
+            _metrics.component_stats.set(value, component=component, stat=stat)
+    return PlainTextResponse(
+        _metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException, Request, status
+
+from ..codebox import execute as exec_secure
+from ..codebox import execute_insecure as exec_insec
+from ..encoding import FastJSONResponse, json_response
+from ..models import Commands, ExecFunc, Response, Session, SessionRequest, SessionUpdate
+from ..sessions import NoCapacity, session_manager
+from ..timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def not_found() -> HTTPException:
+    return HTTPException(status.HTTP_404_NOT_FOUND, detail='session not found')
+
+
+async def create(request: SessionRequest, exec_func: ExecFunc) -> Session:
+    try:
+        return await session_manager.create(request, exec_func)
+    except NoCapacity as error:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error)) from error
+    except (OSError, ValueError) as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+
+@router.post('/sessions', status_code=status.HTTP_201_CREATED)
+async def create_session(request: SessionRequest) -> Session:
+    """
+    Open a session whose sandbox is kept between requests until it is idle for `ttl` seconds.
+    Its files can't take more than `quota` bytes.
+    """
+    return await create(request, exec_secure)
+
+
+@router.post('/sessions_insecure', status_code=status.HTTP_201_CREATED)
+async def create_session_insecure(request: SessionRequest) -> Session:
+    return await create(request, exec_insec)
+
+
+@router.get('/sessions/{session_id}')
+async def get_session(session_id: str) -> Session:
+    session = session_manager.get(session_id)
+    if session is None:
+        raise not_found()
+    return session
+
+
+@router.patch('/sessions/{session_id}')
+async def update_session(session_id: str, update: SessionUpdate) -> Session:
+    """
+    Delete the `deleted` paths and save the `sources` files in the session sandbox.
+    """
+    try:
+        session = await session_manager.update(session_id, update)
+    except (OSError, ValueError) as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    if session is None:
+        raise not_found()
+    return session
+
+
+@router.post('/sessions/{session_id}/execute', response_model=list[Response])
+async def execute_session(
+    request: Request, session_id: str, commands: Commands
+) -> FastJSONResponse:
+    """
+    Run commands in the session sandbox, which keeps the files left by the previous ones.
+    """
+    responses = await session_manager.run(session_id, commands)
+    if responses is None:
+        raise not_found()
+    return await json_response(request, responses)
+
+
+@router.delete('/sessions/{session_id}', status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(session_id: str) -> None:
+    if not await session_manager.close(session_id):
+        raise not_found()
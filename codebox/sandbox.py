@@ -0,0 +1,183 @@
+"""
+Pool of ready-to-use sandbox directories.
+
+Creating and, mostly, removing sandbox directories is kept off the request path:
+a background task keeps the pool filled and another one removes used sandboxes.
+
+If SANDBOX_QUOTA is set, each sandbox is a tmpfs mount of that size.
+Its files stay in memory, a program that fills it up gets ENOSPC,
+and removing it is a single unmount.
+"""
+
+import asyncio
+import ctypes
+import os
+import shutil
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from tempfile import mkdtemp
+
+from loguru import logger
+
+from . import config, metrics
+
+# mount(2) flags
+MS_RDONLY = 1
+MS_NOSUID = 2
+MS_NODEV = 4
+MS_REMOUNT = 32
+MS_BIND = 4096
+MNT_DETACH = 2
+
+_libc = ctypes.CDLL(None, use_errno=True)
+# cleared when the server is not allowed to mount file systems
+quota_supported = True
+
+
+def _mount(
+    source: bytes | None, path: Path, fstype: bytes | None, flags: int, data: bytes | None
+) -> None:
+    if _libc.mount(source, bytes(path), fstype, flags, data) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), str(path))
+
+
+def mount_tmpfs(path: Path, size: int, max_files: int) -> None:
+    options = f'size={size},nr_inodes={max_files},mode=0777'
+    _mount(b'tmpfs', path, b'tmpfs', MS_NOSUID | MS_NODEV, options.encode())
+
+
+def bind_mount_read_only(source: Path, path: Path) -> None:
+    _mount(bytes(source), path, None, MS_BIND, None)
+    # the read-only flag of a bind mount only applies when it is remounted
+    try:
+        _mount(None, path, None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV, None)
+    except OSError:
+        unmount(path)
+        raise
+
+
+def unmount(path: Path) -> None:
+    # a lazy unmount succeeds even if a process still uses the mount
+    _libc.umount2(bytes(path), MNT_DETACH)
+
+
+def create_sandbox(quota: int | None = None) -> Path:
+    """
+    Create a sandbox directory under SANDBOX_ROOT,
+    limited to `quota` bytes (SANDBOX_QUOTA by default) if it is not zero.
+    """
+    global quota_supported  # noqa: PLW0603
+    quota = config.SANDBOX_QUOTA if quota is None else quota
+    sandbox_path = Path(mkdtemp(prefix='sandbox_', dir=config.SANDBOX_ROOT or None))
+    if quota and quota_supported:
+        try:
+            mount_tmpfs(sandbox_path, quota, config.SANDBOX_MAX_FILES)
+        except OSError as error:
+            quota_supported = False
+            logger.warning(f'sandbox quota disabled: {error}')
+    os.chmod(sandbox_path, 0o0777)  # to be used in nsjail later  # noqa: S103
+    return sandbox_path
+
+
+def remove_sandbox(sandbox_path: Path) -> None:
+    if os.path.ismount(sandbox_path):
+        # a lazy unmount frees the contents even if a process still uses them
+        unmount(sandbox_path)
+        with suppress(OSError):
+            sandbox_path.rmdir()
+        return
+    shutil.rmtree(sandbox_path, ignore_errors=True)
+
+
+class SandboxPool:
+    def __init__(self, size: int, cleanup_high_water: int) -> None:
+        self.size = size
+        self.cleanup_high_water = cleanup_high_water
+        self.hits = 0
+        self.misses = 0
+        self.overflows = 0  # sandboxes removed in the request path
+        self._ready: deque[Path] = deque()
+        self._refill = asyncio.Event()
+        self._used: asyncio.Queue[Path] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'ready': len(self._ready),
+            'pending_cleanup': self._used.qsize(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'overflows': self.overflows,
+        }
+
+    async def start(self) -> None:
+        self._refill.set()
+        self._tasks = [
+            asyncio.create_task(self._refiller()),
+            asyncio.create_task(self._reaper()),
+        ]
+
+    async def stop(self) -> None:
+        # let the reaper finish the pending work before stopping it
+        await self._used.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._ready:
+            remove_sandbox(self._ready.popleft())
+        logger.debug('sandbox pool stopped', **self.stats())
+
+    async def acquire(self) -> Path:
+        with metrics.phase_duration.time(phase='sandbox_creation'):
+            if self._ready:
+                self.hits += 1
+                sandbox_path = self._ready.popleft()
+            else:
+                self.misses += 1
+                sandbox_path = create_sandbox()
+        self._refill.set()
+        return sandbox_path
+
+    async def release(self, sandbox_path: Path) -> None:
+        if self.running and self._used.qsize() < self.cleanup_high_water:
+            self._used.put_nowait(sandbox_path)
+            return
+        # no reaper or too much pending work: apply backpressure
+        self.overflows += 1
+        await self._remove(sandbox_path)
+
+    @asynccontextmanager
+    async def sandbox(self) -> AsyncIterator[Path]:
+        sandbox_path = await self.acquire()
+        try:
+            yield sandbox_path
+        finally:
+            await self.release(sandbox_path)
+
+    async def _remove(self, sandbox_path: Path) -> None:
+        with metrics.phase_duration.time(phase='cleanup'):
+            await asyncio.to_thread(remove_sandbox, sandbox_path)
+
+    async def _refiller(self) -> None:
+        while True:
+            await self._refill.wait()
+            self._refill.clear()
+            while len(self._ready) < self.size:
+                self._ready.append(create_sandbox())
+
+    async def _reaper(self) -> None:
+        while True:
+            sandbox_path = await self._used.get()
+            await self._remove(sandbox_path)
+            self._used.task_done()
+
+
+sandbox_pool = SandboxPool(config.SANDBOX_POOL_SIZE, config.SANDBOX_CLEANUP_HIGH_WATER)
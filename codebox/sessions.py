@@ -0,0 +1,228 @@
+"""
+Persistent sessions.
+
+A session keeps its sandbox between requests, so that clients send only the files that changed
+and reuse what previous commands left behind, such as compiled programs.
+Each sandbox is limited to the quota of its session. Sessions are closed once they are idle
+for their TTL, and the least recently used idle ones are evicted to make room for new sessions.
+"""
+
+import asyncio
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import monotonic
+from uuid import uuid4
+
+from loguru import logger
+
+from . import config, metrics
+from .codebox import execute, iter_commands
+from .models import Command, ExecFunc, Response, Session, SessionRequest, SessionUpdate
+from .sandbox import create_sandbox, remove_sandbox
+from .utils import remove_source, save_source
+
+
+class NoCapacity(Exception):  # noqa: N818
+    pass
+
+
+@dataclass
+class SessionState:
+    id: str
+    exec_func: ExecFunc
+    ttl: float
+    quota: int
+    path: Path | None = None
+    expires_at: float = 0
+    closed: bool = False
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def touch(self) -> None:
+        self.expires_at = monotonic() + self.ttl
+
+    def describe(self) -> Session:
+        return Session(
+            id=self.id,
+            ttl=self.ttl,
+            quota=self.quota,
+            expires_in=max(self.expires_at - monotonic(), 0),
+        )
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int, max_memory: int, reap_interval: float = 1) -> None:
+        self.max_sessions = max_sessions
+        self.max_memory = max_memory
+        self.reap_interval = reap_interval
+        self.evicted = 0
+        self.expired = 0
+        # least recently used first
+        self._sessions: OrderedDict[str, SessionState] = OrderedDict()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def reserved_memory(self) -> int:
+        return sum(state.quota for state in self._sessions.values())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'open': len(self._sessions),
+            'reserved_memory': self.reserved_memory,
+            'evicted': self.evicted,
+            'expired': self.expired,
+        }
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._reaper())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for state in list(self._sessions.values()):
+            await self._close(state)
+
+    async def create(self, request: SessionRequest, exec_func: ExecFunc = execute) -> Session:
+        """
+        Open a session with the request sources in its sandbox.
+        Raise NoCapacity if the open sessions can't make room for it,
+        and ValueError if a source file can't be saved.
+        """
+        victims = self._make_room(request.quota)
+        state = SessionState(uuid4().hex, exec_func, request.ttl, request.quota)
+        # the new session is busy, and can't be evicted, until it is ready
+        await state.lock.acquire()
+        self._sessions[state.id] = state
+        try:
+            for victim in victims:
+                await self._close(victim)
+            with metrics.phase_duration.time(phase='sandbox_creation'):
+                state.path = await asyncio.to_thread(create_sandbox, state.quota)
+            self._update(state, SessionUpdate(sources=request.sources))
+        except Exception:
+            await self._close(state)
+            raise
+        finally:
+            state.lock.release()
+        state.touch()
+        logger.info('session created', session=state.id, source_files=request.sources)
+        return state.describe()
+
+    def get(self, session_id: str) -> Session | None:
+        state = self._sessions.get(session_id)
+        return state.describe() if state else None
+
+    async def update(self, session_id: str, update: SessionUpdate) -> Session | None:
+        """
+        Save and delete files of the session sandbox.
+        Raise ValueError if a path is invalid or a file can't be saved.
+        """
+        state = self._lookup(session_id)
+        if state is None:
+            return None
+        async with state.lock:
+            if state.closed:
+                return None
+            try:
+                self._update(state, update)
+            finally:
+                state.touch()
+        return state.describe()
+
+    async def run(self, session_id: str, commands: list[Command]) -> list[Response] | None:
+        """
+        Run commands in the session sandbox, after the commands sent before.
+        """
+        state = self._lookup(session_id)
+        if state is None:
+            return None
+        async with state.lock:
+            if state.closed:
+                return None
+            assert state.path  # noqa: S101
+            try:
+                async with aclosing(iter_commands(commands, state.path, state.exec_func)) as resps:
+                    return [resp async for resp in resps]
+            finally:
+                state.touch()
+
+    async def close(self, session_id: str) -> bool:
+        state = self._sessions.get(session_id)
+        if state is None:
+            return False
+        async with state.lock:
+            await self._close(state)
+        return True
+
+    def _lookup(self, session_id: str) -> SessionState | None:
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    @staticmethod
+    def _update(state: SessionState, update: SessionUpdate) -> None:
+        assert state.path  # noqa: S101
+        with metrics.phase_duration.time(phase='save_source'):
+            for filepath in update.deleted:
+                remove_source(state.path, filepath)
+            for filepath, contents in update.sources.items():
+                save_source(state.path, filepath, contents)
+
+    def _make_room(self, quota: int) -> list[SessionState]:
+        """
+        Pick the least recently used idle sessions to be evicted to make room for a new one.
+        """
+        if quota > self.max_memory:
+            raise NoCapacity(f'session quota exceeds {self.max_memory} bytes')
+        count = len(self._sessions)
+        memory = self.reserved_memory
+        victims = []
+        for state in self._sessions.values():
+            if count < self.max_sessions and memory + quota <= self.max_memory:
+                break
+            if not state.lock.locked():
+                victims.append(state)
+                count -= 1
+                memory -= state.quota
+        if count >= self.max_sessions or memory + quota > self.max_memory:
+            raise NoCapacity('all sessions are busy')
+        for victim in victims:
+            # leave the sessions right away, so that no request picks them
+            self._detach(victim)
+        self.evicted += len(victims)
+        return victims
+
+    def _detach(self, state: SessionState) -> None:
+        state.closed = True
+        self._sessions.pop(state.id, None)
+
+    async def _close(self, state: SessionState) -> None:
+        self._detach(state)
+        if state.path is not None:
+            with metrics.phase_duration.time(phase='cleanup'):
+                await asyncio.to_thread(remove_sandbox, state.path)
+            state.path = None
+
+    async def _reaper(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            now = monotonic()
+            expired = [
+                state
+                for state in self._sessions.values()
+                if state.expires_at <= now and not state.lock.locked()
+            ]
+            for state in expired:
+                # leave the sessions right away, so that no request picks them
+                self._detach(state)
+            for state in expired:
+                logger.info('session expired', session=state.id)
+                await self._close(state)
+            self.expired += len(expired)
+
+
+session_manager = SessionManager(config.SESSIONS_MAX, config.SESSIONS_MAX_MEMORY)
@@ -0,0 +1,73 @@
+"""
+Probing of the environment and warm-up at startup.
+
+The probes are independent and mostly wait for the file system and for subprocesses,
+so they run at the same time in threads instead of one after the other, or at import time.
+"""
+
+import asyncio
+import shlex
+import shutil
+from collections.abc import Callable
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from loguru import logger
+
+from . import config
+from .codebox import execute, execute_insecure
+from .models import Command
+from .nsjail import nsjail
+from .sandbox import sandbox_pool
+from .utils import LANGUAGES, available_languages, inside_container
+
+
+async def _timed(func: Callable[[], Any], durations: dict[str, float]) -> Any:  # noqa: ANN401
+    start_time = perf_counter()
+    try:
+        return await asyncio.to_thread(func)
+    finally:
+        durations[func.__name__] = perf_counter() - start_time
+
+
+async def probe() -> dict[str, float]:
+    """
+    Check that the server runs inside a container, then set the cgroups for NsJail up
+    and find out the language versions at the same time. Return how long each probe took.
+    """
+    durations: dict[str, float] = {}
+    # nothing is set up on a host that is not a container
+    if not await _timed(inside_container, durations):
+        raise RuntimeError('This code must be executed inside a container.')
+    await asyncio.gather(
+        # it sets the cgroups up and probes the swap controller on its first call
+        _timed(nsjail.get_nsjail_args, durations),
+        _timed(available_languages, durations),
+    )
+    logger.info('startup probes', durations=durations)
+    return durations
+
+
+async def warm_up(languages: list[str]) -> None:
+    """
+    Run the executable of each language once, in a jail if NsJail is installed,
+    so that the first requests don't wait for them to be read from disk.
+    """
+    exec_func = execute if Path(config.NSJAIL_PATH).exists() else execute_insecure
+    commands = []
+    for language in languages:
+        if language not in LANGUAGES or not (path := shutil.which(LANGUAGES[language][0])):
+            logger.warning(f'no executable to warm {language} up')
+            continue
+        commands.append(Command(command=f'{shlex.quote(path)} --version', timeout=10))
+
+    async def run(command: Command) -> None:
+        async with sandbox_pool.sandbox() as sandbox_path:
+            response = await exec_func(command, sandbox_path)
+        if response.exit_code:
+            logger.warning(f'warm-up failed: {command.command}', response=response)
+
+    start_time = perf_counter()
+    await asyncio.gather(*(run(command) for command in commands))
+    logger.info(f'warm-up time: {(perf_counter() - start_time) * 1000:.0f}ms')
@@ -0,0 +1,104 @@
+"""
+Timing of the phases of each request, reported in the Server-Timing header.
+"""
+
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+from typing import Any
+
+from fastapi.routing import APIRoute
+
+# Server-Timing metric: (description, phases of metrics.phase_duration added up)
+PHASES = {
+    'sandbox': ('sandbox setup', ('sandbox_creation', 'save_source')),
+    'queue': ('waiting for an execution slot', ('queue_wait',)),
+    'exec': ('execution', ('runtime',)),
+    'encoding': ('response encoding and compression', ('encoding',)),
+}
+
+
+@dataclass
+class RequestTiming:
+    start: float = field(default_factory=perf_counter)
+    endpoint_start: float | None = None
+    endpoint_end: float | None = None
+    phases: dict[str, float] = field(default_factory=dict)  # seconds
+
+    def server_timing(self) -> str:
+        """
+        Value of the Server-Timing header, with durations in milliseconds.
+
+        Phases that happen after the response starts, as in streaming responses, are not included.
+        """
+        now = perf_counter()
+        metrics = []
+        if self.endpoint_start:
+            metrics.append(
+                ('validation', 'request parsing and validation', self.endpoint_start - self.start)
+            )
+        for name, (description, phases) in PHASES.items():
+            if any(phase in self.phases for phase in phases):
+                metrics.append(
+                    (name, description, sum(self.phases.get(phase, 0) for phase in phases))
+                )
+        if self.endpoint_end:
+            metrics.append(('serialization', 'response serialization', now - self.endpoint_end))
+        metrics.append(('total', '', now - self.start))
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.3f}' + (f';desc="{description}"' if description else '')
+            for name, description, seconds in metrics
+        )
+
+
+request_timing: ContextVar[RequestTiming | None] = ContextVar('request_timing', default=None)
+
+
+def add_phase(phase: str, seconds: float) -> None:
+    if (timing := request_timing.get()) is not None:
+        timing.phases[phase] = timing.phases.get(phase, 0) + seconds
+
+
+def timed_endpoint(endpoint: Callable) -> Callable:
+    """
+    Record when the endpoint starts and finishes, which separates validation and serialization
+    from the endpoint itself.
+    """
+
+    def mark_start() -> None:
+        if (timing := request_timing.get()) is not None:
+            timing.endpoint_start = perf_counter()
+
+    def mark_end() -> None:
+        if (timing := request_timing.get()) is not None:
+            timing.endpoint_end = perf_counter()
+
+    if iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            mark_start()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                mark_end()
+
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        mark_start()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            mark_end()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any) -> None:  # noqa: ANN401
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
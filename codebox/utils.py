@@ -1,7 +1,12 @@
+import fcntl
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
 from pathlib import Path
-from subprocess import check_output, run
+from subprocess import check_output
+
+FICLONE = 0x40049409  # ioctl sharing the blocks of a file with another one
 
 
 def save_source(dest_dir: Path, filepath: str, contents: str) -> None:
@@ -13,6 +18,54 @@ def save_source(dest_dir: Path, filepath: str, contents: str) -> None:
     path.write_text(contents)
 
 
+def remove_source(dest_dir: Path, filepath: str) -> None:
+    path = (dest_dir / filepath.lstrip(os.sep)).resolve()
+    if path == dest_dir or not path.is_relative_to(dest_dir):
+        raise ValueError(f'Invalid file path: {path}')
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+# marks the directories that codebox created and can empty
+OWNED_MARKER = '.codebox'
+
+
+def reset_owned_dir(path: Path, owned: bool = False) -> None:
+    """
+    Create the directory or empty it if codebox created it, or if it is `owned` anyway,
+    as a default directory is. A directory that is not empty and was not created by codebox
+    might be shared, so it is left alone.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    marker = path / OWNED_MARKER
+    if not owned and not marker.exists() and any(path.iterdir()):
+        raise RuntimeError(f'{path} is not empty and was not created by codebox')
+    for entry in path.iterdir():
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry)
+        else:
+            entry.unlink()
+    marker.touch()
+
+
+def clone_file(src: str | Path, dest: str | Path) -> bool:
+    """
+    Copy a file as a reflink clone, which shares the blocks of the source,
+    where the file system supports it. Return whether it was cloned.
+    """
+    with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            pass
+        else:
+            return True
+    shutil.copyfile(src, dest)
+    return False
+
+
 def inside_container() -> bool:
     """
     The developer's machine is not sandboxed and should not run any testing snippets,
@@ -23,26 +76,35 @@ def inside_container() -> bool:
     * https://stackoverflow.com/questions/23513045/how-to-check-if-a-process-is-running-inside-docker-container  # noqa: E501
     * https://stackoverflow.com/a/25518538/266362
     """  # noqa: E501
-    return (
-        Path('/.dockerenv').exists()
-        or Path('/run/.containerenv').exists()
-        or bool(
-            run(
-                ['/usr/bin/grep', ':/docker', '/proc/1/cgroup'], capture_output=True, text=True
-            ).stdout
-        )
-    )
+    if Path('/.dockerenv').exists() or Path('/run/.containerenv').exists():
+        return True
+    try:
+        return ':/docker' in Path('/proc/1/cgroup').read_text()
+    except OSError:
+        return False
+
+
+# language: executable, position of the version in the output of `executable --version`
+LANGUAGES = {
+    'python': ('python', 1),
+    'rust': ('rustc', 1),
+    'sqlite3': ('sqlite3', 0),
+    'bash': ('bash', 3),
+}
+
+
+def get_version(executable: str, position: int) -> str:
+    return check_output((executable, '--version'), text=True).split()[position]
 
 
 @cache
 def available_languages() -> dict[str, str]:
-    def get_version(lang_name: str) -> list[str]:
-        resp = check_output((lang_name, '--version'), text=True)
-        return resp.split()
-
-    return {
-        'python': get_version('python')[1],
-        'rust': get_version('rustc')[1],
-        'sqlite3': get_version('sqlite3')[0],
-        'bash': get_version('bash')[3],
-    }
+    """
+    Versions of the available languages.
+
+    They are probed at the same time, once per process. They are not kept across starts,
+    since a toolchain manager such as rustup can change a version behind the same executable.
+    """
+    with ThreadPoolExecutor(len(LANGUAGES)) as executor:
+        versions = executor.map(lambda args: get_version(*args), LANGUAGES.values())
+        return dict(zip(LANGUAGES, versions, strict=True))
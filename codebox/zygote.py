@@ -0,0 +1,163 @@
+"""
+Client of the Python zygote, a warm interpreter that forks a child for each execution
+instead of starting a new interpreter. See zygote_server.py.
+
+Only insecure executions use it: a jailed command runs in its own namespaces, which
+a process forked outside the jail can't enter.
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from collections.abc import Sequence
+from contextlib import suppress
+from pathlib import Path
+
+import orjson
+from loguru import logger
+
+from . import config
+
+SERVER_PATH = Path(__file__).parent / 'zygote_server.py'
+
+
+class ZygoteProcess:
+    """
+    Child of the zygote, with the subset of asyncio.subprocess.Process used by _execute().
+    """
+
+    def __init__(
+        self,
+        pid: int,
+        stdin: asyncio.StreamWriter,
+        stdout: asyncio.StreamReader,
+        stderr: asyncio.StreamReader,
+        control: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    ) -> None:
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        self._control = control
+
+    async def wait(self) -> int:
+        if self.returncode is None:
+            reader, writer = self._control
+            line = await reader.readline()
+            self.returncode = int(line) if line else -1
+            writer.close()
+        return self.returncode
+
+    def kill(self) -> None:
+        with suppress(ProcessLookupError):
+            os.kill(self.pid, signal.SIGKILL)
+
+
+async def _read_pipe(fd: int) -> asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2**16)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, 'rb', 0)
+    )
+    return reader
+
+
+async def _write_pipe(fd: int) -> asyncio.StreamWriter:
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(fd, 'wb', 0)
+    )
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+class Zygote:
+    def __init__(self, python: str, preload: Sequence[str]) -> None:
+        self.python = python
+        self.preload = preload
+        self._process: asyncio.subprocess.Process | None = None
+        self._socket_dir: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def socket_path(self) -> str:
+        assert self._socket_dir  # noqa: S101
+        return os.path.join(self._socket_dir, 'zygote.sock')
+
+    async def start(self, timeout: float = 10) -> None:
+        self._socket_dir = tempfile.mkdtemp(prefix='zygote_')
+        self._process = await asyncio.create_subprocess_exec(
+            self.python, str(SERVER_PATH), self.socket_path, *self.preload
+        )
+        async with asyncio.timeout(timeout):
+            while not os.path.exists(self.socket_path):
+                if self._process.returncode is not None:
+                    raise RuntimeError('the Python zygote could not start')
+                await asyncio.sleep(0.01)
+        logger.info(f'python zygote started, pid {self._process.pid}')
+
+    async def stop(self) -> None:
+        if self._process and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        self._process = None
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def accepts(self, arguments: Sequence[str]) -> bool:
+        """
+        Whether the command is `<zygote python> script.py [args]`, the only form it can run.
+        """
+        if not self.running or len(arguments) < 2 or arguments[1].startswith('-'):  # noqa: PLR2004
+            return False
+        executable = shutil.which(arguments[0])
+        return executable is not None and os.path.realpath(executable) == os.path.realpath(
+            self.python
+        )
+
+    async def spawn(self, arguments: Sequence[str], cwd: str | Path | None = None) -> ZygoteProcess:
+        loop = asyncio.get_running_loop()
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        control = None
+        try:
+            try:
+                sock.setblocking(False)
+                await loop.sock_connect(sock, self.socket_path)
+                request = orjson.dumps({'argv': arguments[1:], 'cwd': str(cwd or os.getcwd())})
+                socket.send_fds(sock, [request], [stdin_read, stdout_write, stderr_write])
+            finally:
+                # the child has its own copies now
+                for fd in (stdin_read, stdout_write, stderr_write):
+                    os.close(fd)
+            control = await asyncio.open_unix_connection(sock=sock)
+            pid = int(await control[0].readline())
+        except BaseException:
+            # the zygote might have died or answered garbage
+            if control:
+                control[1].close()
+            else:
+                sock.close()
+            for fd in (stdin_write, stdout_read, stderr_read):
+                os.close(fd)
+            raise
+        return ZygoteProcess(
+            pid,
+            stdin=await _write_pipe(stdin_write),
+            stdout=await _read_pipe(stdout_read),
+            stderr=await _read_pipe(stderr_read),
+            control=control,
+        )
+
+
+zygote = Zygote(config.ZYGOTE_PYTHON or sys.executable, config.ZYGOTE_PRELOAD)
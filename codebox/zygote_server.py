@@ -0,0 +1,145 @@
+"""
+Warm Python interpreter that forks a fresh child for each execution.
+
+Usage: python zygote_server.py <socket path> [module to preload ...]
+
+Each connection sends a JSON request ``{"argv": [script, *args], "cwd": ...}`` together with
+the stdin, stdout and stderr file descriptors of the execution.
+The server answers with the child PID and, when the child finishes, with its exit code,
+one per line.
+
+This module is executed by a separate interpreter and must only depend on the standard library.
+"""
+
+import atexit
+import builtins
+import importlib
+import io
+import json
+import os
+import selectors
+import socket
+import sys
+import threading
+import traceback
+import types
+from contextlib import suppress
+from importlib.machinery import SourceFileLoader
+from pathlib import Path
+
+MAX_FDS = 3
+
+
+def exit_code(exc: SystemExit) -> int:
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def forget_shadowed_modules(script_dir: Path) -> None:
+    """
+    Remove the preloaded modules that a cold interpreter would import from the script directory.
+    """
+    local_names = {
+        path.stem if path.suffix == '.py' else path.name
+        for path in script_dir.iterdir()
+        if path.suffix == '.py' or path.is_dir()
+    }
+    for name in list(sys.modules):
+        if name.partition('.')[0] in local_names:
+            del sys.modules[name]
+
+
+def run_main(script: str) -> None:
+    """
+    Execute the script as the __main__ module. Unlike runpy, it leaves sys.argv untouched.
+    """
+    main = types.ModuleType('__main__')
+    main.__file__ = script
+    main.__loader__ = SourceFileLoader('__main__', script)
+    main.__dict__['__builtins__'] = builtins
+    sys.modules['__main__'] = main
+    with io.open_code(script) as file:
+        code = compile(file.read(), script, 'exec', dont_inherit=True)
+    exec(code, main.__dict__)  # noqa: S102
+
+
+def run_child(argv: list[str], cwd: str, fds: list[int]) -> None:
+    """
+    Run a script as a cold `python script.py args` would. It never returns.
+    """
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+    os.closerange(MAX_FDS, os.sysconf('SC_OPEN_MAX'))
+    code = 0
+    os.chdir(cwd)
+    script = os.path.abspath(argv[0])
+    try:
+        script_dir = Path(script).resolve().parent
+        sys.argv = argv
+        sys.path[0] = str(script_dir)
+        forget_shadowed_modules(script_dir)
+        run_main(script)
+    except SystemExit as exc:
+        code = exit_code(exc)
+    except BaseException as exc:
+        # hide the frames of this module, as a cold interpreter would
+        tb = exc.__traceback__
+        while tb and tb.tb_frame.f_code.co_filename != script:
+            tb = tb.tb_next
+        traceback.print_exception(type(exc), exc, tb)
+        code = 1
+    finally:
+        # the interpreter waits for non-daemon threads before the exit functions
+        with suppress(BaseException):
+            threading._shutdown()  # type: ignore[attr-defined]
+        with suppress(BaseException):
+            atexit._run_exitfuncs()
+        for stream in (sys.stdout, sys.stderr):
+            with suppress(BaseException):
+                stream.flush()
+    os._exit(code)
+
+
+def serve(socket_path: str) -> None:
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # the socket path only shows up once connections are accepted
+    listener.bind(f'{socket_path}.tmp')
+    listener.listen(128)
+    os.rename(f'{socket_path}.tmp', socket_path)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                message, fds, _, _ = socket.recv_fds(conn, 2**16, MAX_FDS)
+                request = json.loads(message)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    run_child(request['argv'], request['cwd'], fds)
+                for fd in fds:
+                    os.close(fd)
+                conn.sendall(f'{pid}\n'.encode())
+                # a pidfd becomes readable when the process finishes
+                selector.register(os.pidfd_open(pid), selectors.EVENT_READ, (pid, conn))
+            else:
+                pid, conn = key.data
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                _, status = os.waitpid(pid, 0)
+                with suppress(OSError):
+                    conn.sendall(f'{os.waitstatus_to_exitcode(status)}\n'.encode())
+                conn.close()
+
+
+if __name__ == '__main__':
+    for module in sys.argv[2:]:
+        importlib.import_module(module)
+    serve(sys.argv[1])
@@ -0,0 +1,117 @@
+import hashlib
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import orjson
+import pytest
+import zstandard
+from httpx import AsyncClient
+
+from codebox.archive import MANIFEST, ArchiveError, extract
+from codebox.models import Command, Response
+
+BINARY = bytes(range(256)) * 64
+SCRIPT = '#!/bin/bash\nsha256sum data/blob.bin\n'
+
+
+def make_tar(files: dict[str, bytes], mode: str = 'w', executable: tuple[str, ...] = ()) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:  # type: ignore[call-overload]
+        for name, contents in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            info.mode = 0o755 if name in executable else 0o644
+            archive.addfile(info, io.BytesIO(contents))
+    return buffer.getvalue()
+
+
+def make_zip(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, contents in files.items():
+            archive.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def manifest(commands: list[Command]) -> dict[str, bytes]:
+    return {MANIFEST: orjson.dumps([command.model_dump() for command in commands])}
+
+
+async def post_archive(client: AsyncClient, body: bytes) -> list[Response]:
+    resp = await client.post(
+        '/execute_insecure_archive',
+        content=body,
+        headers={'Content-Type': 'application/octet-stream'},
+    )
+    assert resp.status_code == 200
+    return [Response(**r) for r in resp.json()]
+
+
+@pytest.mark.parametrize('mode', ['w', 'w:gz'])
+async def test_tar_upload(client: AsyncClient, mode: str) -> None:
+    commands = [Command(command='./run.sh', timeout=5)]
+    files = {'data/blob.bin': BINARY, 'run.sh': SCRIPT.encode(), **manifest(commands)}
+    responses = await post_archive(client, make_tar(files, mode, ('run.sh',)))
+    digest = hashlib.sha256(BINARY).hexdigest()
+    assert responses == [Response(stdout=f'{digest}  data/blob.bin\n', stderr='', exit_code=0)]
+
+
+async def test_zip_upload(client: AsyncClient) -> None:
+    commands = [Command(command='/bin/bash run.sh', timeout=5)]
+    files = {'data/blob.bin': BINARY, 'run.sh': SCRIPT.encode(), **manifest(commands)}
+    responses = await post_archive(client, make_zip(files))
+    digest = hashlib.sha256(BINARY).hexdigest()
+    assert responses == [Response(stdout=f'{digest}  data/blob.bin\n', stderr='', exit_code=0)]
+
+
+async def test_zstd_upload(client: AsyncClient) -> None:
+    files = {'hello.txt': b'hello', **manifest([Command(command='/bin/cat hello.txt')])}
+    body = zstandard.ZstdCompressor().compress(make_tar(files))
+    responses = await post_archive(client, body)
+    assert responses == [Response(stdout='hello', stderr='', exit_code=0)]
+
+
+async def test_path_traversal(client: AsyncClient) -> None:
+    body = make_tar({'../evil.txt': b'evil', **manifest([Command(command='/bin/true')])})
+    responses = await post_archive(client, body)
+    assert len(responses) == 1
+    assert responses[0].exit_code == -1
+    assert responses[0].stderr is not None
+    assert 'Invalid file path' in responses[0].stderr
+
+
+async def test_invalid_commands(client: AsyncClient) -> None:
+    [resp] = await post_archive(client, make_tar({MANIFEST: b'[{"stdin": 1}]'}))
+    assert resp.exit_code == -1
+    assert resp.stderr is not None
+    assert resp.stderr.startswith(f'Invalid {MANIFEST}')
+
+    [resp] = await post_archive(client, make_tar({'main.py': b''}))
+    assert resp.stderr == f'Missing {MANIFEST} with the commands in the archive'
+
+
+def test_links_are_rejected(tmp_path: Path) -> None:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        info = tarfile.TarInfo('passwd')
+        info.type = tarfile.SYMTYPE
+        info.linkname = '/etc/passwd'
+        archive.addfile(info)
+    buffer.seek(0)
+    with pytest.raises(ArchiveError, match='Unsupported archive member type'):
+        extract(buffer, tmp_path)
+
+
+def test_size_limit(tmp_path: Path) -> None:
+    body = make_tar({'a.txt': b'a' * 100, 'b.txt': b'b' * 100}, 'w:gz')
+    with pytest.raises(ArchiveError, match='exceeds 150 bytes'):
+        extract(io.BytesIO(body), tmp_path, max_size=150)
+    extract(io.BytesIO(body), tmp_path, max_size=200)
+    assert (tmp_path / 'b.txt').read_bytes() == b'b' * 100
+
+
+def test_invalid_archive(tmp_path: Path) -> None:
+    with pytest.raises(ArchiveError, match='Invalid archive'):
+        extract(io.BytesIO(b'not an archive' * 100), tmp_path)
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+from httpx import AsyncClient
+from pydantic import TypeAdapter
+from pytest import MonkeyPatch, fixture
+
+from codebox import codebox
+from codebox.batch import iter_batch
+from codebox.codebox import execute_insecure
+from codebox.models import Command, ProjectCore, Response
+
+list_responses = TypeAdapter(list[list[Response]])
+
+
+def sleep_project(seconds: float) -> dict:
+    return ProjectCore(
+        sources={},
+        commands=[Command(command=f'/bin/sh -c "sleep {seconds}; echo {seconds}"', timeout=2)],
+    ).model_dump()
+
+
+@fixture(autouse=True)
+def parallel(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(codebox, 'execution_slots', asyncio.Semaphore(4))
+    monkeypatch.setattr(codebox.config, 'BATCH_FAN_OUT', 4)
+
+
+async def test_execute_batch(client: AsyncClient) -> None:
+    projects = [sleep_project(0.2), sleep_project(0), {'sources': {}, 'commands': []}]
+    resp = await client.post('/execute_insecure_batch', json=projects)
+    assert resp.status_code == 200
+    assert list_responses.validate_python(resp.json()) == [
+        [Response(stdout='0.2\n')],
+        [Response(stdout='0\n')],
+        [],
+    ]
+
+
+async def test_execute_batch_stream(client: AsyncClient) -> None:
+    projects = [sleep_project(0.2), sleep_project(0)]
+    resp = await client.post('/execute_insecure_batch?stream=true', json=projects)
+    assert resp.status_code == 200
+    events = [
+        json.loads(event.split('\n')[1][len('data: ') :])
+        for event in resp.text.split('\n\n')
+        if event
+    ]
+    # results come as soon as they finish
+    assert [event['project'] for event in events] == [1, 0]
+    assert Response(**events[0]['responses'][0]) == Response(stdout='0\n')
+
+
+async def test_batch_closed_early() -> None:
+    tasks = asyncio.all_tasks()
+    projects = [
+        ProjectCore(sources={}, commands=[Command(command=f'/bin/sleep {seconds}', timeout=10)])
+        for seconds in (0, 5)
+    ]
+    results = iter_batch(projects, execute_insecure)
+    async with aclosing(results):
+        async for index, _ in results:
+            assert index == 0
+            break
+    # the project still running was cancelled and awaited
+    assert asyncio.all_tasks() - tasks == set()
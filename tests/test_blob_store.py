@@ -0,0 +1,143 @@
+import hashlib
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+from httpx import AsyncClient
+from pytest import raises
+
+from codebox.blob_store import BlobStore, MissingBlobs
+from codebox.codebox import execute_insecure
+from codebox.models import Blob, Command, Response
+
+DATA = b'id,value\n' + b''.join(b'%d,%d\n' % (i, i * i) for i in range(10_000))
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+async def chunks(data: bytes, size: int = 4096) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+async def test_blob_upload_and_use(client: AsyncClient) -> None:
+    project = {
+        'sources': {},
+        'commands': [{'command': '/usr/bin/sha256sum data/values.csv'}],
+        'blobs': {'data/values.csv': DIGEST},
+    }
+    resp = await client.post('/blobs/missing', json=[DIGEST])
+    assert resp.json() == [DIGEST]
+    resp = await client.post('/execute_insecure', json=project)
+    assert resp.status_code == 409
+    assert resp.json()['detail']['missing'] == [DIGEST]
+
+    resp = await client.put(f'/blobs/{DIGEST}', content=DATA)
+    assert resp.status_code == 201
+    assert Blob(**resp.json()) == Blob(sha256=DIGEST, size=len(DATA))
+
+    resp = await client.put(f'/blobs/{DIGEST}', content=DATA)
+    assert resp.status_code == 200
+    resp = await client.post('/blobs/missing', json=[DIGEST])
+    assert resp.json() == []
+
+    resp = await client.post('/execute_insecure', json=project)
+    assert resp.status_code == 200
+    assert [Response(**r) for r in resp.json()] == [Response(stdout=f'{DIGEST}  data/values.csv\n')]
+
+
+async def test_digest_mismatch(client: AsyncClient) -> None:
+    resp = await client.put(f'/blobs/{"0" * 64}', content=b'not zeros')
+    assert resp.status_code == 400
+    resp = await client.put('/blobs/not-a-digest', content=b'')
+    assert resp.status_code == 422
+
+
+async def test_provide(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / 'store', max_size=1_000_000, max_blob_size=1_000_000)
+    store.start()
+    assert await store.put(DIGEST, chunks(DATA)) == (len(DATA), True)
+    sandbox = tmp_path / 'sandbox'
+    sandbox.mkdir()
+    async with store.provide({'a/values.csv': DIGEST, 'b.csv': DIGEST}, sandbox):
+        for name in ('a/values.csv', 'b.csv'):
+            path = sandbox / name
+            assert path.read_bytes() == DATA
+            assert path.stat().st_mode & 0o777 == 0o444
+            # a bind mount is the stored file itself, read-only
+            same_file = path.stat().st_ino == (store.store_dir / DIGEST).stat().st_ino
+            assert same_file == store.mount_supported
+    assert store.mounts == (2 if store.mount_supported else 0)
+    if store.mount_supported:  # only the empty mount points are left
+        assert (sandbox / 'b.csv').stat().st_size == 0
+
+    try:
+        async with store.provide({'c.csv': 'f' * 64}, sandbox):
+            pass
+    except MissingBlobs as error:
+        assert error.digests == ['f' * 64]
+    else:
+        raise AssertionError('MissingBlobs not raised')
+
+
+async def test_copy_without_mounts(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / 'store', max_size=1_000_000, max_blob_size=1_000_000)
+    store.start()
+    store.mount_supported = False
+    await store.put(DIGEST, chunks(DATA))
+    sandbox = tmp_path / 'sandbox'
+    sandbox.mkdir()
+    async with store.provide({'values.csv': DIGEST}, sandbox):
+        path = sandbox / 'values.csv'
+        assert path.read_bytes() == DATA
+        assert path.stat().st_mode & 0o777 == 0o444
+        # never a hard link, which commands could write through
+        assert path.stat().st_ino != (store.store_dir / DIGEST).stat().st_ino
+    assert store.mounts == 0
+
+
+async def test_blob_not_altered(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / 'store', max_size=1_000_000, max_blob_size=1_000_000)
+    store.start()
+    await store.put(DIGEST, chunks(DATA))
+    # on the file system of the store, where a hard link would be possible
+    sandbox = tmp_path / 'sandbox'
+    sandbox.mkdir()
+    tamper = 'chmod u+w values.csv && echo tampered > values.csv'
+    async with store.provide({'values.csv': DIGEST}, sandbox):
+        await execute_insecure(Command(command=f'/bin/sh -c "{tamper}"'), sandbox)
+    assert (store.store_dir / DIGEST).read_bytes() == DATA
+
+
+async def test_blobs_in_use_are_not_evicted(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / 'store', max_size=15, max_blob_size=10)
+    store.start()
+    blobs = [bytes([i]) * 10 for i in range(2)]
+    digests = [hashlib.sha256(blob).hexdigest() for blob in blobs]
+    await store.put(digests[0], chunks(blobs[0]))
+    async with store.provide({'a': digests[0]}, tmp_path / 'sandbox'):
+        await store.put(digests[1], chunks(blobs[1]))
+        assert store.missing(digests) == []
+        assert store.size == 20
+    assert store.evictions == 0
+
+
+async def test_lru_eviction(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / 'store', max_size=25, max_blob_size=10)
+    store.start()
+    blobs = [bytes([i]) * 10 for i in range(3)]
+    digests = [hashlib.sha256(blob).hexdigest() for blob in blobs]
+    await store.put(digests[0], chunks(blobs[0]))
+    await store.put(digests[1], chunks(blobs[1]))
+    async with store.provide({'a': digests[0]}, tmp_path / 'sandbox'):
+        pass  # the second blob is the least recently used
+    await store.put(digests[2], chunks(blobs[2]))
+    assert store.missing(digests) == [digests[1]]
+    assert not (tmp_path / 'store' / digests[1]).exists()
+    assert store.size == 20
+    assert store.evictions == 1
+
+
+def test_start_only_empties_own_dir(tmp_path: Path) -> None:
+    (tmp_path / 'shared.txt').write_text('not ours')
+    with raises(RuntimeError, match='not created by codebox'):
+        BlobStore(tmp_path, max_size=100, max_blob_size=10).start()
+    assert (tmp_path / 'shared.txt').exists()
@@ -0,0 +1,86 @@
+import asyncio
+from pathlib import Path
+
+from pytest import MonkeyPatch, raises
+
+from codebox.build_cache import BuildCache, build_key, snapshot
+from codebox.codebox import execute_insecure
+from codebox.datasets import dataset_registry
+from codebox.models import Command
+from codebox.sandbox import SandboxPool
+
+code = """\
+fn main() {
+    println!("Hello World!");
+}
+"""
+
+
+async def test_build_cache(tmp_path: Path) -> None:
+    cache = BuildCache(tmp_path / 'cache', max_size=100_000_000)
+    cache.start()
+    pool = SandboxPool(size=0, cleanup_high_water=0)
+    compile_ = Command(command='rustc code.rs', timeout=10)
+    run = Command(command='./code')
+
+    async def compile_and_run() -> tuple[str | None, str | None]:
+        async with pool.sandbox() as sandbox:
+            (sandbox / 'code.rs').write_text(code)
+            compiled = await cache.execute(compile_, sandbox, execute_insecure)
+            assert compiled.exit_code == 0
+            return compiled.stderr, (await execute_insecure(run, sandbox)).stdout
+
+    # concurrent identical compilations run only once
+    results = await asyncio.gather(compile_and_run(), compile_and_run())
+    assert results == [('', 'Hello World!\n')] * 2
+    assert cache.stats() == {
+        'entries': 1,
+        'size': cache.size,
+        'hits': 1,
+        'misses': 1,
+    }
+    assert cache.size > 0
+
+    assert await compile_and_run() == ('', 'Hello World!\n')
+    assert cache.hits == 2
+
+    # outputs bigger than the maximum size are not stored
+    cache.max_size = 0
+    async with pool.sandbox() as sandbox:
+        (sandbox / 'code.rs').write_text(code.replace('World', 'Mundo'))
+        await cache.execute(compile_, sandbox, execute_insecure)
+    assert cache.stats()['entries'] == 1
+    assert cache.misses == 2
+
+
+def test_datasets_keyed_by_fingerprint(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(dataset_registry, 'datasets_dir', tmp_path / 'registry')
+    (tmp_path / 'registry' / 'big').mkdir(parents=True)
+    (tmp_path / 'registry' / 'big' / 'data.bin').write_bytes(b'1' * 1000)
+    sandbox = tmp_path / 'sandbox'
+    (sandbox / 'datasets' / 'big').mkdir(parents=True)
+    (sandbox / 'datasets' / 'big' / 'data.bin').write_bytes(b'1' * 1000)
+    (sandbox / 'code.rs').write_text(code)
+    assert list(snapshot(sandbox)) == ['code.rs']
+
+    key = build_key(['rustc', 'code.rs'], None, '1.0', sandbox)
+    # the copy in the sandbox is not read
+    (sandbox / 'datasets' / 'big' / 'data.bin').write_bytes(b'2' * 1000)
+    assert build_key(['rustc', 'code.rs'], None, '1.0', sandbox) == key
+    # but a new version of the dataset is another build
+    (tmp_path / 'registry' / 'big' / 'data.bin').write_bytes(b'2' * 1001)
+    assert build_key(['rustc', 'code.rs'], None, '1.0', sandbox) != key
+
+
+def test_start_only_empties_own_dir(tmp_path: Path) -> None:
+    (tmp_path / 'shared.txt').write_text('not ours')
+    cache = BuildCache(tmp_path, max_size=100)
+    with raises(RuntimeError, match='not created by codebox'):
+        cache.start()
+    assert (tmp_path / 'shared.txt').exists()
+
+    cache = BuildCache(tmp_path / 'cache', max_size=100)
+    cache.start()
+    (tmp_path / 'cache' / 'entry').mkdir()
+    cache.start()
+    assert [path.name for path in (tmp_path / 'cache').iterdir()] == ['.codebox']
@@ -0,0 +1,21 @@
+from pytest import skip
+
+from codebox.nsjail import cgroup
+from codebox.nsjail.nsjail import cgroup_version
+
+
+def test_accounting_cgroup() -> None:
+    version = cgroup_version()
+    accounting = cgroup.create_accounting(version)
+    if accounting is None:
+        skip('cgroups are not writable')
+    name, arguments = accounting
+    paths = cgroup.accounting_paths(version, name)
+    assert all(path.is_dir() for path in paths)
+    assert any(name in argument for argument in arguments)
+
+    usage = cgroup.read_usage(version, name)
+    assert usage['peak_memory'] in (0, None)  # memory.peak needs a recent kernel
+
+    cgroup.remove_accounting(version, name)
+    assert not any(path.exists() for path in paths)
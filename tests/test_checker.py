@@ -0,0 +1,67 @@
+import hashlib
+
+from codebox.checker import OutputChecker
+from codebox.codebox import _execute
+from codebox.models import Check, Expected
+
+OUTPUT = b'3 1.0000001\n' + b''.join(b'%d\n' % i for i in range(1000))
+
+
+def check(expected: Expected, output: bytes, chunk_size: int = 7) -> Check:
+    checker = OutputChecker(expected)
+    for start in range(0, len(output), chunk_size):
+        checker.feed(output[start : start + chunk_size])
+    return checker.result()
+
+
+def test_exact() -> None:
+    result = check(Expected(output=OUTPUT.decode()), OUTPUT)
+    assert result == Check(verdict='accepted', sha256=hashlib.sha256(OUTPUT).hexdigest())
+
+    output = OUTPUT.replace(b'\n500\n', b'\n5OO\n')
+    result = check(Expected(output=OUTPUT.decode()), output)
+    assert result.verdict == 'wrong_answer'
+    assert result.sha256 == hashlib.sha256(output).hexdigest()
+    assert result.difference.startswith("line 502, byte 1904: after '")
+    assert "expected '00\\n501\\n" in result.difference
+    assert "got 'OO\\n501\\n" in result.difference
+
+    result = check(Expected(output='abc'), b'ab')
+    assert result.difference == "line 1, byte 3: after 'ab', expected 'c', got end of output"
+    result = check(Expected(output='ab'), b'abc')
+    assert result.difference == "line 1, byte 3: after 'ab', expected end of output, got 'c'"
+
+
+def test_whitespace() -> None:
+    expected = Expected(output='1 2\n3\n', mode='whitespace')
+    assert check(expected, b'1\t2 3', chunk_size=1).verdict == 'accepted'
+    assert check(expected, b'1 23').difference == "token 2: expected '2', got '23'"
+    assert check(expected, b'1 2').difference == "token 3: expected '3', got end of output"
+    assert check(expected, b'1 2 3 4').difference == "token 4: expected end of output, got '4'"
+    assert check(expected, b'1 2 ' + b'3' * 1000).difference.startswith('token 3: got too long')
+
+
+def test_float() -> None:
+    expected = Expected(output='3 1.0\nabc', mode='float', tolerance=1e-6)
+    assert check(expected, b'3.0000000001 1.0000001 abc').verdict == 'accepted'
+    assert check(expected, b'3 1.01 abc').difference == "token 2: expected '1.0', got '1.01'"
+    assert check(expected, b'3 1.0 abd').difference == "token 3: expected 'abc', got 'abd'"
+
+
+def test_sha256() -> None:
+    expected = Expected(output=hashlib.sha256(OUTPUT).hexdigest().upper(), mode='sha256')
+    assert check(expected, OUTPUT).verdict == 'accepted'
+    assert check(expected, OUTPUT + b'\n').verdict == 'wrong_answer'
+
+
+async def test_execute_check() -> None:
+    code = 'for i in range(100_000): print(i)'
+    expected = '\n'.join(map(str, range(100_000))) + '\n'
+    resp = await _execute(
+        ['python', '-c', code], stdin=None, timeout=5, expected=Expected(output=expected)
+    )
+    assert resp.stdout == ''
+    assert resp.stdout_size == len(expected)
+    assert resp.check == Check(
+        verdict='accepted', sha256=hashlib.sha256(expected.encode()).hexdigest()
+    )
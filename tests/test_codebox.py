@@ -0,0 +1,174 @@
+import asyncio
+import os
+import signal
+from asyncio.subprocess import PIPE, Process
+from contextlib import suppress
+from pathlib import Path
+
+from pydantic import ValidationError
+from pytest import MonkeyPatch
+
+from codebox import codebox
+from codebox.codebox import _execute, command_ancestors, execute, execute_insecure, run_project
+from codebox.models import Command, ProjectCore, Response, Termination
+from codebox.nsjail.nsjail import parse_termination
+
+
+async def test_execute_stdin() -> None:
+    resp = await _execute(['/bin/cat'], stdin='Olá\nAçúcar')
+    assert resp == Response(stdout='Olá\nAçúcar', stderr='', exit_code=0)
+
+
+async def test_execute_timeout() -> None:
+    resp = await _execute(['/bin/sleep', '1'], stdin=None, timeout=0.1)
+    assert resp == Response(stdout='', stderr='Timeout Error. Exceeded 0.1s', exit_code=-1)
+    assert resp.elapsed_time < 0.5
+    assert resp.termination == Termination(reason='timeout')
+
+
+async def test_execute_termination() -> None:
+    resp = await _execute(['/bin/sh', '-c', 'exit 3'], stdin=None)
+    assert resp.exit_code == 3
+    assert resp.termination == Termination(reason='exited')
+    resp = await _execute(['/bin/sh', '-c', 'kill -9 $$'], stdin=None)
+    assert resp.termination == Termination(reason='signal', signal=9)
+
+
+async def test_execute_invalid_command() -> None:
+    resp = await _execute(['/bin/does_not_exist'], stdin=None)
+    assert resp.exit_code == -1
+    assert resp.stderr is not None
+    assert 'No such file or directory' in resp.stderr
+    assert resp.termination is None
+
+
+async def test_execute_cancelled() -> None:
+    processes = []
+
+    async def spawn(arguments: list[str], cwd: Path | None) -> Process:
+        process = await asyncio.create_subprocess_exec(
+            *arguments, stdin=PIPE, stdout=PIPE, stderr=PIPE, cwd=cwd
+        )
+        processes.append(process)
+        return process
+
+    task = asyncio.create_task(
+        _execute(['/bin/sleep', '7.77'], stdin=None, timeout=10, spawn=spawn)
+    )
+    while not processes:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    assert processes[0].returncode == -signal.SIGKILL
+    try:
+        os.kill(processes[0].pid, 0)
+    except ProcessLookupError:
+        pass
+    else:
+        raise AssertionError('the process is still running')
+
+
+async def test_execution_slots(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(codebox, 'execution_slots', asyncio.Semaphore(1))
+    responses = await asyncio.gather(
+        *(_execute(['/bin/sleep', '0.1'], stdin=None, timeout=1) for _ in range(3))
+    )
+    assert all(resp.exit_code == 0 for resp in responses)
+    queue_times = sorted(resp.queue_time for resp in responses)
+    assert queue_times[0] < 0.05
+    assert queue_times[-1] >= 0.15
+
+
+async def test_execute_output_limit() -> None:
+    code = 'import sys; sys.stdout.write("x" * 1_000_000); sys.stderr.write("error")'
+    resp = await _execute(['python', '-c', code], stdin=None, timeout=5, output_limit=10)
+    assert resp == Response(stdout='x' * 10, stderr='error', exit_code=0)
+    assert resp.stdout_size == 1_000_000
+    assert resp.stdout_truncated
+    assert resp.stderr_size == 5
+    assert not resp.stderr_truncated
+
+
+async def test_project_output_limit(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(codebox.config, 'COMMAND_OUTPUT_LIMIT', 4)
+    monkeypatch.setattr(codebox.config, 'PROJECT_OUTPUT_LIMIT', 10)
+    command = Command(command='/bin/echo 123456')
+    responses = await run_project({}, [command] * 4, exec_func=execute_insecure)
+    assert [resp.stdout for resp in responses] == ['1234', '1234', '12', '']
+    assert all(resp.stdout_size == 7 and resp.stdout_truncated for resp in responses)
+
+
+def test_parse_termination() -> None:
+    log = [
+        '[I][2024-05-02T10:00:00+0000] Mode: STANDALONE_ONCE',
+        '[I][2024-05-02T10:00:01+0000] pid=12 run time >= time limit (1 >= 1) (...). Killing it',
+        '[I][2024-05-02T10:00:01+0000] pid=12 ([STANDALONE MODE]) terminated with signal: '
+        'SIGKILL (9), (PIDs left: 0)',
+    ]
+    assert parse_termination(log) == Termination(reason='timeout')
+    assert parse_termination(log[2:]) == Termination(reason='signal', signal=9)
+    exited = '[I][2024-05-02T10:00:01+0000] pid=12 ([STANDALONE MODE]) exited with status: 1, '
+    assert parse_termination([exited + '(PIDs left: 0)']) == Termination(reason='exited')
+    assert parse_termination([]) is None
+
+
+async def test_nsjail_log_pipe(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    """
+    The log is read from the file descriptor passed to NsJail in --log_fd.
+    """
+    nsjail = tmp_path / 'nsjail'
+    nsjail.write_text(
+        '#!/bin/bash\n'
+        'while [ "$1" != --log_fd ]; do shift; done\n'
+        'echo "[I][2024-05-02T10:00:00+0000] pid=7 ([STANDALONE MODE]) '
+        'terminated with signal: SIGSEGV (11), (PIDs left: 0)" >&"$2"\n'
+        'exit 139\n'
+    )
+    nsjail.chmod(0o755)
+    monkeypatch.setattr(codebox.config, 'NSJAIL_PATH', str(nsjail))
+    resp = await execute(Command(command='./crash'), tmp_path)
+    assert resp.exit_code == 139
+    assert resp.termination == Termination(reason='signal', signal=11)
+
+
+async def test_parallel_output_limit(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(codebox.config, 'COMMAND_OUTPUT_LIMIT', 4)
+    monkeypatch.setattr(codebox.config, 'PROJECT_OUTPUT_LIMIT', 8)
+    # both streams of the first command take the whole project limit
+    command = Command(command='/bin/sh -c "echo 123456; echo 123456 >&2"', depends_on=[])
+    responses = await run_project({}, [command] * 2, exec_func=execute_insecure)
+    assert [(resp.stdout, resp.stderr) for resp in responses] == [('1234', '1234'), ('', '')]
+
+
+async def test_command_dependencies(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(codebox, 'execution_slots', asyncio.Semaphore(3))
+    commands = [
+        Command(command='/bin/sh -c "sleep 0.3; echo a > a.txt; echo a"', timeout=1),
+        Command(command='/bin/sh -c "sleep 0.2; echo b > b.txt; echo b"', timeout=1, depends_on=[]),
+        Command(command='/bin/cat a.txt b.txt', depends_on=[0, 1]),
+        Command(command='/bin/echo c'),  # after the previous command
+    ]
+    start_time = asyncio.get_running_loop().time()
+    responses = await run_project({}, commands, exec_func=execute_insecure)
+    elapsed = asyncio.get_running_loop().time() - start_time
+    assert [resp.stdout for resp in responses] == ['a\n', 'b\n', 'a\nb\n', 'c\n']
+    assert elapsed < 0.5  # the first two commands ran at the same time
+
+
+def test_command_ancestors() -> None:
+    commands = [
+        Command(command='make'),
+        Command(command='./test 1', depends_on=[0]),
+        Command(command='./test 2', depends_on=[0]),
+        Command(command='lint', depends_on=[]),
+        Command(command='report', depends_on=[2, 3]),
+        Command(command='clean'),  # after the previous command
+    ]
+    assert command_ancestors(commands) == [set(), {0}, {0}, set(), {0, 2, 3}, {0, 2, 3, 4}]
+    try:
+        ProjectCore(sources={}, commands=[Command(command='ls', depends_on=[0])])
+    except ValidationError as error:
+        assert 'can only depend on earlier commands' in str(error)
+    else:
+        raise AssertionError('ValidationError not raised')
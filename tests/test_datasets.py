@@ -0,0 +1,85 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+from httpx import AsyncClient
+from pytest import MonkeyPatch, fixture
+
+from codebox.datasets import DatasetRegistry, dataset_registry
+from codebox.models import Response
+
+INSERT = """
+import sqlite3, sys
+db = sqlite3.connect(sys.argv[1])
+db.execute("insert into building values (2, 'Plazza')")
+db.commit()
+print(db.execute('select count(*) from building').fetchone()[0])
+"""
+
+
+@fixture
+def datasets_dir(tmp_path: Path) -> Path:
+    datasets_dir = tmp_path / 'datasets'
+    (datasets_dir / 'catalog').mkdir(parents=True)
+    (datasets_dir / 'catalog' / 'items.csv').write_text('id,name\n1,chair\n')
+    with sqlite3.connect(datasets_dir / 'shop.db') as db:
+        db.execute('create table building (id smallint primary key, name varchar(30))')
+        db.execute("insert into building values (1, 'Hilton')")
+    return datasets_dir
+
+
+def count_buildings(path: Path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute('select count(*) from building').fetchone()[0]
+
+
+async def test_datasets(client: AsyncClient, datasets_dir: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(dataset_registry, 'datasets_dir', datasets_dir)
+    project = {
+        'sources': {'insert.py': INSERT},
+        'commands': [
+            {'command': 'cat datasets/catalog/items.csv'},
+            {'command': '/bin/sh -c "echo 2,table >> datasets/catalog/items.csv"'},
+            {'command': f'{sys.executable} insert.py datasets/shop.db'},
+        ],
+        'datasets': {'catalog': 'read_only', 'shop.db': 'copy_on_write'},
+    }
+    resp = await client.post('/execute_insecure', json=project)
+    cat, append, insert = [Response(**r) for r in resp.json()]
+    assert cat.stdout == 'id,name\n1,chair\n'
+    assert append.exit_code != 0
+    assert insert.stdout == '2\n'
+    # the datasets are unchanged and nothing is left mounted
+    assert (datasets_dir / 'catalog' / 'items.csv').read_text() == 'id,name\n1,chair\n'
+    assert count_buildings(datasets_dir / 'shop.db') == 1
+    assert '/datasets/catalog' not in Path('/proc/self/mounts').read_text()
+
+    project['datasets'] = {'missing': 'read_only'}
+    resp = await client.post('/execute_insecure', json=project)
+    [error] = [Response(**r) for r in resp.json()]
+    assert error.exit_code == -1
+    assert error.stderr == 'unknown dataset: missing'
+
+
+async def test_copy_without_mounts(datasets_dir: Path, tmp_path: Path) -> None:
+    registry = DatasetRegistry(datasets_dir)
+    registry.mount_supported = False
+    sandbox = tmp_path / 'sandbox'
+    sandbox.mkdir()
+    async with registry.provide({'catalog': 'read_only', 'shop.db': 'copy_on_write'}, sandbox):
+        items = sandbox / 'datasets' / 'catalog' / 'items.csv'
+        assert items.read_text() == 'id,name\n1,chair\n'
+        assert items.stat().st_mode & 0o777 == 0o444
+        assert (sandbox / 'datasets' / 'shop.db').stat().st_mode & 0o777 == 0o666
+        assert count_buildings(sandbox / 'datasets' / 'shop.db') == 1
+    assert registry.mounts == 0
+    assert registry.clones + registry.copies == 2
+
+
+def test_fingerprint(datasets_dir: Path) -> None:
+    registry = DatasetRegistry(datasets_dir)
+    fingerprints = registry.fingerprints(['catalog', 'shop.db', 'missing'])
+    assert fingerprints['missing'] is None
+    (datasets_dir / 'catalog' / 'items.csv').write_text('id,name\n1,chair\n2,table\n')
+    assert registry.fingerprint('catalog') != fingerprints['catalog']
+    assert registry.fingerprint('shop.db') == fingerprints['shop.db']
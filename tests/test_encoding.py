@@ -0,0 +1,38 @@
+import json
+
+from httpx import AsyncClient
+
+from codebox.encoding import accepted_encodings, choose_encoding, dumps
+from codebox.models import Response, Termination
+
+
+def test_accepted_encodings() -> None:
+    assert accepted_encodings('') == set()
+    assert accepted_encodings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert accepted_encodings('GZIP;q=0.5, zstd;q=0, br;q=x') == {'gzip'}
+    assert choose_encoding('identity') is None
+    assert choose_encoding('deflate, gzip;q=0.1') == 'gzip'
+
+
+def test_dumps() -> None:
+    responses = [Response(stdout='Olá', termination=Termination(reason='exited'))]
+    assert json.loads(dumps(responses)) == [json.loads(responses[0].model_dump_json())]
+
+
+async def test_compression(client: AsyncClient) -> None:
+    project = {'sources': {}, 'commands': [{'command': 'python -c "print(100_000 * \'x\')"'}]}
+    resp = await client.post('/execute_insecure', json=project, headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['content-encoding'] == 'gzip'
+    assert int(resp.headers['content-length']) < 2_000
+    assert [Response(**r) for r in resp.json()] == [Response(stdout='x' * 100_000 + '\n')]
+
+    resp = await client.post(
+        '/execute_insecure', json=project, headers={'Accept-Encoding': 'identity'}
+    )
+    assert 'content-encoding' not in resp.headers
+    assert resp.headers['vary'] == 'Accept-Encoding'
+
+    project['commands'] = [{'command': '/bin/echo small'}]
+    resp = await client.post('/execute_insecure', json=project, headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in resp.headers
+    assert [Response(**r) for r in resp.json()] == [Response(stdout='small\n')]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from pytest import MonkeyPatch
+
+from codebox.codebox import execute_insecure
+from codebox.jobs import JobQueue, QueueFull, job_queue
+from codebox.models import Command, Job, ProjectCore, Response
+
+
+def echo_project(text: str) -> ProjectCore:
+    return ProjectCore(sources={}, commands=[Command(command=f'/bin/echo {text}', timeout=1)])
+
+
+async def test_job(client: AsyncClient) -> None:
+    resp = await client.post('/jobs_insecure', json=echo_project('hello').model_dump())
+    assert resp.status_code == 202
+    job = Job(**resp.json())
+    assert job.status in ('queued', 'running')
+
+    for _ in range(100):
+        job = Job(**(await client.get(f'/jobs/{job.id}')).json())
+        if job.status == 'done':
+            break
+        await asyncio.sleep(0.01)
+    assert job.status == 'done'
+    assert job.responses == [Response(stdout='hello\n')]
+
+
+async def test_job_not_found(client: AsyncClient) -> None:
+    resp = await client.get('/jobs/unknown')
+    assert resp.status_code == 404
+
+
+async def test_queue_full(client: AsyncClient, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(job_queue, 'max_depth', 0)
+    resp = await client.post('/jobs', json=echo_project('hello').model_dump())
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) >= 1
+
+
+def test_priority_and_position() -> None:
+    queue = JobQueue(max_depth=3, workers=2, result_ttl=60, max_finished=10)
+    queue.average_duration = 2
+    low = queue.submit(echo_project('low'))
+    high = queue.submit(echo_project('high'), priority=10)
+    other = queue.submit(echo_project('other'))
+    with pytest.raises(QueueFull):
+        queue.submit(echo_project('full'))
+
+    assert high.position == 0
+    assert queue.get(low.id).position == 1  # type: ignore[union-attr]
+    assert queue.get(other.id).position == 2  # type: ignore[union-attr]
+    assert queue.get(other.id).estimated_wait == 3  # type: ignore[union-attr]
+    assert queue.stats() == {'queued': 3, 'running': 0, 'finished': 0, 'rejected': 1}
+
+
+async def test_finished_jobs_are_bounded() -> None:
+    queue = JobQueue(max_depth=10, workers=1, result_ttl=60, max_finished=2)
+    jobs = [queue.submit(echo_project(str(i)), exec_func=execute_insecure) for i in range(3)]
+    await queue.start()
+    try:
+        for _ in range(100):
+            if queue.stats()['queued'] == queue.stats()['running'] == 0:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+    # the oldest finished job was evicted, and the others keep no project
+    assert queue.get(jobs[0].id) is None
+    assert [queue.get(job.id).status for job in jobs[1:]] == ['done', 'done']  # type: ignore[union-attr]
+    assert all(state.project is None for state in queue._finished.values())
@@ -0,0 +1,90 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from httpx import AsyncClient
+from pytest import MonkeyPatch
+
+from codebox import codebox, judge
+from codebox.codebox import execute_insecure
+from codebox.models import Case, Command, Expected, JudgeRequest, JudgeResult, Response
+
+SQUARE = """\
+import sys
+n = int(sys.stdin.read())
+if n < 0:
+    sys.exit('negative')
+print(n * n)
+"""
+
+
+async def test_judge(client: AsyncClient) -> None:
+    request = JudgeRequest(
+        sources={'square.py': SQUARE, 'inputs/3.txt': '3'},
+        commands=[Command(command=f'{sys.executable} -m py_compile square.py', timeout=5)],
+        command=Command(command=f'{sys.executable} square.py', timeout=5),
+        cases=[Case(stdin='2'), Case(stdin_file='inputs/3.txt'), Case(stdin='-1')],
+    )
+    resp = await client.post('/judge_insecure', json=request.model_dump())
+    result = JudgeResult(**resp.json())
+    assert result.responses == [Response()]
+    assert result.cases == [
+        Response(stdout='4\n'),
+        Response(stdout='9\n'),
+        Response(stderr='negative\n', exit_code=1),
+    ]
+
+    # the cases don't run if the preparation fails
+    request.sources = {}
+    resp = await client.post('/judge_insecure', json=request.model_dump())
+    result = JudgeResult(**resp.json())
+    assert result.responses[0].exit_code == 1
+    assert result.cases == [None, None, None]
+
+
+async def test_parallel_cases(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(codebox, 'execution_slots', asyncio.Semaphore(4))
+    monkeypatch.setattr(judge.config, 'PROJECT_PARALLELISM', 4)
+    command = Command(command='/bin/sh -c "sleep 0.2; cat"', timeout=1)
+    start_time = asyncio.get_running_loop().time()
+    cases = [Case(stdin=str(i)) for i in range(4)]
+    responses = await judge.run_cases(command, cases, tmp_path, execute_insecure)
+    elapsed = asyncio.get_running_loop().time() - start_time
+    assert responses == [Response(stdout=str(i)) for i in range(4)]
+    assert elapsed < 0.6
+
+
+async def test_cases_share_output_limit(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(judge.config, 'PROJECT_OUTPUT_LIMIT', 40)
+    command = Command(command='/bin/sh -c "tee /dev/stderr"')
+    cases = [Case(stdin='x' * 20), Case(stdin='y' * 20)]
+    responses = await judge.run_cases(command, cases, tmp_path, execute_insecure)
+    for resp, char in zip(responses, 'xy', strict=True):
+        assert resp is not None
+        assert resp.stdout == resp.stderr == char * 10
+        assert resp.stdout_truncated and resp.stderr_truncated
+
+
+async def test_stop_on_failure(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(judge.config, 'PROJECT_PARALLELISM', 1)
+    command = Command(command='/bin/sh -c "read n; exit $n"')
+    cases = [Case(stdin='0'), Case(stdin='2'), Case(stdin='0'), Case(stdin_file='../escape')]
+    responses = await judge.run_cases(
+        command, cases, tmp_path, execute_insecure, stop_on_failure=True
+    )
+    assert responses == [Response(), Response(exit_code=2), None, None]
+    responses = await judge.run_cases(command, cases, tmp_path, execute_insecure)
+    assert responses[2] == Response()
+    assert responses[3] is not None and 'Invalid file path' in (responses[3].stderr or '')
+
+    # a wrong answer is a failure even if the command succeeds
+    command = Command(command='/bin/cat', expected=Expected(output='a'))
+    cases = [Case(stdin='a'), Case(stdin='b'), Case(stdin='a')]
+    responses = await judge.run_cases(
+        command, cases, tmp_path, execute_insecure, stop_on_failure=True
+    )
+    assert [resp and resp.check and resp.check.verdict for resp in responses] == [
+        'accepted',
+        'wrong_answer',
+        None,
+    ]
@@ -0,0 +1,33 @@
+from httpx import AsyncClient
+
+from benchmarks.load import Toolchain, compare, parse_mix, percentiles, run_load, schedule
+
+
+def test_schedule() -> None:
+    languages = schedule(parse_mix('python=3,bash=1'), 10)
+    assert len(languages) == 10
+    assert languages.count('python') == 8
+    assert languages.count('bash') == 2
+    assert languages == schedule(parse_mix('python=3,bash=1'), 10)
+
+
+def test_percentiles() -> None:
+    assert percentiles([i / 1000 for i in range(1, 101)]) == {
+        'p50': 50.5,
+        'p95': 95.05,
+        'p99': 99.01,
+    }
+    assert percentiles([0.002]) == {'p50': 2, 'p95': 2, 'p99': 2}
+
+
+async def test_run_load(client: AsyncClient) -> None:
+    languages = schedule({'bash': 1}, 6)
+    report = await run_load(client, '/execute_insecure', languages, 3, Toolchain(bash='/bin/bash'))
+    summary = report.summary()
+    assert summary['requests'] == 6
+    assert summary['throughput'] > 0
+    bash = summary['languages']['bash']
+    assert bash['requests'] == 6
+    assert bash['errors'] == 0
+    assert set(bash['phases']) == {'total', 'queue', 'setup', 'execution'}
+    assert compare(summary, summary)[1].endswith('(+0.0%)')
@@ -3,8 +3,14 @@ from collections.abc import AsyncIterable
 from unittest.mock import patch
 
 from fastapi import APIRouter, FastAPI, status
+from fastapi.responses import PlainTextResponse
 from httpx import AsyncClient
 from pytest import CaptureFixture, fixture
+from starlette.types import Receive, Scope, Send
+
+from codebox.logging import LogWriter, log_writer, shrink
+from codebox.middleware import RequestMiddleware
+from codebox.models import Response
 
 basic_log_fields = {
     'timestamp',
@@ -20,6 +26,21 @@ request_log_fields = basic_log_fields | {'protocol', 'schema', 'elapsed', 'statu
 exception_log_fields = request_log_fields | {'exception'}
 
 
+def parse_logs(text: str) -> list[dict]:
+    """
+    Split the JSON records of the log, indented or not depending on the environment.
+    """
+    decoder = json.JSONDecoder()
+    logs = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        log, position = decoder.raw_decode(text, position)
+        logs.append(log)
+        position = len(text) - len(text[position:].lstrip())
+    return logs
+
+
 @fixture(scope='module')
 async def logging_client() -> AsyncIterable[AsyncClient]:
     """
@@ -27,9 +48,8 @@ async def logging_client() -> AsyncIterable[AsyncClient]:
     """
     from codebox.logging import init_loguru
     from codebox.main import (
-        BaseHTTPMiddleware,
+        RequestMiddleware,
         RequestValidationError,
-        log_request_middleware,
         request_validation_exception_handler,
     )
 
@@ -45,7 +65,7 @@ async def logging_client() -> AsyncIterable[AsyncClient]:
 
     app = FastAPI()
     app.include_router(router)
-    app.add_middleware(BaseHTTPMiddleware, dispatch=log_request_middleware)
+    app.add_middleware(RequestMiddleware)
     app.add_exception_handler(RequestValidationError, request_validation_exception_handler)
 
     init_loguru()
@@ -60,8 +80,10 @@ async def test_json_logging(logging_client: AsyncClient, capsys: CaptureFixture)
     """
     Test that the log is in JSON format.
     """
-    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x):  # prevents highlighting
+    # prevents highlighting, which is only imported in development
+    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x, create=True):
         response = await logging_client.get('/info')
+        log_writer.flush()
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == {'data': 1234}
 
@@ -75,24 +97,23 @@ async def test_logging_422_exception(logging_client: AsyncClient, capsys: Captur
     """
     Test if the log contains the exception when the request is invalid.
     """
-    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x):  # prevents highlighting
+    # prevents highlighting, which is only imported in development
+    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x, create=True):
         response = await logging_client.get('/divide', params={'a': 1.1, 'b': 0})
+        log_writer.flush()
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
     detail = response.json()['detail']
 
     # there must be 2 log entries: 1 for the exception and 1 for the request
-    text = capsys.readouterr().err
-    position = text.index('\n}\n{\n')
+    validation_log, request_log = parse_logs(capsys.readouterr().err)
 
     # test validation log
-    validation_log = json.loads(text[: position + 2])
     assert failed_validation_log_fields <= set(validation_log.keys())
     assert 'exception' not in validation_log
     assert validation_log['level'] == 'INFO'
     assert detail == validation_log['detail']
 
     # test request_log
-    request_log = json.loads(text[position + 3 :])
     assert request_log_fields <= set(request_log.keys())
     assert request_log['level'] == 'INFO'
     assert 'exception' not in request_log
@@ -102,8 +123,10 @@ async def test_logging_500_exception(logging_client: AsyncClient, capsys: Captur
     """
     Test the log message of a unhandled exception.
     """
-    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x):  # prevents highlighting
+    # prevents highlighting, which is only imported in development
+    with patch('codebox.logging.highlight', side_effect=lambda x, y, z: x, create=True):
         response = await logging_client.get('/divide', params={'a': 1, 'b': 0})
+        log_writer.flush()
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
     assert response.text == 'Internal Server Error'
 
@@ -124,4 +147,47 @@ async def test_default_encoding(logging_client: AsyncClient, capsys: CaptureFixt
     # Path, datetime and set are non-serializable types by default
     for param in (Path('.'), datetime.now(), {1, 2}):
         logger.info('test param encoding', param=param)
+        log_writer.flush()
         assert 'TypeError:' not in capsys.readouterr().err
+
+
+def test_shrink_large_fields() -> None:
+    extra = {
+        'source_files': {'main.py': 'x' * 20},
+        'response': Response(stdout='y' * 20, stderr='', exit_code=1),
+        'request_id': 'abc',
+    }
+    sampled = shrink(extra, sampled=True, max_length=10)
+    assert sampled['source_files'] == {'main.py': 'xxxxxxxxxx... (20 characters)'}
+    assert sampled['response']['stdout'] == 'yyyyyyyyyy... (20 characters)'
+    assert sampled['response']['exit_code'] == 1
+    assert sampled['request_id'] == 'abc'
+
+    not_sampled = shrink(extra, sampled=False, max_length=10)
+    assert not_sampled['source_files'] == {'main.py': 20}
+    assert not_sampled['response']['stdout'] == 20
+    assert not_sampled['response']['stderr'] == 0
+    assert not_sampled['request_id'] == 'abc'
+
+
+def test_log_writer_drops_records_when_full(capsys: CaptureFixture) -> None:
+    writer = LogWriter(queue_size=1, batch_size=10)
+    writer._thread = object()  # type: ignore  # pretend it is started, so records stay queued
+    for message in ('first', 'second', 'third'):
+        writer(type('Message', (), {'record': {'message': message}}))
+    assert writer.dropped == 2
+    with patch('codebox.logging.serialize', side_effect=lambda record: record['message']):
+        writer._write([writer._queue.get_nowait()])
+    assert capsys.readouterr().err == 'first\nlog writer: 2 records dropped\n'
+
+
+async def test_access_log_skipped_above_info() -> None:
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await PlainTextResponse('ok')(scope, receive, send)
+
+    middleware = RequestMiddleware(app)
+    middleware.log_requests = False  # as with LOG_LEVEL=WARNING
+    with patch('codebox.middleware.access_log_data') as access_log_data:
+        async with AsyncClient(app=middleware, base_url='http://test_logging') as client:
+            assert (await client.get('/')).text == 'ok'
+    access_log_data.assert_not_called()
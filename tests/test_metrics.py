@@ -0,0 +1,72 @@
+from httpx import AsyncClient
+from pytest import raises
+
+from codebox.metrics import Counter, Histogram, Metric, command_language, registry
+from codebox.models import Command, ProjectCore
+
+
+def test_histogram() -> None:
+    histogram = Histogram('test_seconds', 'Test histogram.', ('phase',), buckets=(0.1, 1))
+    registry.remove(histogram)
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, phase='test')
+    assert histogram.render() == (
+        '# HELP test_seconds Test histogram.\n'
+        '# TYPE test_seconds histogram\n'
+        'test_seconds_bucket{phase="test",le="0.1"} 2\n'
+        'test_seconds_bucket{phase="test",le="1"} 3\n'
+        'test_seconds_bucket{phase="test",le="+Inf"} 4\n'
+        'test_seconds_sum{phase="test"} 2.65\n'
+        'test_seconds_count{phase="test"} 4\n'
+    )
+
+
+def test_counter() -> None:
+    counter = Counter('test_total', 'Test counter.')
+    registry.remove(counter)
+    counter.inc()
+    counter.inc(2)
+    assert counter.render().endswith('test_total 3\n')
+
+
+def test_metric_without_samples() -> None:
+    class Incomplete(Metric):
+        type_ = 'counter'
+
+    with raises(TypeError, match='samples'):
+        Incomplete('test_incomplete', 'Incomplete metric.')  # type: ignore[abstract]
+    assert all(metric.name != 'test_incomplete' for metric in registry)
+
+
+def test_command_language() -> None:
+    assert command_language('/venv/bin/python test.py') == 'python'
+    assert command_language('/usr/local/cargo/bin/rustc code.rs') == 'rust'
+    assert command_language('./code') == 'other'
+    assert command_language('') == 'other'
+
+
+async def test_metrics_endpoint(client: AsyncClient) -> None:
+    project = ProjectCore(sources={}, commands=[Command(command='/bin/sleep 1', timeout=0.1)])
+    await client.post('/execute_insecure', json=project.model_dump())
+
+    resp = await client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('text/plain; version=0.0.4')
+    text = resp.text
+    for phase in ('queue_wait', 'sandbox_creation', 'save_source', 'spawn', 'runtime'):
+        assert f'codebox_phase_duration_seconds_count{{phase="{phase}"}}' in text
+    assert 'codebox_executions_total{language="other"}' in text
+    assert 'codebox_timeouts_total ' in text
+    assert 'codebox_executions_in_flight 0' in text
+    assert 'codebox_component_stats{component="sandbox_pool",stat="hits"}' in text
+
+
+async def test_server_timing(client: AsyncClient) -> None:
+    project = ProjectCore(sources={}, commands=[Command(command='/bin/echo server timing')])
+    resp = await client.post('/execute_insecure', json=project.model_dump())
+    assert resp.status_code == 200
+    assert resp.headers['x-request-id']
+    metrics = {entry.split(';')[0]: entry for entry in resp.headers['server-timing'].split(', ')}
+    assert metrics.keys() >= {'validation', 'sandbox', 'exec', 'serialization', 'total'}
+    assert metrics['exec'].startswith('exec;dur=')
+    assert metrics['exec'].endswith(';desc="execution"')
@@ -0,0 +1,66 @@
+from pathlib import Path
+from time import sleep
+
+from httpx import AsyncClient
+from pytest import MonkeyPatch
+
+from codebox.codebox import execute_insecure
+from codebox.datasets import dataset_registry
+from codebox.models import Command, ProjectCore, Response
+from codebox.result_cache import ResultCache, project_key
+
+
+async def test_cached_project(client: AsyncClient) -> None:
+    project = ProjectCore(
+        sources={'test.py': 'import uuid\nprint(uuid.uuid4())'},
+        commands=[Command(command='python test.py', timeout=5)],
+        cacheable=True,
+    ).model_dump()
+
+    resp = await client.post('/execute_insecure', json=project)
+    first = Response(**resp.json()[0])
+    assert first.exit_code == 0
+    assert not first.cached
+
+    resp = await client.post('/execute_insecure', json=project)
+    second = Response(**resp.json()[0])
+    assert second == first
+    assert second.cached
+
+    # projects not declared as cacheable are always executed
+    project['cacheable'] = False
+    resp = await client.post('/execute_insecure', json=project)
+    third = Response(**resp.json()[0])
+    assert third.stdout != first.stdout
+    assert not third.cached
+
+
+def test_result_cache_eviction() -> None:
+    cache = ResultCache(max_size=350, ttl=0.1)
+    responses = [Response(stdout='x' * 50)]
+    cache.put('a', responses)
+    cache.put('b', responses)
+    assert cache.get('a') == responses
+    cache.put('c', responses)  # 'b' is the least recently used
+    assert cache.get('b') is None
+    assert cache.stats()['entries'] == 2
+
+    sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.get('c') is None
+    assert cache.size == 0
+
+
+async def test_key_follows_dataset_version(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(dataset_registry, 'datasets_dir', tmp_path)
+    (tmp_path / 'values.csv').write_text('1\n')
+    project = ProjectCore(
+        sources={},
+        commands=[Command(command='/bin/cat datasets/values.csv')],
+        datasets={'values.csv': 'read_only'},
+        cacheable=True,
+    )
+    key = await project_key(project, execute_insecure)
+    assert await project_key(project, execute_insecure) == key
+    (tmp_path / 'values.csv').write_text('1\n2\n')
+    assert await project_key(project, execute_insecure) != key
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import pytest
+
+from codebox.sandbox import SandboxPool, create_sandbox, remove_sandbox
+
+
+async def test_sandbox_pool() -> None:
+    pool = SandboxPool(size=2, cleanup_high_water=10)
+    await pool.start()
+    await asyncio.sleep(0)  # let the pool be filled
+    assert pool.stats()['ready'] == 2
+
+    async with pool.sandbox() as sandbox_1, pool.sandbox() as sandbox_2:
+        assert sandbox_1.is_dir() and sandbox_2.is_dir()
+        assert sandbox_1 != sandbox_2
+        (sandbox_1 / 'test.txt').write_text('test')
+    assert pool.hits == 2
+
+    await pool.stop()
+    assert not sandbox_1.exists() and not sandbox_2.exists()
+    assert pool.stats()['ready'] == 0
+
+
+async def test_sandbox_pool_miss_and_overflow() -> None:
+    pool = SandboxPool(size=0, cleanup_high_water=0)
+    async with pool.sandbox() as sandbox:
+        assert sandbox.is_dir()
+    assert not sandbox.exists()
+    assert pool.misses == pool.overflows == 1
+
+
+def test_sandbox_quota() -> None:
+    sandbox = create_sandbox(quota=100_000)
+    try:
+        if not os.path.ismount(sandbox):
+            pytest.skip('mounting a tmpfs is not allowed')
+        (sandbox / 'small.txt').write_bytes(b'x' * 50_000)
+        with pytest.raises(OSError, match='No space left on device'):
+            (sandbox / 'large.txt').write_bytes(b'x' * 100_000)
+    finally:
+        remove_sandbox(sandbox)
+    assert not sandbox.exists()
+
+
+def test_sandbox_without_quota() -> None:
+    sandbox = create_sandbox(quota=0)
+    (sandbox / 'dir').mkdir()
+    (sandbox / 'dir' / 'test.txt').write_text('test')
+    assert not os.path.ismount(sandbox)
+    remove_sandbox(sandbox)
+    assert not sandbox.exists()
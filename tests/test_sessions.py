@@ -0,0 +1,95 @@
+import asyncio
+
+from httpx import AsyncClient
+from pytest import MonkeyPatch
+
+from codebox.models import Response, Session, SessionRequest
+from codebox.sessions import NoCapacity, SessionManager, session_manager
+
+
+async def test_session(client: AsyncClient) -> None:
+    resp = await client.post(
+        '/sessions_insecure', json={'sources': {'a.txt': 'a', 'dir/b.txt': 'b'}, 'ttl': 60}
+    )
+    assert resp.status_code == 201
+    session = Session(**resp.json())
+    assert session.ttl == 60
+    assert 0 < session.expires_in <= 60
+    url = f'/sessions/{session.id}'
+
+    # files written by a command are kept for the next requests
+    commands = [{'command': '/bin/sh -c "cat a.txt dir/b.txt > c.txt"'}]
+    resp = await client.post(f'{url}/execute', json=commands)
+    assert resp.status_code == 200
+    resp = await client.post(f'{url}/execute', json=[{'command': '/bin/cat c.txt'}])
+    assert [Response(**r) for r in resp.json()] == [Response(stdout='ab')]
+
+    resp = await client.patch(url, json={'sources': {'a.txt': 'A'}, 'deleted': ['dir']})
+    assert resp.status_code == 200
+    resp = await client.post(f'{url}/execute', json=[{'command': '/bin/ls -R'}])
+    assert sorted(resp.json()[0]['stdout'].split()) == ['.:', 'a.txt', 'c.txt']
+
+    resp = await client.delete(url)
+    assert resp.status_code == 204
+    resp = await client.get(url)
+    assert resp.status_code == 404
+    resp = await client.post(f'{url}/execute', json=[{'command': '/bin/true'}])
+    assert resp.status_code == 404
+
+
+async def test_invalid_path(client: AsyncClient) -> None:
+    resp = await client.post('/sessions_insecure', json={'sources': {}})
+    session = Session(**resp.json())
+    resp = await client.patch(f'/sessions/{session.id}', json={'deleted': ['../..']})
+    assert resp.status_code == 400
+    assert 'Invalid file path' in resp.json()['detail']
+    await client.delete(f'/sessions/{session.id}')
+
+
+async def test_ttl_limit(client: AsyncClient) -> None:
+    resp = await client.post('/sessions', json={'sources': {}, 'ttl': 1e9})
+    assert resp.status_code == 422
+
+
+async def test_no_capacity(client: AsyncClient, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(session_manager, 'max_sessions', 0)
+    resp = await client.post('/sessions', json={'sources': {}})
+    assert resp.status_code == 503
+
+
+async def test_lru_eviction() -> None:
+    manager = SessionManager(max_sessions=2, max_memory=10_000_000)
+    request = SessionRequest(quota=1_000_000)
+    first = await manager.create(request)
+    second = await manager.create(request)
+    await manager.run(first.id, [])  # the second session becomes the least recently used
+    third = await manager.create(request)
+    assert manager.get(second.id) is None
+    assert manager.get(first.id) and manager.get(third.id)
+    assert manager.evicted == 1
+
+    # busy sessions are not evicted
+    states = [manager._sessions[first.id], manager._sessions[third.id]]
+    for state in states:
+        await state.lock.acquire()
+    try:
+        await manager.create(request)
+    except NoCapacity:
+        pass
+    else:
+        raise AssertionError('NoCapacity not raised')
+    finally:
+        for state in states:
+            state.lock.release()
+    await manager.stop()
+    assert manager.stats()['open'] == 0
+
+
+async def test_expiration() -> None:
+    manager = SessionManager(max_sessions=2, max_memory=10_000_000, reap_interval=0.01)
+    await manager.start()
+    session = await manager.create(SessionRequest(ttl=0.05, quota=1_000_000))
+    await asyncio.sleep(0.2)
+    assert manager.get(session.id) is None
+    assert manager.expired == 1
+    await manager.stop()
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+from httpx import AsyncClient
+
+from codebox.codebox import execute_insecure, stream_project
+from codebox.models import Command, ProjectCore, Response
+
+
+async def test_execute_stream(client: AsyncClient) -> None:
+    code = """\
+import sys
+import time
+
+for i in range(3):
+    print(i, flush=True)
+    time.sleep(0.05)
+sys.exit('Olá')
+"""
+    project = ProjectCore(
+        sources={'test.py': code},
+        commands=[
+            Command(command='python test.py', timeout=5),
+            Command(command='/bin/cat', stdin='Açúcar'),
+        ],
+    )
+    events = []
+    async with client.stream('POST', '/execute_insecure_stream', json=project.model_dump()) as resp:
+        assert resp.headers['content-type'].startswith('text/event-stream')
+        async for message in resp.aiter_text():
+            for event in message.strip().split('\n\n'):
+                name, data = event.split('\n')
+                events.append((name.removeprefix('event: '), json.loads(data[len('data: ') :])))
+
+    def output(stream: str, command: int) -> str:
+        return ''.join(
+            data['data'] for name, data in events if name == stream and data['command'] == command
+        )
+
+    assert output('stdout', 0) == '0\n1\n2\n'
+    assert output('stderr', 0) == 'Olá\n'
+    assert output('stdout', 1) == 'Açúcar'
+
+    exits = [data for name, data in events if name == 'exit']
+    assert [data.pop('command') for data in exits] == [0, 1]
+    assert [Response(**data) for data in exits] == [Response(exit_code=1), Response()]
+
+    name, data = events[-1]
+    assert name == 'done'
+    assert [Response(**resp) for resp in data['responses']] == [
+        Response(exit_code=1),
+        Response(exit_code=0),
+    ]
+
+
+async def test_stream_closed_early() -> None:
+    tasks = asyncio.all_tasks()
+    code = 'import time\nprint("started", flush=True)\ntime.sleep(5)'
+    commands = [Command(command='python test.py', timeout=10)]
+    events = stream_project({'test.py': code}, commands, execute_insecure)
+    async with aclosing(events):
+        async for name, _ in events:
+            if name == 'stdout':
+                break
+    # the producer and its command are over once the stream is closed
+    assert asyncio.all_tasks() - tasks == set()
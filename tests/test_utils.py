@@ -3,7 +3,8 @@ from tempfile import TemporaryDirectory
 
 from pytest import raises
 
-from codebox.utils import save_source
+from codebox.startup import probe
+from codebox.utils import LANGUAGES, available_languages, save_source
 
 
 def test_save_sources():
@@ -20,3 +21,16 @@ def test_save_sources():
 
         # surprisingly, this not raises an error
         save_source(sandbox, 'test/"blabla":*?\n/test.py', '')
+
+
+def test_available_languages() -> None:
+    available_languages.cache_clear()
+    languages = available_languages()
+    assert languages.keys() == LANGUAGES.keys()
+    # probed once per process
+    assert available_languages() is languages
+
+
+async def test_probe() -> None:
+    durations = await probe()
+    assert durations.keys() == {'inside_container', 'get_nsjail_args', 'available_languages'}
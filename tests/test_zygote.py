@@ -0,0 +1,131 @@
+import asyncio
+import os
+import shlex
+import sys
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+
+from pytest import fixture, raises
+
+from codebox.codebox import execute_insecure
+from codebox.models import Command, Response
+from codebox.sandbox import create_sandbox, remove_sandbox
+from codebox.zygote import Zygote, zygote
+
+PYTHON = shlex.quote(sys.executable)
+
+
+@fixture
+async def running_zygote() -> AsyncIterator[None]:
+    await zygote.start()
+    try:
+        yield
+    finally:
+        await zygote.stop()
+
+
+@fixture
+def sandbox_path() -> Iterator[Path]:
+    path = create_sandbox()
+    yield path
+    remove_sandbox(path)
+
+
+async def run_cold_and_warm(
+    sandbox_path: Path, sources: dict[str, str], command: Command
+) -> tuple[Response, Response]:
+    for filepath, contents in sources.items():
+        (sandbox_path / filepath).write_text(contents)
+    cold = await execute_insecure(command, sandbox_path)
+    await zygote.start()
+    try:
+        assert zygote.accepts(shlex.split(command.command))
+        warm = await execute_insecure(command, sandbox_path)
+    finally:
+        await zygote.stop()
+    return cold, warm
+
+
+async def test_accepts(running_zygote: None) -> None:
+    assert zygote.accepts([sys.executable, 'main.py', 'arg'])
+    assert not zygote.accepts([sys.executable, '-c', 'print(1)'])
+    assert not zygote.accepts([sys.executable])
+    assert not zygote.accepts(['/bin/echo', 'main.py'])
+
+
+async def test_hello_world(running_zygote: None, sandbox_path: Path) -> None:
+    (sandbox_path / 'main.py').write_text('import sys\nprint("Hello", sys.argv[1:])')
+    command = Command(command=f'{PYTHON} main.py a b', timeout=5)
+    resp = await execute_insecure(command, sandbox_path)
+    assert resp == Response(stdout="Hello ['a', 'b']\n", stderr='', exit_code=0)
+
+
+async def test_stdin(running_zygote: None, sandbox_path: Path) -> None:
+    (sandbox_path / 'main.py').write_text('print(input().upper())')
+    command = Command(command=f'{PYTHON} main.py', stdin='olá\n', timeout=5)
+    resp = await execute_insecure(command, sandbox_path)
+    assert resp == Response(stdout='OLÁ\n', stderr='', exit_code=0)
+
+
+async def test_timeout(running_zygote: None, sandbox_path: Path) -> None:
+    (sandbox_path / 'main.py').write_text('import time\ntime.sleep(10)')
+    command = Command(command=f'{PYTHON} main.py', timeout=0.2)
+    resp = await execute_insecure(command, sandbox_path)
+    assert resp == Response(stdout='', stderr='Timeout Error. Exceeded 0.2s', exit_code=-1)
+
+
+async def test_waits_for_threads(running_zygote: None, sandbox_path: Path) -> None:
+    (sandbox_path / 'main.py').write_text(
+        'import threading, time\n'
+        'def run():\n'
+        '    time.sleep(0.2)\n'
+        '    print("from thread")\n'
+        'threading.Thread(target=run).start()\n'
+        'print("main")\n'
+    )
+    command = Command(command=f'{PYTHON} main.py', timeout=5)
+    resp = await execute_insecure(command, sandbox_path)
+    assert resp == Response(stdout='main\nfrom thread\n', stderr='', exit_code=0)
+
+
+async def test_same_as_cold_interpreter(sandbox_path: Path) -> None:
+    sources = {
+        # shadows a preloaded module of the standard library
+        'json.py': 'def dumps(obj):\n    return "local"\n',
+        'main.py': (
+            'import sys, json\n'
+            'print(json.dumps(1), __name__, sys.argv)\n'
+            'sys.stdout.flush()\n'
+            'def fail():\n'
+            '    raise ValueError("boom")\n'
+            'if len(sys.argv) > 1:\n'
+            '    sys.exit(sys.argv[1])\n'
+            'fail()\n'
+        ),
+    }
+    for args in ('', ' 3', ' error'):
+        command = f'{PYTHON} main.py{args}'
+        cold, warm = await run_cold_and_warm(
+            sandbox_path, sources, Command(command=command, timeout=5)
+        )
+        assert cold == warm
+
+
+async def test_spawn_failure_closes_fds(tmp_path: Path) -> None:
+    async def answer_garbage(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.read(2**16)
+        writer.write(b'garbage\n')
+        writer.close()
+
+    client = Zygote(sys.executable, [])
+    client._socket_dir = str(tmp_path)
+    server = await asyncio.start_unix_server(answer_garbage, client.socket_path)
+    try:
+        fds = os.listdir('/proc/self/fd')
+        with raises(ValueError):
+            await client.spawn([sys.executable, 'main.py'])
+        await asyncio.sleep(0.05)  # for the server to close its side
+        assert os.listdir('/proc/self/fd') == fds
+    finally:
+        server.close()
+        await server.wait_closed()